@@ -0,0 +1,91 @@
+"""
+Concurrency benchmark: threads + sync graph vs. one event loop + async graph.
+
+Runs N concurrent sessions through src.graph.app with stubbed LLM and Firestore
+backends (benchmarks/fakes.py), so no network or credentials are needed.
+
+    python benchmarks/bench_async.py --sessions 50 --llm-latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fakes import install_fake_firebase, install_fake_llms
+
+MESSAGES = [
+    "It's 40 degrees and rainy, what should I layer?",
+    "Does navy go with camel?",
+    "Dress it up for a dinner party",
+    "3 ways to wear olive pants",
+]
+
+
+def make_inputs(i: int):
+    from langchain_core.messages import HumanMessage
+    return {
+        "messages": [HumanMessage(content=MESSAGES[i % len(MESSAGES)], id=str(uuid.uuid4()))],
+        "user_id": f"bench_user_{i}",
+        "current_ootd": {"id": "ootd-1", "formula": "Top + Bottoms + Layer + Shoes", "season": "Fall"},
+        "weather_data": {"temperature": "40.0°F", "conditions": "Rain", "source": "Open-Meteo"},
+        "summary": "",
+    }
+
+
+def make_config(graph, i: int):
+    # A fresh checkpoint thread per run (ignored when the checkpointer is off)
+    return graph.thread_config(str(uuid.uuid4()), f"bench_user_{i}")
+
+
+def run_threads(graph, sessions: int, workers: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda i: graph.app.invoke(make_inputs(i), make_config(graph, i)), range(sessions)))
+    return time.perf_counter() - start
+
+
+async def run_async(graph, sessions: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(graph.arun(make_inputs(i), make_config(graph, i)) for i in range(sessions)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=8, help="Thread pool size for the sync baseline")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per stubbed LLM call")
+    parser.add_argument("--firestore-latency", type=float, default=0.02, help="Seconds per stubbed Firestore RPC")
+    args = parser.parse_args()
+
+    os.environ["CHECKPOINT_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_checkpoints.sqlite3")
+    install_fake_firebase(latency=args.firestore_latency)
+    import src.graph as graph
+    install_fake_llms(graph, latency=args.llm_latency)
+    graph.orchestrator.routing_cache.backend = None  # every turn pays the full chain
+    for agent in (graph.occasion_agent, graph.item_agent, graph.color_agent, graph.temp_agent):
+        agent.answer_cache.backend = None
+
+    sync_s = run_threads(graph, args.sessions, args.threads)
+    async_s = asyncio.run(run_async(graph, args.sessions))
+    print(json.dumps({
+        "sessions": args.sessions,
+        "llm_latency_s": args.llm_latency,
+        "sync_threads": args.threads,
+        "sync_wall_s": round(sync_s, 3),
+        "sync_turns_per_s": round(args.sessions / sync_s, 2),
+        "async_wall_s": round(async_s, 3),
+        "async_turns_per_s": round(args.sessions / async_s, 2),
+        "speedup": round(sync_s / async_s, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+"""
+Offline replay benchmark for the whole LangGraph workflow.
+
+Replays a corpus of conversations through src.graph.app the way the Streamlit app
+drives it (summary from the store, OOTD from the repository, weather per city,
+one graph run per user turn), with every external service stubbed:
+- LLMs: FakeChatModel with fixed latency / output size (benchmarks/fakes.py)
+- Firestore: the in-memory FakeFirestore
+- Open-Meteo: the local StubWeatherServer
+
+Reports p50/p95/p99 turn latency, per-node latency, LLM calls and tokens per
+turn, and writes everything as JSON so runs can be compared across commits.
+
+Corpus lines are either a conversation or a single message (so the routing
+samples replay too):
+    {"id": "layering-nyc", "city": "New York", "turns": ["Hi!", "It's 40 degrees..."]}
+    {"message": "Dress it up"}
+
+    python benchmarks/bench_graph.py --concurrency 8 --llm-latency 0.2 --out before.json
+    python benchmarks/bench_graph.py --concurrency 8 --llm-latency 0.2 --baseline before.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from fakes import install_fake_firebase, install_fake_llms_on_build
+from stub_weather_server import StubWeatherServer
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "conversations.jsonl")
+DEFAULT_CITY = "New York"
+# Metrics compared against --baseline; all of them are "lower is better"
+COMPARED = ["turn_ms_p50", "turn_ms_p95", "turn_ms_p99", "llm_calls_per_turn", "tokens_per_turn", "input_bytes_per_turn"]
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    conversations = []
+    with open(path, "r", encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            turns = row.get("turns") or [row["message"]]
+            conversations.append({
+                "id": row.get("id", f"line-{i + 1}"),
+                "city": row.get("city", DEFAULT_CITY),
+                "turns": turns,
+            })
+    return conversations
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (values need not be sorted)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class TurnRecorder(BaseCallbackHandler):
+    """
+    Collects one graph run's node timings, LLM calls and token usage.
+    Node runs are the chains LangGraph tags "graph:step:N"; fanned-out
+    subagents show up as separate, overlapping node runs.
+    """
+
+    # Called on the caller's thread/loop, so timestamps aren't skewed by an executor hop
+    run_inline = True
+
+    def __init__(self):
+        self.nodes: List[Dict[str, Any]] = []
+        self.llm_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._started: Dict[Any, tuple] = {}
+        self._lock = threading.Lock()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, tags=None, metadata=None, **kwargs):
+        if any(tag.startswith("graph:step:") for tag in tags or []):
+            with self._lock:
+                self._started[run_id] = ((metadata or {}).get("langgraph_node"), time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started:
+                name, start = started
+                self.nodes.append({"node": name, "ms": round((time.perf_counter() - start) * 1000, 1)})
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.on_chain_end(None, run_id=run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        with self._lock:
+            self.llm_calls += 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                with self._lock:
+                    self.input_tokens += usage.get("input_tokens", 0)
+                    self.output_tokens += usage.get("output_tokens", 0)
+
+
+class Session:
+    """Client-side state for one conversation, kept the way src/app.py keeps it."""
+
+    def __init__(self, conversation: Dict[str, Any], index: int, checkpointed: bool = False):
+        from langgraph.store.base import GetOp
+        from src.core.registry import registry
+        from src.repositories.outfit_repository import OutfitRepository
+        from src.services.weather_service import WeatherService
+
+        self.conversation = conversation
+        self.user_id = f"bench_{index}_{conversation['id']}"
+        # With a checkpointer the graph keeps the history; after the first turn only the new message is sent
+        self.checkpointed = checkpointed
+        self.thread_id = str(uuid.uuid4())
+        self.seeded = False
+        memory = registry.get("store").batch([GetOp(namespace=("users",), key=self.user_id)])
+        self.summary = memory[0].value.get("summary", "") if memory and memory[0] else ""
+        self.summary_watermark: Optional[str] = None
+        self.messages: List[Any] = []
+        self.current_ootd = OutfitRepository().get_outfit_by_date()
+        self.weather = WeatherService.get_current_weather(conversation["city"])
+
+    def inputs(self, text: str) -> Dict[str, Any]:
+        from langchain_core.messages import HumanMessage
+
+        self.messages.append(HumanMessage(content=text, id=str(uuid.uuid4())))
+        if self.seeded:
+            return {"messages": [self.messages[-1]]}
+        self.seeded = self.checkpointed
+        return {
+            "messages": self.unsummarized_messages(),
+            "user_id": self.user_id,
+            "current_ootd": self.current_ootd,
+            "weather_data": self.weather,
+            "summary": self.summary,
+            "summary_watermark": self.summary_watermark,
+        }
+
+    def config(self, recorder: "TurnRecorder") -> Dict[str, Any]:
+        config: Dict[str, Any] = {"callbacks": [recorder]}
+        if self.checkpointed:
+            config["configurable"] = {"thread_id": self.thread_id, "user_id": self.user_id}
+        return config
+
+    def unsummarized_messages(self) -> List[Any]:
+        for i, m in enumerate(self.messages):
+            if m.id == self.summary_watermark:
+                return self.messages[i + 1:]
+        return self.messages
+
+    def apply(self, update: Dict[str, Any]) -> None:
+        from src.core.streaming import transcript_messages
+
+        for value in update.values():
+            if not value:
+                continue
+            if "summary" in value:
+                self.summary = value["summary"]
+            if "summary_watermark" in value:
+                self.summary_watermark = value["summary_watermark"]
+            # Only ALI's replies are part of the user's transcript
+            if "messages" in value:
+                self.messages.extend(transcript_messages(value["messages"]))
+
+
+def payload_bytes(inputs: Dict[str, Any]) -> int:
+    """Serialized size of a turn's graph input (what a remote graph would be sent)."""
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+    return len(JsonPlusSerializer().dumps_typed(inputs)[1])
+
+
+def turn_record(conversation_id: str, recorder: TurnRecorder, elapsed: float, error: Optional[str],
+                input_bytes: int) -> Dict[str, Any]:
+    return {
+        "conversation": conversation_id,
+        "ms": elapsed * 1000,
+        "input_bytes": input_bytes,
+        "nodes": recorder.nodes,
+        "llm_calls": recorder.llm_calls,
+        "input_tokens": recorder.input_tokens,
+        "output_tokens": recorder.output_tokens,
+        "error": error,
+    }
+
+
+def replay_sync(app, conversation: Dict[str, Any], index: int) -> List[Dict[str, Any]]:
+    session = Session(conversation, index, app.checkpointer is not None)
+    turns = []
+    for text in conversation["turns"]:
+        recorder, error = TurnRecorder(), None
+        start = time.perf_counter()
+        inputs = session.inputs(text)
+        try:
+            for update in app.stream(inputs, session.config(recorder), stream_mode="updates"):
+                session.apply(update)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        turns.append(turn_record(conversation["id"], recorder, time.perf_counter() - start, error, payload_bytes(inputs)))
+    return turns
+
+
+async def replay_async(app, conversation: Dict[str, Any], index: int) -> List[Dict[str, Any]]:
+    # Session setup (store, OOTD, weather) is sync, as in the app; keep it off the loop
+    session = await asyncio.to_thread(Session, conversation, index, app.checkpointer is not None)
+    turns = []
+    for text in conversation["turns"]:
+        recorder, error = TurnRecorder(), None
+        start = time.perf_counter()
+        inputs = session.inputs(text)
+        try:
+            async for update in app.astream(inputs, session.config(recorder), stream_mode="updates"):
+                session.apply(update)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        turns.append(turn_record(conversation["id"], recorder, time.perf_counter() - start, error, payload_bytes(inputs)))
+    return turns
+
+
+def run_sync(app, conversations: List[Dict[str, Any]], concurrency: int) -> List[List[Dict[str, Any]]]:
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(lambda pair: replay_sync(app, pair[1], pair[0]), enumerate(conversations)))
+
+
+async def run_async(app, conversations: List[Dict[str, Any]], concurrency: int) -> List[List[Dict[str, Any]]]:
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(index, conversation):
+        async with limit:
+            return await replay_async(app, conversation, index)
+
+    return await asyncio.gather(*(one(i, c) for i, c in enumerate(conversations)))
+
+
+def summarize(turns: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    latencies = [t["ms"] for t in turns]
+    per_node: Dict[str, List[float]] = defaultdict(list)
+    for t in turns:
+        for n in t["nodes"]:
+            per_node[n["node"]].append(n["ms"])
+    tokens = [t["input_tokens"] + t["output_tokens"] for t in turns]
+    input_bytes = [t["input_bytes"] for t in turns]
+    count = len(turns) or 1
+    return {
+        "turns": len(turns),
+        "errors": sum(1 for t in turns if t["error"]),
+        "wall_s": round(elapsed, 3),
+        "turns_per_s": round(len(turns) / elapsed, 2) if elapsed else None,
+        "turn_ms_p50": round(percentile(latencies, 50), 1),
+        "turn_ms_p95": round(percentile(latencies, 95), 1),
+        "turn_ms_p99": round(percentile(latencies, 99), 1),
+        "turn_ms_max": round(max(latencies, default=0), 1),
+        "llm_calls_per_turn": round(sum(t["llm_calls"] for t in turns) / count, 2),
+        "llm_calls_max": max((t["llm_calls"] for t in turns), default=0),
+        "input_tokens_per_turn": round(sum(t["input_tokens"] for t in turns) / count, 1),
+        "output_tokens_per_turn": round(sum(t["output_tokens"] for t in turns) / count, 1),
+        "tokens_per_turn": round(sum(tokens) / count, 1),
+        "tokens_p95": percentile(tokens, 95),
+        "input_bytes_per_turn": round(sum(input_bytes) / count, 1),
+        "input_bytes_max": max(input_bytes, default=0),
+        "nodes": {
+            name: {
+                "runs": len(values),
+                "ms_p50": round(percentile(values, 50), 1),
+                "ms_p95": round(percentile(values, 95), 1),
+                "ms_total": round(sum(values), 1),
+            }
+            for name, values in sorted(per_node.items())
+        },
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change per metric (+ = slower / more expensive than the baseline)."""
+    delta = {}
+    for key in COMPARED:
+        before, after = baseline["summary"].get(key), current["summary"].get(key)
+        if before:
+            delta[key] = {"before": before, "after": after, "change_pct": round(100 * (after - before) / before, 1)}
+    return delta
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the corpus this many times")
+    parser.add_argument("--concurrency", type=int, default=4, help="Conversations in flight at once")
+    parser.add_argument("--mode", choices=["async", "sync"], default="async",
+                        help="One event loop (app.astream) or a thread per conversation (app.stream)")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per stubbed LLM call")
+    parser.add_argument("--output-tokens", type=int, default=60, help="Approximate tokens per stubbed answer")
+    parser.add_argument("--firestore-latency", type=float, default=0.02, help="Seconds per stubbed Firestore RPC")
+    parser.add_argument("--weather-latency", type=float, default=0.05, help="Seconds per stubbed Open-Meteo request")
+    parser.add_argument("--routing-cache", action="store_true",
+                        help="Keep the routing cache on (off by default so every turn pays the full chain)")
+    parser.add_argument("--answer-cache", action="store_true",
+                        help="Keep the subagent answer cache on (off by default, like the routing cache)")
+    parser.add_argument("--speculation", action="store_true",
+                        help="Start the predicted expert while the LLM router decides (SPECULATION_ENABLED)")
+    parser.add_argument("--route-noise", type=float, default=0.0,
+                        help="Share of routing decisions the stub router sends to another expert")
+    parser.add_argument("--compose-mode", choices=["orchestrator", "fused"], default="orchestrator",
+                        help="Who writes the reply after a single expert (COMPOSE_MODE)")
+    parser.add_argument("--checkpointer", choices=["sqlite", "memory", "off"], default="sqlite",
+                        help="Graph checkpointer (off = stateless graph, every turn resends the history)")
+    parser.add_argument("--cold", action="store_true",
+                        help="Don't build agents up front; the first turns then include the lazy startup")
+    parser.add_argument("--out", help="Also write the JSON report to this file")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    parser.add_argument("--turns", action="store_true", help="Include every turn's record in the report")
+    args = parser.parse_args()
+
+    # Everything is configured through the environment before src/ is imported
+    weather = StubWeatherServer(latency=args.weather_latency).start()
+    os.environ["WEATHER_GEOCODE_URL"] = f"{weather.url}/v1/search"
+    os.environ["WEATHER_FORECAST_URL"] = f"{weather.url}/v1/forecast"
+    os.environ["CACHE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_cache.sqlite3")
+    os.environ["CHECKPOINT_BACKEND"] = args.checkpointer
+    os.environ["CHECKPOINT_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_checkpoints.sqlite3")
+    if not args.routing_cache:
+        os.environ["ROUTING_CACHE_BACKEND"] = "off"
+    if not args.answer_cache:
+        os.environ["ANSWER_CACHE_BACKEND"] = "off"
+    if args.speculation:
+        os.environ["SPECULATION_ENABLED"] = "true"
+    os.environ["COMPOSE_MODE"] = args.compose_mode
+
+    db = install_fake_firebase(latency=args.firestore_latency)
+    db.data["outfits"] = {"ootd-bench": {
+        "date": datetime.date.today().strftime("%Y-%m-%d"),
+        "patterns": {"title": "Top + Bottoms + Layer + Shoes", "season": "Fall"},
+        "image": None,
+    }}
+    install_fake_llms_on_build(latency=args.llm_latency, output_tokens=args.output_tokens,
+                               route_noise=args.route_noise)
+    import src.graph as graph
+    from src.core.tokens import tokenizer_name
+
+    if not args.cold:
+        graph.warm_up()
+
+    conversations = load_corpus(args.corpus) * args.repeat
+    start = time.perf_counter()
+    if args.mode == "async":
+        results = asyncio.run(run_async(graph.app, conversations, args.concurrency))
+    else:
+        results = run_sync(graph.app, conversations, args.concurrency)
+    elapsed = time.perf_counter() - start
+    weather.stop()
+    writer = graph.registry.get("summary_writer")
+    writer.flush()
+
+    turns = [t for conversation in results for t in conversation]
+    report = {
+        "commit": git_commit(),
+        "config": {
+            "corpus": os.path.basename(args.corpus),
+            "conversations": len(conversations),
+            "mode": args.mode,
+            "concurrency": args.concurrency,
+            "llm_latency_s": args.llm_latency,
+            "output_tokens": args.output_tokens,
+            "firestore_latency_s": args.firestore_latency,
+            "weather_latency_s": args.weather_latency,
+            "routing_cache": args.routing_cache,
+            "answer_cache": args.answer_cache,
+            "speculation": args.speculation,
+            "route_noise": args.route_noise,
+            "compose_mode": args.compose_mode,
+            "checkpointer": args.checkpointer,
+            "cold_start": args.cold,
+            "tokenizer": tokenizer_name(),
+        },
+        "summary": summarize(turns, elapsed),
+        "backends": {
+            "firestore_rpcs": db.rpcs,
+            "weather_requests": dict(weather.requests),
+            "summary_writes": writer.metrics(),
+            "answer_cache": graph.answer_cache_metrics(),
+        },
+    }
+    if graph.registry.get("speculator") is not None:
+        report["backends"]["speculation"] = graph.registry.get("speculator").metrics()
+    if hasattr(graph.app.checkpointer, "metrics"):
+        report["backends"]["checkpoints"] = graph.app.checkpointer.metrics()
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["vs_baseline"] = compare(report, json.load(f))
+    if args.turns:
+        report["turns"] = [{**t, "ms": round(t["ms"], 1)} for t in turns]
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Load test: one ChatOpenAI client per agent (old setup) vs. the shared LLMPool,
+with a no-keep-alive baseline showing what connection reuse saves per call.
+
+Both run the same concurrent calls against a local OpenAI-compatible stub
+(benchmarks/stub_openai_server.py, in its own process so it doesn't compete
+with the client for the GIL), spread round-robin over six "agents"
+(five at temperature 0.7 and the summarizer at 0, like the app). Reports wall
+time, per-call latency above the stub's fixed latency, TCP connections opened
+and the server-side peak of concurrent requests.
+
+Note: recent langchain-openai versions already share one default httpx client
+between ChatOpenAI instances with the same base URL and timeout, so at equal
+concurrency "per agent" reuses connections too. The pool's difference shows
+under bursts above its limit: connections and upstream concurrency stay
+bounded and excess calls queue instead.
+
+    python benchmarks/bench_llm_pool.py --calls 300 --concurrency 16 --max-in-flight 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("OPENAI_API_KEY", "sk-stub-not-used")
+
+from langchain_core.messages import HumanMessage
+
+
+class StubProcess:
+    """Runs stub_openai_server.py in a child process and reads its counters over HTTP."""
+
+    def __init__(self, port: int, latency: float, connect_latency: float):
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_openai_server.py")
+        self.proc = subprocess.Popen(
+            [sys.executable, script, "--port", str(port), "--latency", str(latency),
+             "--connect-latency", str(connect_latency)],
+            stdout=subprocess.PIPE, text=True,
+        )
+        # First line: "Serving OpenAI-compatible stub on http://127.0.0.1:PORT/v1 ..."
+        self.url = self.proc.stdout.readline().split(" on ")[1].split()[0]
+        self.root = self.url.rsplit("/v1", 1)[0]
+
+    def reset_counters(self) -> None:
+        urllib.request.urlopen(urllib.request.Request(f"{self.root}/reset", method="POST")).close()
+
+    def stats(self) -> dict:
+        with urllib.request.urlopen(f"{self.root}/stats") as response:
+            return json.loads(response.read())
+
+    def stop(self) -> None:
+        self.proc.terminate()
+        self.proc.wait()
+
+AGENT_TEMPERATURES = [0.7, 0.7, 0.7, 0.7, 0.7, 0.0]
+PROMPT = [HumanMessage(content="Does navy go with camel?")]
+
+
+def per_agent_clients(base_url: str):
+    from langchain_openai import ChatOpenAI
+    return [ChatOpenAI(model="gpt-4o-mini", temperature=t, base_url=base_url, api_key="sk-stub")
+            for t in AGENT_TEMPERATURES]
+
+
+def no_keepalive_clients(base_url: str):
+    # Every call opens (and pays for) a new connection
+    import httpx
+    from langchain_openai import ChatOpenAI
+    http_client = httpx.Client(limits=httpx.Limits(max_keepalive_connections=0))
+    return [ChatOpenAI(model="gpt-4o-mini", temperature=t, base_url=base_url, api_key="sk-stub",
+                       http_client=http_client) for t in AGENT_TEMPERATURES]
+
+
+def pooled_clients(base_url: str, max_in_flight: int):
+    from src.core.llm_pool import LLMPool
+    pool = LLMPool(max_in_flight=max_in_flight, max_connections=max_in_flight,
+                   max_keepalive_connections=max_in_flight, base_url=base_url, api_key="sk-stub")
+    return [pool.get("gpt-4o-mini", temperature=t) for t in AGENT_TEMPERATURES], pool
+
+
+def summarize(latencies, elapsed, server: StubProcess, stub_latency: float) -> dict:
+    latencies = sorted(latencies)
+    stats = server.stats()
+    return {
+        "wall_s": round(elapsed, 3),
+        "calls_per_s": round(len(latencies) / elapsed, 1),
+        "overhead_ms_p50": round((statistics.median(latencies) - stub_latency) * 1000, 1),
+        "overhead_ms_p95": round((latencies[int(len(latencies) * 0.95) - 1] - stub_latency) * 1000, 1),
+        # Minus the connection used to fetch these stats
+        "connections": stats["connections"] - 1,
+        "server_peak_in_flight": stats["peak_in_flight"],
+    }
+
+
+def run_sync(clients, calls: int, concurrency: int, server, stub_latency: float) -> dict:
+    def call(i):
+        start = time.perf_counter()
+        clients[i % len(clients)].invoke(PROMPT)
+        return time.perf_counter() - start
+
+    server.reset_counters()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(call, range(calls)))
+    return summarize(latencies, time.perf_counter() - start, server, stub_latency)
+
+
+def run_async(clients, calls: int, concurrency: int, server, stub_latency: float) -> dict:
+    async def main():
+        gate = asyncio.Semaphore(concurrency)
+
+        async def call(i):
+            async with gate:
+                start = time.perf_counter()
+                await clients[i % len(clients)].ainvoke(PROMPT)
+                return time.perf_counter() - start
+
+        return await asyncio.gather(*(call(i) for i in range(calls)))
+
+    server.reset_counters()
+    start = time.perf_counter()
+    latencies = asyncio.run(main())
+    return summarize(latencies, time.perf_counter() - start, server, stub_latency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent callers (threads or tasks)")
+    parser.add_argument("--max-in-flight", type=int, default=16, help="LLMPool global limit")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the stub waits per call")
+    parser.add_argument("--port", type=int, default=8766, help="Port for the stub server")
+    parser.add_argument("--connect-latency", type=float, default=0.05,
+                        help="Seconds the stub adds per new connection (TLS handshake stand-in)")
+    args = parser.parse_args()
+
+    server = StubProcess(args.port, args.latency, args.connect_latency)
+    report = {"calls": args.calls, "concurrency": args.concurrency, "stub_latency_s": args.latency,
+              "stub_connect_latency_s": args.connect_latency}
+
+    # Fresh clients per scenario so no scenario inherits warm connections
+    report["sync_no_keepalive"] = run_sync(no_keepalive_clients(server.url), args.calls, args.concurrency, server, args.latency)
+    report["sync_per_agent"] = run_sync(per_agent_clients(server.url), args.calls, args.concurrency, server, args.latency)
+    clients, pool = pooled_clients(server.url, args.max_in_flight)
+    report["sync_pooled"] = run_sync(clients, args.calls, args.concurrency, server, args.latency)
+    report["async_per_agent"] = run_async(per_agent_clients(server.url), args.calls, args.concurrency, server, args.latency)
+    clients, pool = pooled_clients(server.url, args.max_in_flight)
+    report["async_pooled"] = run_async(clients, args.calls, args.concurrency, server, args.latency)
+    report["pool"] = pool.metrics()
+    server.stop()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
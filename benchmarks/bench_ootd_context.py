@@ -0,0 +1,124 @@
+"""
+Structured OOTD context benchmark: the precompute job over a synthetic outfit
+archive (in-memory Firestore), then the OOTD block each agent is shown.
+
+- precompute: round trips and batches for a full run, and for a second run where
+  every record is already current (nothing to write)
+- read: outfits served with the stored record vs. derived on read
+- prompt: tokens of the OOTD block per agent, as a dict repr of the document, as
+  every field of the record, and as the fields that agent selects
+
+    python benchmarks/bench_ootd_context.py --outfits 2000
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fakes import install_fake_firebase
+
+TOPS = ["cream blouse", "white button-down", "navy sweater", "black tee", "silk camisole", "olive cardigan"]
+BOTTOMS = ["camel trousers", "dark jeans", "black pencil skirt", "rust midi skirt", "gray dress pants"]
+LAYERS = ["tan blazer", "denim jacket", "charcoal coat", "burgundy cardigan", "leather jacket"]
+SHOES = ["loafers", "white sneakers", "black pumps", "cognac ankle boots", "ballet flats"]
+
+
+def seed(db, count: int, rng: random.Random) -> None:
+    start = datetime.date.today() - datetime.timedelta(days=count - 1)
+    outfits = {}
+    for i in range(count):
+        items = [rng.choice(TOPS), rng.choice(BOTTOMS), rng.choice(LAYERS), rng.choice(SHOES)]
+        outfits[f"ootd-{i:05d}"] = {
+            "date": (start + datetime.timedelta(days=i)).strftime("%Y-%m-%d"),
+            "patterns": {"title": "Top + Bottoms + Layer + Shoes", "season": rng.choice(["Fall", "Winter", "Spring"])},
+            "items": " + ".join(i.capitalize() for i in items),
+            "dress_it_up": {"swap": "Sneakers for block heels", "add": "Structured bag"},
+            "dress_it_down": {"swap": "Blazer for a denim jacket"},
+            "image": None,
+        }
+    db.data["outfits"] = outfits
+
+
+def precompute_run(repo, db, **kwargs):
+    rpcs = db.rpcs
+    started = time.perf_counter()
+    counts = repo.precompute_contexts(**kwargs)
+    counts["round_trips"] = db.rpcs - rpcs
+    counts["seconds"] = round(time.perf_counter() - started, 3)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--outfits", type=int, default=2000)
+    parser.add_argument("--reads", type=int, default=200, help="Uncached OOTD lookups per read run")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    db = install_fake_firebase()
+    seed(db, args.outfits, rng)
+
+    from src.agents.context import OOTD_FIELDS, render_ootd
+    from src.core.tokens import count_tokens, tokenizer_name
+    from src.repositories.outfit_repository import OutfitRepository
+    from src.repositories.ootd_context import CONTEXT_FIELD
+
+    repo = OutfitRepository()
+    dates = [d["date"] for d in db.data["outfits"].values()]
+    sample = rng.sample(dates, min(args.reads, len(dates)))
+
+    def read_run():
+        OutfitRepository.invalidate()
+        before = dict(OutfitRepository.cache_metrics()["context"])
+        started = time.perf_counter()
+        outfits = [repo.get_outfit_by_date(d) for d in sample]
+        after = OutfitRepository.cache_metrics()["context"]
+        return outfits, {
+            "lookup_ms_mean": round(1000 * (time.perf_counter() - started) / len(sample), 3),
+            **{k: after[k] - before[k] for k in after},
+        }
+
+    _, read_before = read_run()
+    first = precompute_run(repo, db)
+    second = precompute_run(repo, db)
+    outfits, read_after = read_run()
+
+    prompt = {}
+    for agent, fields in OOTD_FIELDS.items():
+        variants = agent == "occasion_formality"
+        raw, full, selected = [], [], []
+        for ootd in outfits:
+            doc = {k: v for k, v in ootd.items() if k != "context"}
+            doc.update(db.data["outfits"][ootd["id"]])
+            doc.pop(CONTEXT_FIELD, None)
+            raw.append(count_tokens(str(doc)))
+            full.append(count_tokens(render_ootd(ootd, include_variants=True,
+                                                 fields=("items", "colors", "formality", "season"))))
+            selected.append(count_tokens(render_ootd(ootd, include_variants=variants, fields=fields)))
+        prompt[agent] = {
+            "fields": list(fields) + (["variants"] if variants else []),
+            "dict_repr_tokens": round(statistics.mean(raw), 1),
+            "all_fields_tokens": round(statistics.mean(full), 1),
+            "selected_tokens": round(statistics.mean(selected), 1),
+        }
+
+    report = {
+        "outfits": args.outfits,
+        "tokenizer": tokenizer_name(),
+        "precompute": {"first_run": first, "second_run": second},
+        "read": {"before_precompute": read_before, "after_precompute": read_after},
+        "ootd_block": prompt,
+        "example": render_ootd(outfits[0], include_variants=True, fields=OOTD_FIELDS["occasion_formality"]),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Cold-start report: import time of src.graph and latency of the first requests.
+
+Each measurement runs in a fresh interpreter. The import report parses
+`python -X importtime` output; the request timings use the stubbed LLM and
+Firestore backends (benchmarks/fakes.py) with zero latency, so they show the
+cost of building agents, clients and prompts on first use, not network time.
+`--eager` builds every registered service right after import, like the app
+did before services were created lazily.
+
+    python benchmarks/bench_startup.py --top 15
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def importtime_report(top: int) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.graph"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time:       123 |       4567 |   package.module"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    total = next((cum for name, _, cum in rows if name == "src.graph"), None)
+    # Top-level packages by cumulative time
+    top_level = sorted({name: cum for name, _, cum in rows if "." not in name}.items(), key=lambda kv: -kv[1])
+    return {
+        "src_graph_ms": round(total / 1000, 1) if total else None,
+        "top_packages_ms": {name: round(cum / 1000, 1) for name, cum in top_level[:top]},
+    }
+
+
+def child(eager: bool) -> None:
+    """Runs inside the fresh interpreter and prints its timings as JSON."""
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    timings = {}
+
+    start = time.perf_counter()
+    import src.graph as graph
+    timings["import_ms"] = (time.perf_counter() - start) * 1000
+
+    from fakes import install_fake_firebase, install_fake_llms_on_build
+    install_fake_firebase()
+    install_fake_llms_on_build(latency=0.0)
+    from src.core.registry import registry
+    if eager:
+        start = time.perf_counter()
+        graph.warm_up()
+        timings["eager_build_ms"] = (time.perf_counter() - start) * 1000
+
+    from langchain_core.messages import HumanMessage
+    for label in ("first_request_ms", "second_request_ms"):
+        inputs = {
+            "messages": [HumanMessage(content="Does navy go with camel?")],
+            "user_id": "bench_user",
+            "current_ootd": {"id": "ootd-1", "formula": "Top + Bottoms + Layer + Shoes"},
+            "weather_data": {"temperature": "50°F", "conditions": "Clear sky"},
+            "summary": "",
+        }
+        start = time.perf_counter()
+        graph.app.invoke(inputs, graph.thread_config(label, "bench_user"))
+        timings[label] = (time.perf_counter() - start) * 1000
+    timings["services_built"] = len(registry.created())
+
+    print(json.dumps({k: round(v, 1) if isinstance(v, float) else v for k, v in timings.items()}))
+
+
+def run_child(eager: bool) -> dict:
+    args = [sys.executable, os.path.abspath(__file__), "--child"] + (["--eager"] if eager else [])
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-stub-not-used"),
+        # Fresh checkpoint file, so every child starts with empty threads
+        "CHECKPOINT_DB_PATH": os.path.join(tempfile.mkdtemp(), "checkpoints.sqlite3"),
+    }
+    proc = subprocess.run(args, cwd=ROOT, capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level packages to list")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--eager", action="store_true", help="Build all services right after import")
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.eager)
+        return
+
+    print(json.dumps({
+        "importtime": importtime_report(args.top),
+        "lazy": run_child(eager=False),
+        "eager": run_child(eager=True),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
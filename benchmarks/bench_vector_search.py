@@ -0,0 +1,144 @@
+"""
+FirestoreStore search at scale: the old full namespace scan vs. the vector index.
+
+Fills one namespace per size with synthetic user memories (in-memory Firestore,
+benchmarks/fakes.py), then measures:
+- full_scan: what SearchOp used to do, stream every document of the namespace
+- index build from Firestore (read + embed everything), snapshot save, and a
+  restart that loads the snapshot and only catches up on newer documents
+- semantic search (top-k cosine) with and without a filter, and with an offset
+- structured search (no query) with filter/limit pushed down to the query
+- put latency while the namespace index is loaded (each put is embedded)
+- hit@k: a stored memory's own text finds it in the top k
+
+    python benchmarks/bench_vector_search.py --sizes 10000 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_graph import percentile
+from fakes import install_fake_firebase
+
+COLORS = ["emerald", "navy", "camel", "olive", "burgundy", "ivory", "charcoal", "blush", "rust", "cobalt"]
+ITEMS = ["blazer", "trench coat", "loafers", "chinos", "silk scarf", "denim jacket", "ankle boots",
+         "cashmere sweater", "pleated skirt", "white sneakers", "wool trousers", "linen shirt"]
+OCCASIONS = ["work", "weddings", "dinner dates", "the weekend", "travel", "interviews", "the gym", "brunch"]
+TEMPLATES = [
+    "Loves {color} {item} for {occasion}",
+    "Avoids {item} at {occasion}, prefers {color}",
+    "Bought a {color} {item} last month",
+    "Feels confident in {color} for {occasion}",
+    "Asked how to style a {item} with {color}",
+]
+KINDS = ["preference", "purchase", "dislike", "question"]
+
+
+def memory(rng: random.Random, i: int) -> Dict[str, Any]:
+    text = rng.choice(TEMPLATES).format(color=rng.choice(COLORS), item=rng.choice(ITEMS),
+                                        occasion=rng.choice(OCCASIONS))
+    return {"text": f"{text} (note {i})", "kind": rng.choice(KINDS), "rank": rng.randint(1, 5)}
+
+
+def timed(fn: Callable[[], Any], runs: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"ms_p50": round(percentile(samples, 50), 3), "ms_p95": round(percentile(samples, 95), 3)}
+
+
+def run_size(size: int, args, rng: random.Random) -> Dict[str, Any]:
+    from langgraph.store.base import PutOp, SearchOp
+    from src.memory.firestore_store import FirestoreStore
+
+    db = install_fake_firebase(latency=args.firestore_latency)
+    namespace = ("memories", f"user_{size}")
+    store = FirestoreStore(vector_index=True)
+    values = [memory(rng, i) for i in range(size)]
+    start = time.perf_counter()
+    for offset in range(0, size, 500):
+        store.batch([PutOp(namespace, f"m{offset + i}", v) for i, v in enumerate(values[offset:offset + 500])])
+    fill_s = time.perf_counter() - start
+
+    collection = db.collection("memory")
+    report: Dict[str, Any] = {"size": size, "fill_s": round(fill_s, 2)}
+    report["full_scan"] = timed(
+        lambda: [d.to_dict() for d in collection.where("namespace", "==", list(namespace)).stream()], args.scan_runs
+    )
+    report["full_scan"]["items_returned"] = size
+
+    # Cold build: every document read and embedded once, then snapshotted
+    start = time.perf_counter()
+    store.batch([SearchOp(namespace, query="warm up")])
+    report["index_build_s"] = round(time.perf_counter() - start, 2)
+    snapshot = store.vector_index._snapshot_path(namespace)
+    report["snapshot_mb"] = round(snapshot.stat().st_size / 1e6, 1)
+
+    queries = [rng.choice(values)["text"].rsplit(" (", 1)[0] for _ in range(args.queries)]
+    it = iter(queries * 4)
+    report["semantic_search"] = timed(lambda: store.batch([SearchOp(namespace, query=next(it), limit=args.k)]), args.queries)
+    report["semantic_search_filtered"] = timed(
+        lambda: store.batch([SearchOp(namespace, query=next(it), filter={"kind": "dislike", "rank": {"$gte": 4}},
+                                      limit=args.k)]), args.queries)
+    report["semantic_search_offset_50"] = timed(
+        lambda: store.batch([SearchOp(namespace, query=next(it), limit=args.k, offset=50)]), args.queries)
+    report["structured_search_pushdown"] = timed(
+        lambda: store.batch([SearchOp(namespace, filter={"kind": "purchase"}, limit=args.k)]), args.scan_runs)
+
+    # Planted queries: a memory's exact text should come back in the top k
+    sample = rng.sample(range(size), min(100, size))
+    hits = sum(
+        any(r.key == f"m{i}" for r in store.batch([SearchOp(namespace, query=values[i]["text"], limit=args.k)])[0])
+        for i in sample
+    )
+    report[f"hit_at_{args.k}"] = round(hits / len(sample), 3)
+
+    counter = iter(range(10**9))
+    report["put_with_index"] = timed(
+        lambda: store.batch([PutOp(namespace, f"new{next(counter)}", memory(rng, size))]), args.queries)
+
+    # Restart: a new store loads the snapshot and only reads what changed since
+    restarted = FirestoreStore(vector_index=True)
+    start = time.perf_counter()
+    restarted.batch([SearchOp(namespace, query="warm up")])
+    report["restart_from_snapshot_s"] = round(time.perf_counter() - start, 2)
+    report["restart_embedded"] = restarted.vector_index.embedded
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200, help="Timed searches per variant")
+    parser.add_argument("--scan-runs", type=int, default=10, help="Timed full scans (slow at 100k)")
+    parser.add_argument("--k", type=int, default=10, help="Results per search")
+    parser.add_argument("--firestore-latency", type=float, default=0.0, help="Seconds per stubbed Firestore RPC")
+    args = parser.parse_args()
+
+    os.environ["STORE_VECTOR_SNAPSHOT_DIR"] = tempfile.mkdtemp()
+    os.environ["STORE_VECTOR_REFRESH_SECONDS"] = "3600"
+    # The built-in hashing embedder unless a real model is configured
+    os.environ.setdefault("STORE_EMBEDDING_FUNCTION", "hash")
+    rng = random.Random(7)
+    from src.config import STORE_EMBEDDING_FUNCTION, STORE_EMBEDDING_DIM
+
+    results: List[Dict[str, Any]] = [run_size(size, args, rng) for size in args.sizes]
+    print(json.dumps({
+        "embedding": STORE_EMBEDDING_FUNCTION,
+        "dim": STORE_EMBEDDING_DIM,
+        "k": args.k,
+        "sizes": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+WeatherService HTTP layer: uncached per-call requests vs. pooled + cached + coalesced.
+
+Both variants hit the local stub server (benchmarks/stub_weather_server.py), so no
+network is needed. The baseline reproduces the old behaviour: two sequential
+`requests.get` calls per lookup, a fresh connection each time, no caching.
+
+The prefetch section tracks `--cities` made-up towns with the background
+WeatherPrefetcher and compares one refresh pass (multi-coordinate requests)
+with refreshing them city by city, and request-path lookups from the warm
+snapshot with a blocking forecast fetch.
+
+    python benchmarks/bench_weather.py --lookups 200 --workers 16 --latency 0.05 --cities 250
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from stub_weather_server import CITIES, StubWeatherServer
+
+
+def uncached_lookup(base_url: str, city: str) -> dict:
+    geo = requests.get(f"{base_url}/v1/search", params={"name": city, "count": 1}).json()
+    if not geo.get("results"):
+        return {"error": "City not found"}
+    coords = geo["results"][0]
+    return requests.get(f"{base_url}/v1/forecast", params={
+        "latitude": coords["latitude"], "longitude": coords["longitude"],
+        "current": ["temperature_2m", "weather_code"],
+    }).json()
+
+
+def run(server: StubWeatherServer, fn, cities, workers: int) -> dict:
+    server.requests = {"search": 0, "forecast": 0}
+    server.connections = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(fn, cities))
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": round(elapsed, 3),
+        "upstream_requests": dict(server.requests),
+        "connections": server.connections,
+    }
+
+
+def prefetch_run(server: StubWeatherServer, cities: int) -> dict:
+    from src.services.weather_prefetcher import WeatherPrefetcher
+    from src.services.weather_service import WeatherService, _forecast_cache
+
+    towns = [f"Town {i}" for i in range(cities)]
+    prefetcher = WeatherPrefetcher(interval=3600)  # refreshed by hand below
+    for town in towns:
+        prefetcher.track(town)
+        WeatherService.get_coordinates(town)  # geocoding is cached; measure forecasts only
+    points = [(c["latitude"], c["longitude"]) for c in map(WeatherService.get_coordinates, towns)]
+
+    def timed(fn) -> dict:
+        server.requests = {"search": 0, "forecast": 0}
+        server.forecast_locations = 0
+        start = time.perf_counter()
+        fn()
+        return {"seconds": round(time.perf_counter() - start, 3), "forecast_requests": server.requests["forecast"],
+                "locations": server.forecast_locations}
+
+    per_city = timed(lambda: [WeatherService._fetch_forecast(lat, lon) for lat, lon in points])
+    batched = timed(prefetcher.refresh)
+
+    def lookup_ms(fn) -> float:
+        latencies = []
+        for town in towns:
+            start = time.perf_counter()
+            fn(town)
+            latencies.append((time.perf_counter() - start) * 1000)
+        return round(sorted(latencies)[len(latencies) // 2], 3)
+
+    _forecast_cache().clear()
+    blocking_ms = lookup_ms(WeatherService.get_current_weather)
+    warm_ms = lookup_ms(prefetcher.weather)
+    prefetcher.close()
+    return {
+        "cities": cities,
+        "refresh_per_city": per_city,
+        "refresh_batched": batched,
+        "lookup_ms_p50_blocking": blocking_ms,
+        "lookup_ms_p50_prefetched": warm_ms,
+        "prefetcher": prefetcher.metrics(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the stub waits per request")
+    parser.add_argument("--cities", type=int, default=250, help="Active cities for the prefetch section")
+    args = parser.parse_args()
+
+    server = StubWeatherServer(latency=args.latency).start()
+    # Point the service at the stub, with a throwaway geocode cache file
+    os.environ["WEATHER_GEOCODE_URL"] = f"{server.url}/v1/search"
+    os.environ["WEATHER_FORECAST_URL"] = f"{server.url}/v1/forecast"
+    os.environ["CACHE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_cache.sqlite3")
+    from src.services.weather_service import WeatherService
+
+    names = list(CITIES) + ["Atlantis"]
+    cities = [names[i % len(names)] for i in range(args.lookups)]
+
+    baseline = run(server, lambda c: uncached_lookup(server.url, c), cities, args.workers)
+    cold = run(server, WeatherService.get_current_weather, cities, args.workers)
+    warm = run(server, WeatherService.get_current_weather, cities, args.workers)
+    prefetch = prefetch_run(server, args.cities)
+    server.stop()
+
+    print(json.dumps({
+        "lookups": args.lookups,
+        "stub_latency_s": args.latency,
+        "uncached": baseline,
+        "service_cold": cold,
+        "service_warm": warm,
+        "speedup_cold": round(baseline["seconds"] / cold["seconds"], 2) if cold["seconds"] else None,
+        "cache": WeatherService.cache_metrics(),
+        "prefetch": prefetch,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Behaviour checks for the WeatherService HTTP layer against the local stub server
+(benchmarks/stub_weather_server.py), no network needed: geocode cache hit/miss,
+the negative-result TTL, forecast caching on rounded coordinates, coalescing of
+concurrent identical requests, and the timeout / HTTP error paths. Then the
+WeatherPrefetcher on top of it: the multi-coordinate refresh, a forecast answer
+with fewer locations than asked for, city tracking and eviction, and the STALE
+line an aging snapshot puts in the Temperature agent's context.
+
+Each check asserts on what reached the stub; the script stops at the first failure.
+
+    python benchmarks/check_weather.py
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# The Temperature agent is only asked for its context; its client is never called
+os.environ.setdefault("OPENAI_API_KEY", "sk-stub-not-used")
+
+from stub_weather_server import CITIES, StubWeatherServer
+
+MISS_TTL = 0.3
+READ_TIMEOUT = 0.3
+STALE_AFTER = 0.5
+
+
+def reset(server: StubWeatherServer) -> None:
+    """Empty caches and counters, a healthy and fast stub."""
+    from src.services.weather_service import _forecast_cache, _geocode_cache
+
+    _geocode_cache.cache_clear()
+    _forecast_cache.cache_clear()
+    server.requests = {"search": 0, "forecast": 0}
+    server.latency = 0.0
+    server.status = 200
+    server.forecast_shortfall = 0
+    server.forecast_locations = 0
+
+
+def prefetcher(**kwargs):
+    from src.services.weather_prefetcher import WeatherPrefetcher
+
+    # Refreshes are driven by the checks; the daemon thread never wakes
+    return WeatherPrefetcher(**{"interval": 3600, **kwargs})
+
+
+def check_geocode_cache(server: StubWeatherServer) -> None:
+    from src.services.weather_service import WeatherService
+
+    before = WeatherService.cache_metrics()["geocode"]
+    first = WeatherService.get_coordinates("London")
+    # Same city after normalization: served from the cache
+    second = WeatherService.get_coordinates("  london ")
+    after = WeatherService.cache_metrics()["geocode"]
+    assert first == second and first["name"] == "London", first
+    assert server.requests["search"] == 1, server.requests
+    assert after["misses"] - before["misses"] == 1, (before, after)
+    assert after["hits"] - before["hits"] == 1, (before, after)
+
+
+def check_negative_ttl(server: StubWeatherServer) -> None:
+    from src.services.weather_service import WeatherService
+
+    assert WeatherService.get_coordinates("Atlantis") is None
+    assert WeatherService.get_coordinates("Atlantis") is None
+    assert server.requests["search"] == 1, "a cached 'not found' went upstream again"
+    time.sleep(MISS_TTL + 0.1)
+    assert WeatherService.get_coordinates("Atlantis") is None
+    assert server.requests["search"] == 2, "an expired 'not found' was still served from the cache"
+    # Found cities have no TTL
+    WeatherService.get_coordinates("Paris")
+    time.sleep(MISS_TTL + 0.1)
+    WeatherService.get_coordinates("Paris")
+    assert server.requests["search"] == 3, server.requests
+
+
+def check_forecast_rounding(server: StubWeatherServer) -> None:
+    from src.services.weather_service import WeatherService
+
+    ny = CITIES["new york"]
+    first = WeatherService.get_forecast(ny["latitude"], ny["longitude"])
+    # Within the 2-decimal rounding of the first lookup: same cache entry
+    nearby = WeatherService.get_forecast(40.7121, -74.0089)  # 40.71, -74.01, like New York
+    assert nearby == first, (first, nearby)
+    assert server.requests["forecast"] == 1, server.requests
+    WeatherService.get_forecast(ny["latitude"] + 0.05, ny["longitude"])
+    assert server.requests["forecast"] == 2, "a different rounded point shared an entry"
+
+
+def check_single_flight(server: StubWeatherServer) -> None:
+    from src.services.weather_service import WeatherService
+
+    server.latency = 0.2
+    tokyo = CITIES["tokyo"]
+    collapsed = WeatherService.cache_metrics()["collapsed"]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: WeatherService.get_forecast(tokyo["latitude"], tokyo["longitude"]), range(8)))
+    assert server.requests["forecast"] == 1, f"8 concurrent lookups made {server.requests['forecast']} requests"
+    assert all(r == results[0] for r in results)
+    assert WeatherService.cache_metrics()["collapsed"] - collapsed == 7
+
+
+def check_timeouts(server: StubWeatherServer) -> None:
+    from src.services.weather_service import WeatherService
+
+    # Geocoding times out: no coordinates, and the failure isn't cached
+    server.latency = READ_TIMEOUT * 2
+    assert WeatherService.get_current_weather("Paris") == {"error": "City not found"}
+    server.latency = 0.0
+    assert WeatherService.get_coordinates("Paris") is not None
+    assert server.requests["search"] == 2, server.requests
+    # The forecast times out
+    server.latency = READ_TIMEOUT * 2
+    assert WeatherService.get_current_weather("Paris") == {"error": "Weather service unavailable"}
+
+
+def check_http_errors(server: StubWeatherServer) -> None:
+    from src.services.weather_service import WeatherService
+
+    WeatherService.get_coordinates("Tokyo")
+    server.status = 503
+    assert WeatherService.get_current_weather("Tokyo") == {"error": "Weather service unavailable"}
+    assert WeatherService.get_current_weather("Berlin") == {"error": "City not found"}
+    # Errors aren't cached: the next lookup goes upstream and succeeds
+    server.status = 200
+    weather = WeatherService.get_current_weather("Tokyo")
+    assert "error" not in weather and weather["location"] == "Tokyo, Japan", weather
+    assert server.requests["forecast"] == 2, server.requests
+
+
+def check_prefetch_refresh(server: StubWeatherServer) -> None:
+    towns = [f"Town {n}" for n in range(10)]
+    warm = prefetcher(batch_size=4)
+    try:
+        for town in towns:
+            warm.track(town)
+        assert warm.refresh() == 10
+        # 10 locations, 4 per multi-coordinate request
+        assert server.requests["forecast"] == 3, server.requests
+        assert server.forecast_locations == 10, server.forecast_locations
+        for town in towns:
+            snapshot = warm.peek(town)
+            assert snapshot and snapshot["location"] == f"{town}, Stubland" and snapshot["fetched_at"], snapshot
+        # Lookups are served from the snapshots
+        searches = server.requests["search"]
+        assert warm.weather("Town 3") == warm.peek("Town 3")
+        assert server.requests == {"search": searches, "forecast": 3}, server.requests
+        metrics = warm.metrics()
+        assert metrics["cities"] == 10 and metrics["forecast_requests"] == 3 and metrics["hits"] == 1, metrics
+    finally:
+        warm.close()
+
+
+def check_forecast_count_mismatch(server: StubWeatherServer) -> None:
+    from src.services.weather_service import WeatherService
+
+    server.forecast_shortfall = 1
+    try:
+        WeatherService.get_forecasts([(1.0, 1.0), (2.0, 2.0), (3.0, 3.0)])
+    except ValueError as e:
+        assert "Expected 3 forecasts, got 2" in str(e), e
+    else:
+        raise AssertionError("a short multi-coordinate answer was accepted")
+
+    warm = prefetcher(batch_size=2)
+    try:
+        server.forecast_shortfall = 0
+        for town in ("Town 1", "Town 2"):
+            warm.track(town)
+        assert warm.refresh() == 2
+        before = warm.peek("Town 1")
+        # The refresh fails: recorded in metrics, the old snapshots stay
+        server.forecast_shortfall = 1
+        assert warm.refresh() == 0
+        assert warm.refresh() == 0
+        metrics = warm.metrics()
+        assert metrics["failures"] == 2 and metrics["consecutive_failures"] == 2, metrics
+        assert metrics["last_error"].startswith("ValueError: Expected 2 forecasts"), metrics
+        assert metrics["last_error_age_s"] is not None, metrics
+        assert warm.peek("Town 1") == before
+        # The next good refresh clears the streak, not the total
+        server.forecast_shortfall = 0
+        assert warm.refresh() == 2
+        metrics = warm.metrics()
+        assert metrics["failures"] == 2 and metrics["consecutive_failures"] == 0, metrics
+        assert metrics["last_success_age_s"] is not None, metrics
+    finally:
+        warm.close()
+
+
+def check_tracking_eviction(server: StubWeatherServer) -> None:
+    warm = prefetcher(max_cities=3)
+    try:
+        for town in ("Town 1", "Town 2", "Town 3"):
+            warm.track(town)
+            time.sleep(0.01)
+        warm.refresh()
+        # Town 1 is asked for again, so Town 2 is now the one idle the longest
+        assert warm.peek("Town 1") is not None
+        time.sleep(0.01)
+        warm.track("Town 4")
+        assert warm.metrics()["cities"] == 3
+        assert warm.peek("Town 2") is None, "the evicted city kept its snapshot"
+        assert warm.peek("Town 1") is not None and warm.peek("Town 3") is not None
+    finally:
+        warm.close()
+
+    warm = prefetcher(idle_after=0.2)
+    try:
+        warm.track("Town 5")
+        warm.refresh()
+        forecasts = server.requests["forecast"]
+        time.sleep(0.3)
+        # Nobody asked for it within idle_after: dropped, not refreshed
+        assert warm.refresh() == 0
+        assert server.requests["forecast"] == forecasts, server.requests
+        assert warm.metrics()["cities"] == 0 and warm.peek("Town 5") is None
+    finally:
+        warm.close()
+
+
+def check_stale_snapshot(server: StubWeatherServer) -> None:
+    from langchain_core.messages import HumanMessage
+
+    from src.agents.context import render_weather
+    from src.agents.subagents import TemperatureAgent
+    from src.services.weather_service import WeatherService
+
+    warm = prefetcher()
+    try:
+        weather = warm.weather("London")
+        assert not WeatherService.is_stale(weather) and "STALE" not in render_weather(weather)
+        # The refresher can't reach Open-Meteo while the snapshot ages
+        server.status = 503
+        time.sleep(STALE_AFTER + 0.1)
+        assert warm.refresh() == 0 and warm.metrics()["consecutive_failures"] == 1
+        weather = warm.weather("London")
+        assert WeatherService.is_stale(weather), weather
+        assert WeatherService.bucket(weather).endswith("|stale"), WeatherService.bucket(weather)
+        assert warm.metrics()["stale"] == 1, warm.metrics()
+        state = {"messages": [HumanMessage(content="Is it cold out?")], "weather_data": weather}
+        context = TemperatureAgent()._build_context(state)
+        assert "STALE: fetched 0 min ago, conditions may have changed" in context, context
+    finally:
+        warm.close()
+
+
+CHECKS = [
+    check_geocode_cache,
+    check_negative_ttl,
+    check_forecast_rounding,
+    check_single_flight,
+    check_timeouts,
+    check_http_errors,
+    check_prefetch_refresh,
+    check_forecast_count_mismatch,
+    check_tracking_eviction,
+    check_stale_snapshot,
+]
+
+
+def main():
+    server = StubWeatherServer().start()
+    os.environ.update({
+        "WEATHER_GEOCODE_URL": f"{server.url}/v1/search",
+        "WEATHER_FORECAST_URL": f"{server.url}/v1/forecast",
+        "WEATHER_GEOCODE_CACHE_BACKEND": "memory",
+        "WEATHER_GEOCODE_MISS_TTL_SECONDS": str(MISS_TTL),
+        "WEATHER_READ_TIMEOUT_SECONDS": str(READ_TIMEOUT),
+        "WEATHER_FORECAST_TTL_SECONDS": "600",
+        "WEATHER_COORD_PRECISION": "2",
+        "WEATHER_STALE_AFTER_SECONDS": str(STALE_AFTER),
+    })
+    try:
+        for check in CHECKS:
+            reset(server)
+            check(server)
+            print(f"ok  {check.__name__}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Offline evaluation of the local pre-router (src/agents/intent_classifier.py).
+
+Compares the classifier against LLM routing labels and estimates latency saved.
+
+    python benchmarks/eval_prerouter.py --live --save-labels   # label + time with the real Orchestrator
+    python benchmarks/eval_prerouter.py --threshold 0.7 --llm-latency-ms 900
+
+Corpus: JSONL with {"message": ..., "previous_reply": ..., "llm_route": ...}. It is
+held out: samples matching one of the classifier's SEED_EXAMPLES are dropped. The
+optional "previous_reply" is the assistant's reply the message answers; like the
+graph, the pre-router leaves replies to a question to the LLM. "llm_route" is
+written by `--live --save-labels` ("end" means DIRECT_RESPONSE); agreement is only
+reported over samples labelled that way, coverage over all of them.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents.intent_classifier import SEED_EXAMPLES, IntentClassifier
+from src.agents.routing_cache import answers_question, normalize_message
+from src.config import LLM_MODEL, PREROUTER_CONFIDENCE_THRESHOLD
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "routing_samples.jsonl")
+
+
+def load_corpus(path):
+    """The samples, minus any that repeat a seed example (the classifier was built from those)."""
+    seeds = {normalize_message(text) for texts in SEED_EXAMPLES.values() for text in texts}
+    with open(path, "r", encoding="utf-8") as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+    held_out = [s for s in samples if normalize_message(s["message"]) not in seeds]
+    return held_out, len(samples) - len(held_out)
+
+
+def save_corpus(path, samples):
+    with open(path, "w", encoding="utf-8") as f:
+        for sample in samples:
+            f.write(json.dumps(sample) + "\n")
+
+
+def conversation(sample):
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    previous = [AIMessage(content=sample["previous_reply"])] if sample.get("previous_reply") else []
+    return previous + [HumanMessage(content=sample["message"])]
+
+
+def label_live(samples):
+    """Re-labels the corpus with the real LLM router and records its latency."""
+    from src.agents.orchestrator import Orchestrator
+
+    orchestrator = Orchestrator()
+    orchestrator.routing_cache.backend = None  # measure real LLM calls
+    latencies = []
+    for sample in samples:
+        state = {"messages": conversation(sample), "summary": "",
+                 "current_ootd": None, "weather_data": None}
+        start = time.perf_counter()
+        result = orchestrator.invoke(state)
+        latencies.append((time.perf_counter() - start) * 1000)
+        sample["llm_route"] = result.get("next_agent", "end")
+        sample["labelled_with"] = LLM_MODEL
+    return sum(latencies) / len(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--threshold", type=float, default=PREROUTER_CONFIDENCE_THRESHOLD)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0,
+                        help="Assumed mean LLM routing latency when not running --live")
+    parser.add_argument("--live", action="store_true", help="Label and time with the real LLM router")
+    parser.add_argument("--save-labels", action="store_true", help="With --live, write the labels back to the corpus")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    samples, dropped = load_corpus(args.corpus)
+    llm_latency_ms = label_live(samples) if args.live else args.llm_latency_ms
+    if args.live and args.save_labels:
+        save_corpus(args.corpus, samples)
+
+    classifier = IntentClassifier()
+    fast, labelled, agree, clf_ms = 0, 0, 0, 0.0
+    for sample in samples:
+        start = time.perf_counter()
+        # Same gate as the graph's _preroute
+        route = None if answers_question(conversation(sample)) else classifier.route(sample["message"], args.threshold)
+        clf_ms += (time.perf_counter() - start) * 1000
+        if route is None:
+            continue
+        fast += 1
+        if not sample.get("llm_route"):
+            continue
+        labelled += 1
+        ok = route == sample["llm_route"]
+        agree += ok
+        if args.verbose and not ok:
+            print(f"  MISMATCH {sample['message']!r}: classifier={route} llm={sample['llm_route']}")
+
+    total = len(samples)
+    saved_ms = fast * llm_latency_ms - clf_ms
+    report = {
+        "samples": total,
+        "dropped_seed_overlap": dropped,
+        "llm_labelled": sum(1 for s in samples if s.get("llm_route")),
+        "threshold": args.threshold,
+        "fast_path_coverage": round(fast / total, 3) if total else 0.0,
+        # None until the corpus is labelled with --live --save-labels
+        "agreement_on_fast_path": round(agree / labelled, 3) if labelled else None,
+        "fast_path_labelled": labelled,
+        "classifier_ms_per_msg": round(clf_ms / total, 3) if total else 0.0,
+        "llm_latency_ms": round(llm_latency_ms, 1),
+        "latency_saved_ms_total": round(saved_ms, 1),
+        "latency_saved_ms_per_msg": round(saved_ms / total, 1) if total else 0.0,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,454 @@
+"""
+Deterministic stand-ins for the external services, used by the benchmarks.
+
+- FakeChatModel: chat model with configurable latency and output size
+- FakeFirestore / FakeAsyncFirestore: in-memory Firestore with optional per-RPC latency
+- install_fake_firebase(): points the shared Firestore clients at the in-memory version
+"""
+import asyncio
+import copy
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Agents build real ChatOpenAI clients at import; they only need a key to exist.
+os.environ.setdefault("OPENAI_API_KEY", "sk-stub-not-used")
+
+
+# --- LLM ---------------------------------------------------------------------
+
+def _last_system(messages: List[BaseMessage]) -> str:
+    for m in reversed(messages):
+        if isinstance(m, SystemMessage):
+            return m.content
+    return ""
+
+
+def orchestrator_responder(messages: List[BaseMessage]) -> str:
+    """Routes like the real prompt would; composes when <agent_response> is filled."""
+    from src.agents.intent_classifier import IntentClassifier
+
+    context = _last_system(messages)
+    agent_response = re.search(r"<agent_response>\s*(.*?)\s*</agent_response>", context, re.S)
+    if agent_response and agent_response.group(1):
+        return "Love it! Here's the plan.\n\n" + agent_response.group(1).split(":", 1)[-1].strip() + \
+            "\n\nWant me to create a visual outfit for you?"
+    user_message = re.search(r"<user_message>\s*(.*?)\s*</user_message>", context, re.S)
+    text = user_message.group(1) if user_message else ""
+    if re.search(r"colou?rs?", text, re.I) and re.search(r"degrees|°|layers?", text, re.I):
+        # Independent concerns: fan out like the prompt's multi-agent example
+        return "ROUTE: color_intelligence, temperature"
+    route, _ = IntentClassifier().classify(text)
+    return f"ROUTE: {route}" if route else "DIRECT_RESPONSE: Hey there! Ready to find your perfect outfit?"
+
+
+def noisy_router(responder: Callable[[List[BaseMessage]], str], noise: float,
+                 seed: int = 7) -> Callable[[List[BaseMessage]], str]:
+    """Sends a `noise` share of routing decisions to a different expert, like an LLM
+    disagreeing with the local classifier (exercises speculation misses)."""
+    from src.agents.routing_cache import AGENT_ROUTES
+
+    rng = random.Random(seed)
+
+    def respond(messages: List[BaseMessage]) -> str:
+        content = responder(messages)
+        if content.startswith("ROUTE:") and rng.random() < noise:
+            routes = content[len("ROUTE:"):].strip()
+            return "ROUTE: " + rng.choice([r for r in AGENT_ROUTES if r not in routes])
+        return content
+
+    return respond
+
+
+def subagent_responder(messages: List[BaseMessage]) -> str:
+    if "<answer_as_ali>" in _last_system(messages):
+        # Fused compose mode: the expert writes the reply in ALI's voice
+        return "FINAL_ANSWER: Love it! Layer a trench over a knit, swap sneakers for ankle boots.\n\n" \
+            "Want me to create a visual outfit for you?"
+    return "FINAL_ANSWER: Layer a trench over a knit, swap sneakers for ankle boots."
+
+
+class FakeChatModel(BaseChatModel):
+    """Sleeps for `latency` seconds (per call) and answers via `responder`.
+    Streams word by word when the caller streams (e.g. stream_mode="messages")."""
+
+    latency: float = 0.2
+    output_tokens: int = 0  # pads the answer to roughly this many tokens
+    responder: Callable[[List[BaseMessage]], str] = subagent_responder
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        from src.core.tokens import count_message_tokens, count_tokens
+
+        self.calls += 1
+        content = self.responder(messages)
+        if self.output_tokens and not content.startswith("ROUTE:"):
+            content += " " + " ".join(["detail"] * max(0, self.output_tokens - count_tokens(content)))
+        message = AIMessage(content=content, usage_metadata={
+            "input_tokens": count_message_tokens(messages),
+            "output_tokens": count_tokens(content),
+            "total_tokens": count_message_tokens(messages) + count_tokens(content),
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._respond(messages)
+
+    def _chunks(self, messages: List[BaseMessage]):
+        # Word by word, usage on the last chunk, like a streamed completion
+        message = self._respond(messages).generations[0].message
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=word if last else word + " ",
+                usage_metadata=message.usage_metadata if last else None,
+            ))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        # The whole latency goes before the first token (time to first token dominates)
+        time.sleep(self.latency)
+        yield from self._chunks(messages)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(messages):
+            yield chunk
+
+
+def install_fake_llms(graph_module, latency: float = 0.2, output_tokens: int = 0) -> List[FakeChatModel]:
+    """Replaces every agent's LLM in `src.graph` with a FakeChatModel. Returns them."""
+    fakes = []
+    orchestrator = graph_module.orchestrator
+    orchestrator.llm = FakeChatModel(latency=latency, output_tokens=output_tokens, responder=orchestrator_responder)
+    orchestrator.summarizer_llm = FakeChatModel(latency=latency, responder=lambda m: "User likes layered looks.")
+    fakes += [orchestrator.llm, orchestrator.summarizer_llm]
+    for agent in (graph_module.occasion_agent, graph_module.item_agent,
+                  graph_module.color_agent, graph_module.temp_agent):
+        agent.llm = FakeChatModel(latency=latency, output_tokens=output_tokens)
+        fakes.append(agent.llm)
+    return fakes
+
+
+def install_fake_llms_on_build(latency: float = 0.2, output_tokens: int = 0, route_noise: float = 0.0) -> None:
+    """Like `install_fake_llms`, but swaps each agent's LLM as the registry builds it,
+    so agents that a run never needs are never built."""
+    from src.core.registry import registry
+    from src.agents.orchestrator import Orchestrator
+
+    def swap(name: str, agent: Any) -> None:
+        if isinstance(agent, Orchestrator):
+            responder = noisy_router(orchestrator_responder, route_noise) if route_noise else orchestrator_responder
+            agent.llm = FakeChatModel(latency=latency, output_tokens=output_tokens, responder=responder)
+            agent.summarizer_llm = FakeChatModel(latency=latency, responder=lambda m: "User likes layered looks.")
+        elif hasattr(agent, "llm"):
+            agent.llm = FakeChatModel(latency=latency, output_tokens=output_tokens)
+
+    registry.on_create(swap)
+
+
+# --- Firestore ---------------------------------------------------------------
+
+class FakeSnapshot:
+    def __init__(self, doc_id: str, data: Optional[Dict[str, Any]]):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeFirestore:
+    """In-memory Firestore subset used by FirestoreStore and OutfitRepository."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.data: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.rpcs = 0
+        self._lock = threading.Lock()
+
+    def _rpc(self):
+        with self._lock:
+            self.rpcs += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _read(self, collection: str, doc_id: str) -> FakeSnapshot:
+        return FakeSnapshot(doc_id, self.data.get(collection, {}).get(doc_id))
+
+    def _write(self, collection: str, doc_id: str, data: Optional[Dict[str, Any]], merge: bool):
+        if data is None:
+            with self._lock:
+                self.data.get(collection, {}).pop(doc_id, None)
+            return
+        clean = {k: _store_value(v) for k, v in data.items()}
+        with self._lock:
+            docs = self.data.setdefault(collection, {})
+            if merge and doc_id in docs:
+                docs[doc_id].update(clean)
+            else:
+                docs[doc_id] = clean
+
+    def collection(self, name: str) -> "FakeCollection":
+        return FakeCollection(self, name)
+
+    def batch(self) -> "FakeBatch":
+        return FakeBatch(self)
+
+    def get_all(self, refs) -> List[FakeSnapshot]:
+        self._rpc()
+        return [self._read(ref.collection, ref.id) for ref in refs]
+
+
+def _store_value(value: Any) -> Any:
+    # Firestore resolves SERVER_TIMESTAMP on write and stores tuples as arrays
+    if type(value).__name__ == "Sentinel":
+        return datetime.now(timezone.utc)
+    if isinstance(value, tuple):
+        return list(value)
+    return value
+
+
+class FakeDocRef:
+    def __init__(self, db: FakeFirestore, collection: str, doc_id: str):
+        self.db = db
+        self.collection = collection
+        self.id = doc_id
+
+    def get(self) -> FakeSnapshot:
+        self.db._rpc()
+        return self.db._read(self.collection, self.id)
+
+    def set(self, data: Dict[str, Any], merge: bool = False):
+        self.db._rpc()
+        self.db._write(self.collection, self.id, data, merge)
+
+    def delete(self):
+        self.db._rpc()
+        self.db._write(self.collection, self.id, None, False)
+
+
+_QUERY_OPS = {
+    "==": lambda a, b: a == b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+}
+
+
+def _field(data: Dict[str, Any], path: str) -> Any:
+    # Dotted paths reach into maps, like Firestore's "value.color"
+    for part in path.split("."):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(part)
+    return data
+
+
+def _order_value(doc_id: str, data: Dict[str, Any], path: str) -> Any:
+    # "__name__" orders by document id, as in Firestore
+    return doc_id if path == "__name__" else _field(data, path)
+
+
+class FakeQuery:
+    def __init__(self, db: FakeFirestore, collection: str, filters=None, limit_to: Optional[int] = None,
+                 offset_by: int = 0, orders=None, cursor: Optional[Dict[str, Any]] = None):
+        self.db = db
+        self.name = collection
+        self.filters = filters or []
+        self.limit_to = limit_to
+        self.offset_by = offset_by
+        self.orders = orders or []
+        self.cursor = cursor
+
+    def _with(self, **changes) -> "FakeQuery":
+        query = copy.copy(self)
+        query.__dict__.update(changes)
+        return query
+
+    def where(self, field=None, op=None, value=None, filter=None) -> "FakeQuery":
+        if filter is not None:
+            field, op, value = filter.field_path, filter.op_string, filter.value
+        return self._with(filters=self.filters + [(field, op, value)])
+
+    def limit(self, n: int) -> "FakeQuery":
+        return self._with(limit_to=n)
+
+    def offset(self, n: int) -> "FakeQuery":
+        return self._with(offset_by=n)
+
+    def order_by(self, field: str, direction: Any = None) -> "FakeQuery":
+        return self._with(orders=self.orders + [field])
+
+    def start_after(self, values: Any) -> "FakeQuery":
+        # A field -> value map, or a document snapshot (cursor on its ordered fields)
+        return self._with(cursor=values)
+
+    def _cursor_values(self) -> tuple:
+        if isinstance(self.cursor, FakeSnapshot):
+            return tuple(_order_value(self.cursor.id, self.cursor._data, f) for f in self.orders)
+        return tuple(self.cursor[f] for f in self.orders)
+
+    def _matches(self, data: Dict[str, Any]) -> bool:
+        return all(_QUERY_OPS[op](_field(data, field), value) for field, op, value in self.filters)
+
+    def _snapshots(self):
+        docs = [(doc_id, data) for doc_id, data in list(self.db.data.get(self.name, {}).items())
+                if self._matches(data)]
+        if self.orders:
+            docs.sort(key=lambda d: tuple(_order_value(d[0], d[1], f) for f in self.orders))
+        if self.cursor is not None:
+            after = self._cursor_values()
+            docs = [d for d in docs if tuple(_order_value(d[0], d[1], f) for f in self.orders) > after]
+        end = self.offset_by + self.limit_to if self.limit_to else None
+        for doc_id, data in docs[self.offset_by:end]:
+            yield FakeSnapshot(doc_id, data)
+
+    def stream(self):
+        self.db._rpc()
+        yield from self._snapshots()
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db: FakeFirestore, name: str):
+        super().__init__(db, name)
+
+    def document(self, doc_id: str) -> FakeDocRef:
+        return FakeDocRef(self.db, self.name, doc_id)
+
+
+class FakeBatch:
+    def __init__(self, db: FakeFirestore):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data: Dict[str, Any], merge: bool = False):
+        self.writes.append((ref, data, merge))
+
+    def delete(self, ref):
+        self.writes.append((ref, None, False))
+
+    def commit(self):
+        self.db._rpc()
+        for ref, data, merge in self.writes:
+            self.db._write(ref.collection, ref.id, data, merge)
+        self.writes = []
+
+
+# Async flavour, sharing storage with the sync one
+
+class FakeAsyncFirestore:
+    def __init__(self, sync_db: FakeFirestore):
+        self.sync = sync_db
+
+    async def _rpc(self):
+        with self.sync._lock:
+            self.sync.rpcs += 1
+        if self.sync.latency:
+            await asyncio.sleep(self.sync.latency)
+
+    def collection(self, name: str) -> "FakeAsyncCollection":
+        return FakeAsyncCollection(self, name)
+
+    def batch(self) -> "FakeAsyncBatch":
+        return FakeAsyncBatch(self)
+
+    async def get_all(self, refs):
+        await self._rpc()
+        for ref in refs:
+            yield self.sync._read(ref.collection, ref.id)
+
+
+class FakeAsyncDocRef:
+    def __init__(self, db: FakeAsyncFirestore, collection: str, doc_id: str):
+        self.db = db
+        self.collection = collection
+        self.id = doc_id
+
+    async def get(self) -> FakeSnapshot:
+        await self.db._rpc()
+        return self.db.sync._read(self.collection, self.id)
+
+    async def set(self, data: Dict[str, Any], merge: bool = False):
+        await self.db._rpc()
+        self.db.sync._write(self.collection, self.id, data, merge)
+
+
+class FakeAsyncCollection:
+    def __init__(self, db: FakeAsyncFirestore, name: str, query: Optional[FakeQuery] = None):
+        self.db = db
+        self.name = name
+        self.query = query or FakeQuery(db.sync, name)
+
+    def document(self, doc_id: str) -> FakeAsyncDocRef:
+        return FakeAsyncDocRef(self.db, self.name, doc_id)
+
+    def where(self, *args, **kwargs) -> "FakeAsyncCollection":
+        return FakeAsyncCollection(self.db, self.name, self.query.where(*args, **kwargs))
+
+    def limit(self, n: int) -> "FakeAsyncCollection":
+        return FakeAsyncCollection(self.db, self.name, self.query.limit(n))
+
+    def offset(self, n: int) -> "FakeAsyncCollection":
+        return FakeAsyncCollection(self.db, self.name, self.query.offset(n))
+
+    def order_by(self, field: str, direction: Any = None) -> "FakeAsyncCollection":
+        return FakeAsyncCollection(self.db, self.name, self.query.order_by(field, direction))
+
+    def start_after(self, values: Dict[str, Any]) -> "FakeAsyncCollection":
+        return FakeAsyncCollection(self.db, self.name, self.query.start_after(values))
+
+    async def stream(self):
+        await self.db._rpc()
+        for snapshot in self.query._snapshots():
+            yield snapshot
+
+
+class FakeAsyncBatch:
+    def __init__(self, db: FakeAsyncFirestore):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data: Dict[str, Any], merge: bool = False):
+        self.writes.append((ref, data, merge))
+
+    def delete(self, ref):
+        self.writes.append((ref, None, False))
+
+    async def commit(self):
+        await self.db._rpc()
+        for ref, data, merge in self.writes:
+            self.db.sync._write(ref.collection, ref.id, data, merge)
+        self.writes = []
+
+
+def install_fake_firebase(latency: float = 0.0) -> FakeFirestore:
+    """Points the shared Firestore clients at the in-memory version. Call before first use."""
+    from src.core.firebase import get_db  # noqa: F401  (registers the client factories)
+    from src.core.registry import registry
+
+    db = FakeFirestore(latency)
+    registry.override("firestore", db)
+    registry.override("firestore_async", FakeAsyncFirestore(db))
+    # Anything already built on the real clients must be rebuilt
+    registry.reset("store")
+    return db
@@ -0,0 +1,177 @@
+"""
+Load test for the HTTP service (src/server.py) with stubbed backends.
+
+Starts the server in a child process (uvicorn, fake LLMs, in-memory Firestore,
+stub weather server), then replays the conversation corpus as N concurrent
+virtual users over SSE. Each user is one session and sends its turns one after
+another. Reports time to first token, turn latency (first turns, which also
+create the session, separately), throughput and how many turns the server
+shed (503/429) at each load level.
+
+    python benchmarks/load_server.py --users 8 32 128 --llm-latency 0.2
+    python benchmarks/load_server.py --users 64 --max-concurrent 16 --max-queued 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Any, Dict, List
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_graph import DEFAULT_CORPUS, load_corpus, percentile
+
+
+def serve(args) -> None:
+    """Child process: the real app on uvicorn, every external service stubbed."""
+    import uvicorn
+    from fakes import install_fake_firebase, install_fake_llms_on_build
+    from stub_weather_server import StubWeatherServer
+
+    weather = StubWeatherServer(latency=args.weather_latency).start()
+    os.environ["WEATHER_GEOCODE_URL"] = f"{weather.url}/v1/search"
+    os.environ["WEATHER_FORECAST_URL"] = f"{weather.url}/v1/forecast"
+    os.environ["WEATHER_GEOCODE_CACHE_BACKEND"] = "memory"
+    os.environ["ROUTING_CACHE_BACKEND"] = "off"
+    os.environ["ANSWER_CACHE_BACKEND"] = "off"
+    os.environ["CHECKPOINT_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "load_checkpoints.sqlite3")
+    install_fake_firebase(latency=args.firestore_latency)
+    install_fake_llms_on_build(latency=args.llm_latency, output_tokens=args.output_tokens)
+    from src.server import create_app
+
+    app = create_app(max_concurrent=args.max_concurrent, max_queued=args.max_queued)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args) -> subprocess.Popen:
+    child_args = [
+        sys.executable, os.path.abspath(__file__), "--serve", "--port", str(args.port),
+        "--llm-latency", str(args.llm_latency), "--output-tokens", str(args.output_tokens),
+        "--firestore-latency", str(args.firestore_latency), "--weather-latency", str(args.weather_latency),
+        "--max-concurrent", str(args.max_concurrent), "--max-queued", str(args.max_queued),
+    ]
+    proc = subprocess.Popen(child_args)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{args.port}/healthz").close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("Server did not come up")
+
+
+async def user(client, index: int, level: int, conversation: Dict[str, Any], results: List[Dict[str, Any]]) -> None:
+    session_id = f"load-{level}-{index}"
+    for turn, text in enumerate(conversation["turns"]):
+        body = {"message": text, "user_id": session_id, "city": conversation["city"]}
+        start = time.perf_counter()
+        # The first turn also creates the session (stored summary, weather, OOTD)
+        record = {"first": turn == 0, "status": None, "ttft_ms": None, "ms": None, "shed": False}
+        try:
+            async with client.stream("POST", f"/sessions/{session_id}/chat", json=body) as response:
+                record["status"] = response.status_code
+                if response.status_code in (429, 503):
+                    record["shed"] = True
+                else:
+                    event = None
+                    async for line in response.aiter_lines():
+                        if line.startswith("event:"):
+                            event = line[len("event:"):].strip()
+                            if event == "token" and record["ttft_ms"] is None:
+                                record["ttft_ms"] = (time.perf_counter() - start) * 1000
+                            if event == "error":
+                                record["shed"] = True
+        except Exception as e:
+            record["status"] = type(e).__name__
+        record["ms"] = (time.perf_counter() - start) * 1000
+        results.append(record)
+        if record["shed"]:
+            # A real client would back off; stop this user's conversation here
+            return
+
+
+async def run_level(base_url: str, users: int, conversations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    import httpx
+
+    results: List[Dict[str, Any]] = []
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=300) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            user(client, i, users, conversations[i % len(conversations)], results) for i in range(users)
+        ))
+        elapsed = time.perf_counter() - start
+        health = (await client.get("/healthz")).json()
+
+    ok = [r for r in results if r["status"] == 200 and not r["shed"]]
+    latencies = [r["ms"] for r in ok if not r["first"]]
+    ttfts = [r["ttft_ms"] for r in ok if r["ttft_ms"] is not None and not r["first"]]
+    first_turns = [r["ms"] for r in ok if r["first"]]
+    return {
+        "users": users,
+        "turns_ok": len(ok),
+        "turns_shed": sum(1 for r in results if r["shed"]),
+        "turns_failed": sum(1 for r in results if r["status"] != 200 and not r["shed"]),
+        "wall_s": round(elapsed, 3),
+        "turns_per_s": round(len(ok) / elapsed, 2) if elapsed else None,
+        "ttft_ms_p50": round(percentile(ttfts, 50), 1),
+        "ttft_ms_p95": round(percentile(ttfts, 95), 1),
+        "turn_ms_p50": round(percentile(latencies, 50), 1),
+        "turn_ms_p95": round(percentile(latencies, 95), 1),
+        "turn_ms_p99": round(percentile(latencies, 99), 1),
+        "first_turn_ms_p50": round(percentile(first_turns, 50), 1),
+        "first_turn_ms_p95": round(percentile(first_turns, 95), 1),
+        "server": health["turns"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[8, 32, 128], help="Concurrent users per level")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--output-tokens", type=int, default=60)
+    parser.add_argument("--firestore-latency", type=float, default=0.02)
+    parser.add_argument("--weather-latency", type=float, default=0.05)
+    parser.add_argument("--max-concurrent", type=int, default=32, help="Server: turns running at once")
+    parser.add_argument("--max-queued", type=int, default=64, help="Server: turns waiting before 503")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    args.port = args.port or free_port()
+    proc = start_server(args)
+    try:
+        conversations = load_corpus(args.corpus)
+        levels = [asyncio.run(run_level(f"http://127.0.0.1:{args.port}", n, conversations)) for n in args.users]
+    finally:
+        proc.terminate()
+        proc.wait()
+    print(json.dumps({
+        "llm_latency_s": args.llm_latency,
+        "max_concurrent": args.max_concurrent,
+        "max_queued": args.max_queued,
+        "levels": levels,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
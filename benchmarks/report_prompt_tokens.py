@@ -0,0 +1,84 @@
+"""
+System-prompt token report: every few-shot example (old prompts) vs. the k
+examples selected per request (src/agents/examples.py).
+
+Runs each agent's example selection over the corpus messages, no LLM calls.
+The orchestrator is measured for its routing pass (subagent passes use the same
+message). Token counts use tiktoken's o200k_base when it is available offline,
+otherwise the ~4 chars/token estimate from src/core/tokens.py.
+
+    python benchmarks/report_prompt_tokens.py --k 3
+    python benchmarks/report_prompt_tokens.py --k 2 --show-selection
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+from collections import Counter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents.examples import EXAMPLES_VARIABLE, ExampleStore, split_examples
+from src.core.tokens import count_tokens, tokenizer_name
+from src.config import PROMPTS_DIR
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "routing_samples.jsonl")
+
+AGENT_PROMPTS = {
+    "orchestrator": "0_main_orchestrator.txt",
+    "occasion_formality": "1_occasion_formality.txt",
+    "item_styling": "2_item_styling.txt",
+    "color_intelligence": "3_color_intelligence.txt",
+    "temperature": "4_temperature.txt",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=3, help="Examples selected per request")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--show-selection", action="store_true", help="How often each example was picked")
+    args = parser.parse_args()
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        messages = [json.loads(line)["message"] for line in f if line.strip()]
+
+    report = {"k": args.k, "messages": len(messages),
+              "tokenizer": tokenizer_name(), "agents": {}}
+    total_full = total_selected = 0
+    for agent, prompt_file in AGENT_PROMPTS.items():
+        raw = (PROMPTS_DIR / prompt_file).read_text(encoding="utf-8")
+        template, examples = split_examples(raw)
+        store = ExampleStore(examples)
+        static_tokens = count_tokens(template.replace(EXAMPLES_VARIABLE, ""))
+        full_tokens = count_tokens(raw)
+
+        per_call, picks = [], Counter()
+        for message in messages:
+            query = f"route {message}\n" if agent == "orchestrator" else message
+            selected = store.select(query, args.k)
+            picks.update(e.title for e in selected)
+            per_call.append(static_tokens + count_tokens(store.render(selected)))
+
+        mean_selected = statistics.mean(per_call)
+        total_full += full_tokens * len(messages)
+        total_selected += sum(per_call)
+        entry = {
+            "examples": len(examples),
+            "full_prompt_tokens": full_tokens,
+            "static_tokens": static_tokens,
+            "selected_prompt_tokens_mean": round(mean_selected, 1),
+            "selected_prompt_tokens_max": max(per_call),
+            "saved_pct": round(100 * (1 - mean_selected / full_tokens), 1),
+        }
+        if args.show_selection:
+            entry["picked"] = dict(picks.most_common())
+        report["agents"][agent] = entry
+
+    report["saved_pct_overall"] = round(100 * (1 - total_selected / total_full), 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Local OpenAI-compatible chat completions server for load tests.
+
+Serves POST /v1/chat/completions (plain JSON and `stream: true` SSE) on
+127.0.0.1 with configurable per-call and per-connection latency. Counts
+requests, new TCP connections and peak concurrent requests, so client-side
+pooling and limits can be checked without network access.
+
+    python benchmarks/stub_openai_server.py --port 8766 --latency 0.1
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = "FINAL_ANSWER: Layer a trench over a knit, swap sneakers for ankle boots."
+
+
+class StubOpenAIServer:
+    def __init__(self, port: int = 0, latency: float = 0.0, connect_latency: float = 0.0):
+        self.latency = latency
+        # Extra delay on every new connection, standing in for the TLS handshake
+        # a real HTTPS endpoint costs (the stub itself is plain HTTP)
+        self.connect_latency = connect_latency
+        self.requests = 0
+        self.connections = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self.httpd.request_queue_size = 256
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.requests = self.connections = self.peak_in_flight = 0
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+                if server.connect_latency:
+                    time.sleep(server.connect_latency)
+
+            def do_GET(self):
+                # Counters for load tests that run the stub in another process
+                if self.path != "/stats":
+                    self.send_error(404)
+                    return
+                with server._lock:
+                    payload = json.dumps({"requests": server.requests, "connections": server.connections,
+                                          "peak_in_flight": server.peak_in_flight}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                if self.path == "/reset":
+                    server.reset_counters()
+                    self.send_response(204)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                    server.in_flight += 1
+                    server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+                try:
+                    if server.latency:
+                        time.sleep(server.latency)
+                    if body.get("stream"):
+                        self._stream(body)
+                    else:
+                        self._complete(body)
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def _complete(self, body):
+                payload = json.dumps({
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": ANSWER}}],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 16, "total_tokens": 26},
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, body):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                words = ANSWER.split(" ")
+                for i, word in enumerate(words):
+                    chunk = {
+                        "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": body.get("model", "stub"),
+                        "choices": [{"index": 0, "delta": {"content": word + (" " if i < len(words) - 1 else "")},
+                                     "finish_reason": None}],
+                    }
+                    self._chunk(f"data: {json.dumps(chunk)}\n\n")
+                self._chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, text: str):
+                data = text.encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "StubOpenAIServer":
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--connect-latency", type=float, default=0.0, help="Seconds added per new connection")
+    args = parser.parse_args()
+    server = StubOpenAIServer(args.port, args.latency, args.connect_latency)
+    print(f"Serving OpenAI-compatible stub on {server.url} (Ctrl+C to stop)", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Local stand-in for the Open-Meteo geocoding and forecast APIs.
+
+Serves /v1/search and /v1/forecast on 127.0.0.1 with configurable latency and
+counts upstream requests and new TCP connections, so the WeatherService HTTP
+layer can be exercised without network access. Like the real API, /v1/forecast
+takes comma-separated coordinate lists and then answers with a list. Besides the
+named CITIES, "Town <n>" geocodes to a made-up location (for many-city runs).
+
+    python benchmarks/stub_weather_server.py --port 8765 --latency 0.05
+"""
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import parse_qs, urlparse
+
+CITIES = {
+    "new york": {"latitude": 40.71427, "longitude": -74.00597, "name": "New York", "country": "United States"},
+    "london": {"latitude": 51.50853, "longitude": -0.12574, "name": "London", "country": "United Kingdom"},
+    "tokyo": {"latitude": 35.6895, "longitude": 139.69171, "name": "Tokyo", "country": "Japan"},
+    "paris": {"latitude": 48.85341, "longitude": 2.3488, "name": "Paris", "country": "France"},
+}
+
+
+def _geocode(name: str):
+    name = name.lower().strip()
+    if name in CITIES:
+        return CITIES[name]
+    match = re.fullmatch(r"town (\d+)", name)
+    if match:
+        n = int(match.group(1))
+        return {"latitude": round(-60 + (n * 7.31) % 120, 4), "longitude": round(-180 + (n * 13.7) % 360, 4),
+                "name": f"Town {n}", "country": "Stubland"}
+    return None
+
+
+class _Server(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients that timed out have hung up by the time a slow answer is written
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StubWeatherServer:
+    """
+    Threaded HTTP server; `requests` and `connections` count what reached it.
+    Set `status` to answer every request with that HTTP error instead (still counted),
+    and `forecast_shortfall` to leave that many locations out of multi-coordinate answers.
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.0):
+        self.latency = latency
+        self.status = 200
+        self.forecast_shortfall = 0
+        self.requests: Dict[str, int] = {"search": 0, "forecast": 0}
+        self.forecast_locations = 0  # summed over requests (multi-coordinate ones count each)
+        self.connections = 0
+        self._lock = threading.Lock()
+        self.httpd = _Server(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def _count(self, path: str) -> None:
+        with self._lock:
+            self.requests[path] += 1
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = parse_qs(parsed.query)
+                if server.status != 200 and parsed.path in ("/v1/search", "/v1/forecast"):
+                    server._count(parsed.path.rsplit("/", 1)[1])
+                    if server.latency:
+                        time.sleep(server.latency)
+                    self.send_error(server.status)
+                    return
+                if parsed.path == "/v1/search":
+                    server._count("search")
+                    city = _geocode(query.get("name", [""])[0])
+                    body = {"results": [city]} if city else {"generationtime_ms": 0.1}
+                elif parsed.path == "/v1/forecast":
+                    server._count("forecast")
+                    latitudes = [float(v) for v in query.get("latitude", ["0"])[0].split(",")]
+                    with server._lock:
+                        server.forecast_locations += len(latitudes)
+                    results = [
+                        {"latitude": lat, "current": {"temperature_2m": round(80 - abs(lat) / 2, 1), "weather_code": 61}}
+                        for lat in latitudes
+                    ]
+                    if server.forecast_shortfall and len(results) > 1:
+                        results = results[:max(1, len(results) - server.forecast_shortfall)]
+                    body = results if len(results) > 1 else results[0]
+                else:
+                    self.send_error(404)
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "StubWeatherServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    server = StubWeatherServer(args.port, args.latency)
+    print(f"Serving Open-Meteo stub on {server.url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
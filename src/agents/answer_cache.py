@@ -0,0 +1,109 @@
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import BaseMessage
+from ..state import SessionState
+from ..core.cache import CacheBackend, CacheStats, make_backend
+from ..core.streaming import FINAL_PREFIX
+from ..services.weather_service import WeatherService
+from ..config import ANSWER_CACHE_BACKEND, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS
+from .context import render_ootd
+from .routing_cache import normalize_message
+
+
+class AnswerCache:
+    """
+    Cross-user cache of one subagent's FINAL_ANSWERs ("does navy go with camel",
+    "what to wear at 38°F and rainy" with today's OOTD aren't personal questions).
+    Key = agent + normalized history the agent sees (usually just the latest message)
+    + the context it answers from: OOTD id (and its context's version), the weather
+    for agents that see it, and whether the answer is a fused reply.
+    Their answers quote the reading ("41°F and drizzly in London"), so the weather part
+    is the location and exact reading, not the coarse bucket the router keys on: only
+    sessions shown the same snapshot share them.
+
+    Opt-out: when the agent's prompt would carry the session summary, the answer may
+    depend on what we know about this user, so the cache is bypassed. QUESTIONs aren't
+    cached either: the exchange is still going.
+    """
+
+    def __init__(self, agent: str, backend: Optional[CacheBackend] = None, ttl: float = 0.0,
+                 uses_weather: bool = False):
+        self.agent = agent
+        self.backend = backend
+        self.ttl = ttl
+        self.uses_weather = uses_weather
+        self.stats = CacheStats()
+        self.bypassed = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, agent: str, uses_weather: bool = False) -> "AnswerCache":
+        ttl = ANSWER_CACHE_TTL_SECONDS.get(agent, 0.0)
+        backend = make_backend(
+            ANSWER_CACHE_BACKEND if ttl > 0 else "off",
+            namespace=f"answers:{agent}",
+            max_entries=ANSWER_CACHE_MAX_ENTRIES,
+            default_ttl=ttl,
+        )
+        return cls(agent, backend, ttl, uses_weather)
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @staticmethod
+    def _weather_key(weather: Optional[Dict[str, Any]]) -> str:
+        if not weather or "error" in weather:
+            return "none"
+        # The bucket adds whether it's stale (the answer then says so)
+        return f'{weather.get("location", "")}|{weather.get("temperature", "")}|{WeatherService.bucket(weather)}'
+
+    def make_key(self, state: SessionState, history: List[BaseMessage], fused: bool = False) -> str:
+        ootd = state.get("current_ootd")
+        if ootd and ootd.get("id"):
+            # Version + source hash of its context: a re-derived or edited outfit gets new answers
+            record = ootd.get("context") or {}
+            ootd_key = f'{ootd["id"]}:{record.get("version", "")}:{record.get("source_hash", "")}'
+        else:
+            # No id: what the agent would be shown stands in for it
+            ootd_key = hashlib.sha1(render_ootd(ootd, include_variants=True).encode("utf-8")).hexdigest()[:12]
+        fingerprint = "|".join([
+            self.agent,
+            ootd_key,
+            self._weather_key(state.get("weather_data")) if self.uses_weather else "-",
+            "fused" if fused else "expert",
+        ])
+        conversation = "\x1e".join(f"{m.type}:{normalize_message(m.content)}" for m in history)
+        raw = f"{conversation}\x1f{fingerprint}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def key_for(self, state: SessionState, history: List[BaseMessage], includes_summary: bool,
+                fused: bool = False) -> Optional[str]:
+        """The cache key for this call, or None when it shouldn't use the cache."""
+        if not self.enabled:
+            return None
+        if includes_summary and state.get("summary"):
+            with self._lock:
+                self.bypassed += 1
+            return None
+        return self.make_key(state, history, fused)
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        content = self.backend.get(key)
+        self.stats.record(content is not None)
+        return content
+
+    def put(self, key: Optional[str], content: str) -> None:
+        if key is None or not content.lstrip().startswith(FINAL_PREFIX):
+            return
+        self.backend.set(key, content, self.ttl)
+
+    def metrics(self) -> Dict[str, Any]:
+        data = self.stats.as_dict()
+        data["bypassed_summary"] = self.bypassed
+        data["size"] = len(self.backend) if self.enabled else 0
+        data["ttl_s"] = self.ttl if self.enabled else 0
+        return data
@@ -1,23 +1,53 @@
 from pathlib import Path
+from typing import Any, Optional
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_openai import ChatOpenAI
-from ..config import PROMPTS_DIR, LLM_MODEL, OPENAI_API_KEY
+from .context import ContextAssembler
+from .examples import EXAMPLES_VARIABLE, ExampleStore, split_examples
+from ..core.tokens import count_tokens
+from ..core.llm_pool import get_llm
+from ..core.tracing import span, usage_attrs
+from ..config import PROMPTS_DIR, LLM_MODEL, FEW_SHOT_K
 
 class BaseAgent:
     def __init__(self, name: str, prompt_file: str):
         self.name = name
         self.prompt_path = PROMPTS_DIR / prompt_file
-        self.llm = ChatOpenAI(model=LLM_MODEL, api_key=OPENAI_API_KEY, temperature=0.7)
+        # Shared client: one HTTP pool and in-flight limit for every agent
+        self.llm = get_llm(LLM_MODEL, temperature=0.7)
         self.prompt_template = self._load_prompt()
+        self.context = ContextAssembler(name)
 
     def _load_prompt(self) -> ChatPromptTemplate:
         with open(self.prompt_path, 'r', encoding='utf-8') as f:
-            system_prompt = f.read()
+            raw_prompt = f.read()
+        # The <examples> block becomes an {examples} slot, filled per request
+        # with the most relevant few (see examples_for); the rest stays static.
+        system_prompt, examples = split_examples(raw_prompt)
+        self.example_store = ExampleStore(examples)
+        self.full_prompt_tokens = count_tokens(raw_prompt)
+        self.system_prompt_tokens = count_tokens(system_prompt.replace(EXAMPLES_VARIABLE, ""))
         
         return ChatPromptTemplate.from_messages([
             ("system", system_prompt),
             MessagesPlaceholder(variable_name="messages"),
         ])
 
+    def examples_for(self, query: str, k: int = FEW_SHOT_K) -> str:
+        """The k examples closest to `query` (plus pinned ones), rendered for the {examples} slot."""
+        return self.example_store.render(self.example_store.select(query, k))
+
     def get_chain(self):
         return self.prompt_template | self.llm
+
+    def run_llm(self, llm_input: Any, runnable: Optional[Any] = None, step: str = "chat", **kwargs) -> Any:
+        """Calls the agent's chain (or `runnable`) inside an "llm" span with token usage."""
+        with span("llm", self.name, step=step) as llm_span:
+            response = (runnable or self.get_chain()).invoke(llm_input, **kwargs)
+            llm_span.attrs.update(usage_attrs(response))
+        return response
+
+    async def arun_llm(self, llm_input: Any, runnable: Optional[Any] = None, step: str = "chat", **kwargs) -> Any:
+        with span("llm", self.name, step=step) as llm_span:
+            response = await (runnable or self.get_chain()).ainvoke(llm_input, **kwargs)
+            llm_span.attrs.update(usage_attrs(response))
+        return response
@@ -0,0 +1,158 @@
+import logging
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from ..state import SessionState
+from ..core.tokens import count_message_tokens, count_tokens
+from ..services.weather_service import WeatherService
+
+logger = logging.getLogger(__name__)
+
+# How much conversation each agent gets.
+# - "latest":  only the latest user message
+# - "last_k":  the last k turns (a turn starts at a user message)
+# - "summary": latest user message, older context comes from the summary only
+# history_budget caps the tokens spent on history; the latest message is always kept.
+AGENT_CONTEXT_POLICIES: Dict[str, Dict[str, Any]] = {
+    "orchestrator": {"history": "last_k", "k": 3, "history_budget": 1200},
+    "occasion_formality": {"history": "last_k", "k": 3, "history_budget": 800},
+    "item_styling": {"history": "summary", "history_budget": 400},
+    "color_intelligence": {"history": "summary", "history_budget": 400},
+    "temperature": {"history": "latest", "history_budget": 400},
+}
+DEFAULT_POLICY = {"history": "latest", "history_budget": 400}
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, dict):
+        return "; ".join(f"{k}: {_format_value(v)}" for k, v in value.items() if v)
+    if isinstance(value, (list, tuple)):
+        return ", ".join(_format_value(v) for v in value if v)
+    return str(value)
+
+
+# Which parts of the structured OOTD record (see repositories/ootd_context) each
+# reader needs; the dress-up/down variants are switched on separately.
+OOTD_FIELDS: Dict[str, tuple] = {
+    "orchestrator": ("items", "season"),
+    "occasion_formality": ("items", "formality", "season"),
+    "item_styling": ("items", "formality"),
+    "color_intelligence": ("items", "colors", "season"),
+    "temperature": ("items", "season"),
+}
+DEFAULT_OOTD_FIELDS = ("items", "season")
+
+
+def render_ootd(ootd: Optional[Dict[str, Any]], include_variants: bool = False,
+                fields: tuple = DEFAULT_OOTD_FIELDS) -> str:
+    """Compact OOTD block instead of a Python dict repr: the precomputed facts the reader needs."""
+    if not ootd:
+        return "Not available"
+    # OOTDs loaded before the context existed (old checkpoints) render from the top-level fields
+    record = ootd.get("context") or {}
+    lines = [f"Structure: {ootd.get('formula') or ootd.get('description') or 'Unknown'}"]
+    if "items" in fields and record.get("items"):
+        lines.append(f"Items: {' + '.join(record['items'])}")
+    if "colors" in fields and record.get("colors"):
+        undertone = f" ({record['undertone']})" if record.get("undertone") else ""
+        lines.append(f"Colors: {', '.join(record['colors'])}{undertone}")
+    if "formality" in fields and record.get("formality"):
+        lines.append(f"Formality: {record['formality']}")
+    season = record.get("season") or ootd.get("season")
+    if "season" in fields and season and season != "Unknown":
+        lines.append(f"Season: {season}")
+    if include_variants:
+        dress_up = record.get("dress_it_up") or ootd.get("dress_it_up")
+        dress_down = record.get("dress_it_down") or ootd.get("dress_it_down")
+        if dress_up:
+            lines.append(f"Dress it up: {_format_value(dress_up)}")
+        if dress_down:
+            lines.append(f"Dress it down: {_format_value(dress_down)}")
+    return "\n".join(lines)
+
+
+def render_weather(weather: Optional[Dict[str, Any]]) -> str:
+    """Compact weather block instead of a Python dict repr."""
+    if not weather or "error" in weather:
+        return "Not available"
+    lines = [
+        f"Temperature: {weather.get('temperature', 'Unknown')}",
+        f"Conditions: {weather.get('conditions', 'Unknown')}",
+    ]
+    if weather.get("location"):
+        lines.append(f"Location: {weather['location']}")
+    lines.append(f"Source: {weather.get('source', 'Unknown')}")
+    if WeatherService.is_stale(weather):
+        lines.append(f"STALE: fetched {WeatherService.age(weather) / 60:.0f} min ago, conditions may have changed")
+    return "\n".join(lines)
+
+
+def is_agent_signal(message: BaseMessage) -> bool:
+    """Subagent output (FINAL_ANSWER / QUESTION) waiting to be composed by the orchestrator."""
+    return isinstance(message, AIMessage) and (
+        "FINAL_ANSWER" in message.content or "QUESTION" in message.content
+    )
+
+
+def latest_user_message(messages: List[BaseMessage]) -> str:
+    """Content of the most recent user message (subagent answers may follow it)."""
+    for m in reversed(messages):
+        if isinstance(m, HumanMessage):
+            return m.content
+    return messages[-1].content if messages else ""
+
+
+class ContextAssembler:
+    """
+    Picks the history each agent sees and keeps it within a token budget.
+    Subagent FINAL_ANSWER / QUESTION signals are never replayed as history;
+    the orchestrator gets them through <agent_response> instead.
+    """
+
+    def __init__(self, agent_name: str, policy: Optional[Dict[str, Any]] = None):
+        self.agent_name = agent_name
+        self.policy = policy or AGENT_CONTEXT_POLICIES.get(agent_name, DEFAULT_POLICY)
+        self.last_usage: Dict[str, int] = {}
+
+    @property
+    def includes_summary(self) -> bool:
+        return self.policy["history"] in ("summary", "last_k")
+
+    def history(self, state: SessionState) -> List[BaseMessage]:
+        messages = [m for m in state["messages"] if not is_agent_signal(m)]
+        if not messages:
+            return []
+
+        mode = self.policy["history"]
+        if mode == "last_k":
+            selected, turns = [], 0
+            for m in reversed(messages):
+                selected.append(m)
+                if isinstance(m, HumanMessage):
+                    turns += 1
+                    if turns >= self.policy.get("k", 1):
+                        break
+            selected.reverse()
+        else:
+            # "latest" and "summary": just the latest user message
+            latest = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), messages[-1])
+            selected = [latest]
+
+        # Enforce the budget by dropping the oldest messages first
+        budget = self.policy.get("history_budget")
+        while budget and len(selected) > 1 and count_message_tokens(selected) > budget:
+            selected.pop(0)
+        return selected
+
+    def log_usage(self, system_prompt_tokens: int, history: List[BaseMessage], context_str: str) -> Dict[str, int]:
+        usage = {
+            "system": system_prompt_tokens,
+            "history": count_message_tokens(history),
+            "context": count_tokens(context_str),
+        }
+        usage["total"] = sum(usage.values())
+        self.last_usage = usage
+        logger.info(
+            "tokens sent agent=%s system=%d history=%d (%d msgs) context=%d total=%d",
+            self.agent_name, usage["system"], usage["history"], len(history), usage["context"], usage["total"],
+        )
+        return usage
@@ -0,0 +1,71 @@
+import re
+from typing import Dict, List, Tuple
+from .intent_classifier import TfidfModel
+
+EXAMPLES_BLOCK = re.compile(r"<examples>\s*\n(.*?)\n\s*</examples>", re.S)
+EXAMPLE_HEADER = re.compile(r"^EXAMPLE [0-9A-Za-z]+:", re.M)
+# Examples showing what NOT to do are guidance for every request, so they are always kept
+PINNED_TITLE = re.compile(r"\bWRONG\b")
+# Placeholder left in the system prompt where the selected examples go
+EXAMPLES_VARIABLE = "{examples}"
+
+
+class Example:
+    def __init__(self, index: int, text: str):
+        self.index = index
+        self.text = text.strip()
+        self.title = self.text.splitlines()[0]
+        self.pinned = bool(PINNED_TITLE.search(self.title))
+
+
+def split_examples(prompt: str) -> Tuple[str, List[Example]]:
+    """
+    Pulls the EXAMPLE entries out of the prompt's <examples> block.
+    Returns the prompt with the block's content replaced by EXAMPLES_VARIABLE, and the examples.
+    Prompts without an <examples> block come back unchanged, with no examples.
+    """
+    match = EXAMPLES_BLOCK.search(prompt)
+    if not match:
+        return prompt, []
+    body = match.group(1)
+    starts = [m.start() for m in EXAMPLE_HEADER.finditer(body)]
+    examples = [
+        Example(i, body[start:end])
+        for i, (start, end) in enumerate(zip(starts, starts[1:] + [len(body)]))
+    ]
+    template = prompt[:match.start(1)] + EXAMPLES_VARIABLE + prompt[match.end(1):]
+    return template, examples
+
+
+class ExampleStore:
+    """
+    Indexes a prompt's few-shot examples and picks the ones closest to a request
+    (TF-IDF similarity, the same local model the pre-router uses).
+    Selected examples keep their original order; pinned ones are always included.
+    """
+
+    def __init__(self, examples: List[Example]):
+        self.examples = examples
+        if examples:
+            # Match on the title and the opening lines (the example's input) as well
+            # as the whole text, so long example answers don't drown out the input
+            docs: Dict[str, List[str]] = {
+                str(e.index): [e.title, "\n".join(e.text.splitlines()[:6]), e.text]
+                for e in examples
+            }
+            self.model = TfidfModel(docs)
+
+    def select(self, query: str, k: int) -> List[Example]:
+        if k <= 0 or k >= len(self.examples):
+            return list(self.examples)
+        scores = self.model.scores(query)
+        pinned = [e for e in self.examples if e.pinned]
+        candidates = [e for e in self.examples if not e.pinned]
+        # Ties (including "no overlap at all") fall back to the prompt's own order
+        ranked = sorted(candidates, key=lambda e: (-scores[str(e.index)], e.index))
+        chosen = {e.index for e in pinned + ranked[:k]}
+        return [e for e in self.examples if e.index in chosen]
+
+    @staticmethod
+    def render(examples: List[Example]) -> str:
+        return "\n\n".join(e.text for e in examples)
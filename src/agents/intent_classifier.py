@@ -0,0 +1,149 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from .routing_cache import normalize_message
+
+# Keyword rules mirror <routing_rules> in subagents/0_main_orchestrator.txt
+ROUTE_PATTERNS: Dict[str, List[str]] = {
+    "occasion_formality": [
+        r"\bdress (it |this |me )?(up|down)\b", r"\bdress it\b", r"\bmake it (more )?(formal|casual)\b",
+        r"\bmore professional\b", r"\bless formal\b", r"\bwhat (to|should i|do i) wear\b",
+        r"\boutfit for\b", r"\b(work|office|wedding|interview|date night|brunch|party|dinner|meeting)\b",
+        r"\bdress code\b", r"\bbusiness casual\b",
+    ],
+    "item_styling": [
+        r"\bstyle (my|this|these|a|an)\b", r"\bways to wear\b", r"\bhow (do i |to |can i |should i )?wear\b",
+        r"\boutfit ideas with\b", r"\bwhat (can|do) i wear with my\b",
+    ],
+    "color_intelligence": [
+        r"\bgo(es)? with\b", r"\bmatch(es|ing)?\b", r"\bpair(s|ing)?\b", r"\bwhat colou?rs?\b",
+        r"\bcolou?rs?\b", r"\bpalette\b", r"\bdoes (navy|black|white|olive|tan|camel|red|pink|green|blue|"
+        r"burgundy|brown|grey|gray|beige|cream|rust|mustard|purple|yellow|orange)\b",
+    ],
+    "temperature": [
+        r"\bdegrees?\b", r"\b\d{2,3}\s?f\b", r"\bcold\b", r"\bhot\b", r"\bweather\b", r"\blayers?\b",
+        r"\blayering\b", r"\btemperature\b", r"\bwarm enough\b", r"\bchilly\b", r"\brain(y|ing)?\b",
+        r"\bsnow(y|ing)?\b", r"\bfreezing\b", r"\bhumid\b", r"\bwindy\b",
+    ],
+}
+
+# Messages the orchestrator answers itself (greetings, thanks, vague asks).
+# These always go to the LLM so it can write the DIRECT_RESPONSE.
+DIRECT_PATTERNS = [
+    r"^(hi|hello|hey|yo|hiya)\b", r"\bthanks?\b", r"\bthank you\b", r"^help( me)?$", r"\bi don t know\b",
+]
+
+# Seed utterances for the similarity model, one small bag per route
+SEED_EXAMPLES: Dict[str, List[str]] = {
+    "occasion_formality": [
+        "dress it up", "dress this down", "what should i wear to work", "make it more casual",
+        "outfit for a wedding", "i have a job interview tomorrow", "business casual no jeans",
+        "what to wear for date night", "is this too formal for brunch", "make it more professional",
+    ],
+    "item_styling": [
+        "style my black skirt", "3 ways to wear olive pants", "how do i wear this blazer",
+        "outfit ideas with a denim jacket", "how can i style white sneakers", "ways to wear a slip dress",
+    ],
+    "color_intelligence": [
+        "does olive go with tan", "what goes with burgundy", "do these colors work together",
+        "does navy go with camel", "what color shoes match this", "can i pair pink and red",
+        "what colors are in my palette",
+    ],
+    "temperature": [
+        "it is 59 degrees", "what should i layer", "it is really cold today", "is it warm enough for this",
+        "what to wear in the rain", "it is hot and humid", "how should i dress for this weather",
+        "it is freezing outside", "will i be cold in this",
+    ],
+}
+
+
+def _tokens(text: str) -> List[str]:
+    return normalize_message(text).split()
+
+
+class TfidfModel:
+    """Tiny TF-IDF + cosine similarity model over labelled texts (pure Python, CPU only)."""
+
+    def __init__(self, examples: Dict[str, List[str]]):
+        self.labels = list(examples)
+        docs = [(route, _tokens(text)) for route, texts in examples.items() for text in texts]
+        df = Counter(tok for _, toks in docs for tok in set(toks))
+        n = len(docs)
+        self.idf = {tok: math.log((1 + n) / (1 + count)) + 1 for tok, count in df.items()}
+        self.docs = [(route, self._vectorize(toks)) for route, toks in docs]
+
+    def _vectorize(self, toks: List[str]) -> Dict[str, float]:
+        tf = Counter(toks)
+        vec = {tok: count * self.idf.get(tok, 0.0) for tok, count in tf.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        return {tok: v / norm for tok, v in vec.items()}
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """Best cosine similarity per label (nearest text), e.g. per route."""
+        query = self._vectorize(_tokens(text))
+        best = {label: 0.0 for label in self.labels}
+        for route, vec in self.docs:
+            sim = sum(weight * vec.get(tok, 0.0) for tok, weight in query.items())
+            if sim > best[route]:
+                best[route] = sim
+        return best
+
+
+class IntentClassifier:
+    """
+    Local fast-path router: keyword/regex rules + TF-IDF similarity.
+    `classify` returns (route, confidence). Route is None when the message
+    should go to the LLM (greetings, vague or ambiguous asks).
+    """
+
+    def __init__(self, patterns: Dict[str, List[str]] = ROUTE_PATTERNS,
+                 examples: Dict[str, List[str]] = SEED_EXAMPLES):
+        self.patterns = {route: [re.compile(p) for p in pats] for route, pats in patterns.items()}
+        self.direct_patterns = [re.compile(p) for p in DIRECT_PATTERNS]
+        self.model = TfidfModel(examples)
+
+    def _rule_hits(self, text: str) -> Dict[str, int]:
+        return {route: sum(1 for p in pats if p.search(text)) for route, pats in self.patterns.items()}
+
+    def is_direct(self, message: str) -> bool:
+        """Greeting, thanks or a bare ask for help: the orchestrator answers itself."""
+        text = normalize_message(message)
+        return any(p.search(text) for p in self.direct_patterns)
+
+    def classify(self, message: str) -> Tuple[Optional[str], float]:
+        text = normalize_message(message)
+        if not text or self.is_direct(message):
+            return None, 0.0
+
+        hits = self._rule_hits(text)
+        matched = [route for route, count in hits.items() if count]
+        if len(matched) == 1:
+            rule_route, rule_conf = matched[0], 0.85
+        elif set(matched) in ({"occasion_formality", "temperature"}, {"occasion_formality", "color_intelligence"}):
+            # MULTI-CONSTRAINT rule: occasion agent handles both
+            rule_route, rule_conf = "occasion_formality", 0.7
+        elif matched:
+            rule_route, rule_conf = max(matched, key=lambda r: hits[r]), 0.4
+        else:
+            rule_route, rule_conf = None, 0.0
+
+        sims = self.model.scores(text)
+        ranked = sorted(sims.items(), key=lambda kv: kv[1], reverse=True)
+        sim_route, top = ranked[0]
+        margin = top - ranked[1][1]
+        sim_conf = min(1.0, top * (0.5 + margin))
+
+        if rule_route is None:
+            return (sim_route, sim_conf * 0.8) if top > 0 else (None, 0.0)
+        if rule_route == sim_route:
+            return rule_route, min(1.0, rule_conf + 0.5 * sim_conf)
+        # Rules and similarity disagree: trust the rule, but with less confidence
+        return rule_route, rule_conf * (1.0 - sim_conf / 2)
+
+    def route(self, message: str, threshold: float) -> Optional[str]:
+        """Returns the route if confidence clears `threshold`, otherwise None (use the LLM)."""
+        route, confidence = self.classify(message)
+        if route and confidence >= threshold:
+            return route
+        return None
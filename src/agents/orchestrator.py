@@ -1,53 +1,127 @@
-from typing import Dict, Any, List
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, RemoveMessage
-from langchain_openai import ChatOpenAI
+import uuid
+from typing import Dict, Any, List, Optional, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, RemoveMessage
 from ..state import SessionState
 from .base import BaseAgent
-from ..config import LLM_MODEL, OPENAI_API_KEY
+from .context import OOTD_FIELDS, is_agent_signal, latest_user_message, render_ootd, render_weather
+from .routing_cache import RoutingCache, parse_routes
+from ..core.streaming import DIRECT_PREFIX, ROUTING_PASS_TAG
+from ..core.tokens import count_message_tokens, count_tokens
+from ..core.llm_pool import get_llm
+from ..config import LLM_MODEL, SUMMARY_TRIGGER_TOKENS, SUMMARY_KEEP_LAST_MESSAGES
 
 class Orchestrator(BaseAgent):
     def __init__(self):
         super().__init__("orchestrator", "0_main_orchestrator.txt")
-        self.summarizer_llm = ChatOpenAI(model=LLM_MODEL, api_key=OPENAI_API_KEY, temperature=0)
+        self.summarizer_llm = get_llm(LLM_MODEL, temperature=0)
+        self.routing_cache = RoutingCache.from_config()
 
-    def compress_context(self, state: SessionState) -> Dict[str, Any]:
+    def _plan_compression(self, state: SessionState) -> Optional[Dict[str, Any]]:
         """
-        Implements Context Compression and Trimming.
-        - Summarizes conversation if > 10 messages.
-        - Trims old messages.
+        Implements incremental Context Compression and Trimming.
+        - Only messages after the summary watermark are new to the summarizer.
+        - Once those exceed SUMMARY_TRIGGER_TOKENS, everything but the last
+          SUMMARY_KEEP_LAST_MESSAGES is folded into the rolling summary.
+        - Folded messages are dropped from state via RemoveMessage (add_messages reducer).
         """
         messages = state["messages"]
         summary = state.get("summary", "")
-        
-        # Compression Rule: Summarize after 10 messages
-        if len(messages) > 10:
-            # Create summary of the conversation so far
-            summary_prompt = (
-                f"Distill the following conversation into a concise summary, "
-                f"focusing on user preferences, decisions made, and key context. "
-                f"Existing summary: {summary}\n\n"
-                f"New messages: {messages}"
-            )
-            response = self.summarizer_llm.invoke([HumanMessage(content=summary_prompt)])
-            new_summary = response.content
-            
-            # Trimming Rule: Keep last 5 messages + summary
-            # We return a list of RemoveMessage for the ones we want to delete
-            # and update the summary.
-            # In LangGraph, we can return {'messages': [RemoveMessage(id=m.id) ...], 'summary': new_summary}
-            
-            # For this implementation, we'll just return the new summary and let the graph handle message updates
-            # if we were using the advanced add_messages reducer. 
-            # Since we are using a simple list in our state definition (for now), we might need to manually slice.
-            # But let's assume we want to return the updates.
-            
-            # Ideally, we'd return:
-            # return {"summary": new_summary, "messages": [RemoveMessage(id=m.id) for m in messages[:-5]]}
-            
-            # Simplified for this step:
-            return {"summary": new_summary}
-            
-        return {}
+
+        # Messages up to (and including) the watermark are already in the summary
+        start = 0
+        watermark = state.get("summary_watermark")
+        if watermark:
+            ids = [m.id for m in messages]
+            if watermark in ids:
+                start = ids.index(watermark) + 1
+
+        pending = messages[start:]
+        if len(pending) <= SUMMARY_KEEP_LAST_MESSAGES:
+            return None
+        if count_message_tokens(pending) <= SUMMARY_TRIGGER_TOKENS:
+            return None
+
+        # Fold everything except the tail into the summary
+        cut = len(messages) - SUMMARY_KEEP_LAST_MESSAGES
+        to_fold = messages[start:cut]
+        summary_prompt = (
+            f"Update the running summary of this styling conversation with the new messages below. "
+            f"Keep it concise, focusing on user preferences, decisions made, and key context.\n\n"
+            f"Existing summary:\n{summary or 'None'}\n\n"
+            f"New messages:\n{self._format_transcript(to_fold)}"
+        )
+        return {"prompt": summary_prompt, "to_fold": to_fold, "removed": messages[:cut]}
+
+    def needs_compression(self, state: SessionState) -> bool:
+        """Whether this pass will fold messages into the summary first."""
+        return self._plan_compression(state) is not None
+
+    def compress_context(self, state: SessionState) -> Dict[str, Any]:
+        plan = self._plan_compression(state)
+        if not plan:
+            return {}
+        # Tagged "nostream" so summary tokens never reach the chat UI
+        response = self.run_llm(
+            [HumanMessage(content=plan["prompt"])], self.summarizer_llm, step="summarize",
+            config={"tags": ["nostream"]},
+        )
+        return self._compression_update(plan, response.content)
+
+    async def acompress_context(self, state: SessionState) -> Dict[str, Any]:
+        plan = self._plan_compression(state)
+        if not plan:
+            return {}
+        response = await self.arun_llm(
+            [HumanMessage(content=plan["prompt"])], self.summarizer_llm, step="summarize",
+            config={"tags": ["nostream"]},
+        )
+        return self._compression_update(plan, response.content)
+
+    @staticmethod
+    def _compression_update(plan: Dict[str, Any], new_summary: str) -> Dict[str, Any]:
+        # The watermark must be a message the client also keeps (user or ALI turn),
+        # not an internal subagent signal the UI never sees.
+        visible = [m for m in plan["to_fold"] if not is_agent_signal(m)]
+        watermark = (visible or plan["to_fold"])[-1].id
+
+        # Trimming Rule: keep summary + last N messages
+        return {
+            "summary": new_summary,
+            "summary_watermark": watermark,
+            "messages": [RemoveMessage(id=m.id) for m in plan["removed"] if m.id],
+        }
+
+    @staticmethod
+    def _format_transcript(messages: List[BaseMessage]) -> str:
+        speakers = {"human": "User", "ai": "ALI"}
+        lines = []
+        for m in messages:
+            speaker = speakers.get(m.type, m.type)
+            if is_agent_signal(m):
+                speaker = "Expert"
+            lines.append(f"{speaker}: {m.content}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _apply_compression(state: SessionState, update: Dict[str, Any]) -> SessionState:
+        """Local view of the state after the compression update, used for this turn's LLM call."""
+        removed = {m.id for m in update.get("messages", [])}
+        return {
+            **state,
+            "summary": update["summary"],
+            "summary_watermark": update["summary_watermark"],
+            "messages": [m for m in state["messages"] if m.id not in removed],
+        }
+
+    @staticmethod
+    def _with_compression(result: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+        """Merges the compression update (summary, watermark, removals) into the node result."""
+        if not update:
+            return result
+        result["summary"] = update["summary"]
+        result["summary_watermark"] = update["summary_watermark"]
+        result["messages"] = update["messages"] + result.get("messages", [])
+        return result
 
     def route(self, state: SessionState) -> Dict[str, Any]:
         """
@@ -128,30 +202,62 @@ class Orchestrator(BaseAgent):
         
         return super()._load_prompt()
 
-    def invoke(self, state: SessionState):
-        # 1. Compress Context
-        compression_update = self.compress_context(state)
+    @staticmethod
+    def agent_signals(state: SessionState) -> List[BaseMessage]:
+        """The subagent messages at the end of the conversation, oldest first."""
+        answers = []
+        for msg in reversed(state["messages"]):
+            if not is_agent_signal(msg):
+                break
+            answers.append(msg)
+        answers.reverse()
+        return answers
+
+    @staticmethod
+    def agent_response(state: SessionState) -> str:
+        """
+        Returns the subagent output if the conversation ends with agent messages
+        (FINAL_ANSWER or QUESTION), otherwise "" (routing pass).
+        After a fan-out several experts answer at once; each is labelled by name.
+        """
+        answers = Orchestrator.agent_signals(state)
+        if len(answers) <= 1:
+            return answers[0].content if answers else ""
+        return "\n\n".join(f"[{m.name or 'expert'}]\n{m.content}" for m in answers)
+
+    @staticmethod
+    def route_update(routes: List[str]) -> Dict[str, Any]:
+        """State update sending the turn to `routes` (run in parallel), or ending it when empty."""
+        return {"next_agent": routes[0] if routes else "end", "next_agents": list(routes)}
+
+    def _prepare(
+        self, state: SessionState, compression_update: Dict[str, Any]
+    ) -> Tuple[SessionState, Optional[Dict[str, Any]], Dict[str, Any], str]:
+        """
+        Everything before the LLM call. Returns (state, early_result, chain_input, agent_response).
+        `early_result` is set when no LLM call is needed (routing cache hit).
+        """
         if compression_update:
-            # In a real graph, we'd yield this update. 
-            # For now, we just update the local state copy to use in this turn.
-            state["summary"] = compression_update["summary"]
+            # The graph applies the update through the reducers; this turn
+            # already works on the compressed view.
+            state = self._apply_compression(state, compression_update)
         
-        # 2. Prepare Context String
-        user_msg = state["messages"][-1].content
+        # On a compose pass the last messages are expert answers, not the user's
+        user_msg = latest_user_message(state["messages"])
         ootd = state.get("current_ootd")
-        ootd_str = f"Structure: {ootd.get('description')}" if ootd else "Not available"
-        weather = state.get("weather_data")
-        weather_str = str(weather) if weather else "Not available"
+        ootd_str = render_ootd(ootd, fields=OOTD_FIELDS["orchestrator"])
+        weather_str = render_weather(state.get("weather_data"))
         summary = state.get("summary", "")
         
-        # Check if the last message is from an agent (contains FINAL_ANSWER or QUESTION)
-        # and populate <agent_response> to trigger composition.
-        last_msg = state["messages"][-1]
-        agent_response_str = ""
-        if isinstance(last_msg, AIMessage):
-            content = last_msg.content
-            if "FINAL_ANSWER" in content or "QUESTION" in content:
-                agent_response_str = content
+        # Populate <agent_response> to trigger composition.
+        agent_response_str = self.agent_response(state)
+
+        # Routing pass: a cached decision skips the LLM round trip entirely.
+        # Only the route is cached, the composed answer always comes from the LLM.
+        if not agent_response_str:
+            cached_routes = self.routing_cache.get(state)
+            if cached_routes:
+                return state, self._with_compression(self.route_update(cached_routes), compression_update), {}, ""
 
         context_str = f"""
 <inputs_you_receive>
@@ -181,29 +287,70 @@ class Orchestrator(BaseAgent):
    - Color agent: No weather_data needed
    - Temperature agent: No seasonal palette needed (unless relevant)
 
-2. **Compression**: After 10 messages, summarize conversation
+2. **Compression**: Older turns are folded into session_memory
 3. **Trimming**: Remove resolved questions from history
 </context_management>
 """
         
-        # 3. Invoke
-        # We prepend the context string to the messages or append to system prompt
-        messages = state["messages"]
-        # Add context as a system message just before the user message? 
-        # Or just rely on the system prompt having the structure and we fill it?
+        # Only the last few turns go in (token-budgeted); older context is in the summary.
+        messages = self.context.history(state)
+        # Routing and composing need different examples. The example titles say which
+        # they show ("Route to ...", "Compose ..."), so the pass type is part of the query.
+        examples = self.examples_for(
+            f"{'compose' if agent_response_str else 'route'} {user_msg}\n{agent_response_str}"
+        )
         # The system prompt has the structure but empty placeholders.
         # I will append a SystemMessage with the filled context.
-        
-        chain = self.get_chain()
-        response = chain.invoke({
-            "messages": messages + [SystemMessage(content=context_str)]
-        })
-        
-        content = response.content
-        if "ROUTE:" in content:
-            agent_name = content.split("ROUTE:")[1].strip().lower()
-            return {"next_agent": agent_name, "summary": state.get("summary", "")}
+        self.context.log_usage(self.system_prompt_tokens + count_tokens(examples), messages, context_str)
+        chain_input = {"messages": messages + [SystemMessage(content=context_str)], "examples": examples}
+        return state, None, chain_input, agent_response_str
+
+    def _parse_response(self, state: SessionState, content: str, agent_response_str: str,
+                        compression_update: Dict[str, Any]) -> Dict[str, Any]:
+        # A reply that opens with DIRECT_RESPONSE was already streamed as one
+        if "ROUTE:" in content and not content.lstrip().startswith(DIRECT_PREFIX):
+            # One or more experts, e.g. "ROUTE: color_intelligence, temperature"
+            raw = content.split("ROUTE:")[1].strip().lower()
+            routes = parse_routes(raw) or [raw]
+            if not agent_response_str:
+                self.routing_cache.put(state, routes)
+            result = {**self.route_update(routes), "summary": state.get("summary", "")}
         else:
             # Clean up DIRECT_RESPONSE prefix if present
             final_content = content.replace("DIRECT_RESPONSE:", "").strip()
-            return {"next_agent": "end", "messages": [AIMessage(content=final_content)], "summary": state.get("summary", "")}
+            result = {
+                **self.route_update([]),
+                "messages": [AIMessage(content=final_content, id=str(uuid.uuid4()))],
+                "summary": state.get("summary", ""),
+            }
+        if agent_response_str:
+            # The expert answers are composed now; drop them so the graph state
+            # (checkpointed between turns) holds just the visible conversation
+            consumed = [RemoveMessage(id=m.id) for m in self.agent_signals(state) if m.id]
+            result["messages"] = result.get("messages", []) + consumed
+        return self._with_compression(result, compression_update)
+
+    @staticmethod
+    def _pass_config(agent_response_str: str) -> Dict[str, Any]:
+        # Tells UserFacingStream whether this call routes or composes
+        return {} if agent_response_str else {"tags": [ROUTING_PASS_TAG]}
+
+    def invoke(self, state: SessionState):
+        # 1. Compress Context
+        compression_update = self.compress_context(state)
+        # 2. Prepare Context
+        state, early_result, chain_input, agent_response_str = self._prepare(state, compression_update)
+        if early_result is not None:
+            return early_result
+        # 3. Invoke
+        response = self.run_llm(chain_input, config=self._pass_config(agent_response_str))
+        return self._parse_response(state, response.content, agent_response_str, compression_update)
+
+    async def ainvoke(self, state: SessionState):
+        """Async twin of `invoke`; the LLM calls don't block the event loop."""
+        compression_update = await self.acompress_context(state)
+        state, early_result, chain_input, agent_response_str = self._prepare(state, compression_update)
+        if early_result is not None:
+            return early_result
+        response = await self.arun_llm(chain_input, config=self._pass_config(agent_response_str))
+        return self._parse_response(state, response.content, agent_response_str, compression_update)
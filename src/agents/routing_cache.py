@@ -0,0 +1,111 @@
+import hashlib
+import re
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from ..state import SessionState
+from ..core.cache import CacheBackend, CacheStats, make_backend
+from ..services.weather_service import WeatherService
+from ..config import ROUTING_CACHE_BACKEND, ROUTING_CACHE_TTL_SECONDS, ROUTING_CACHE_MAX_ENTRIES, MAX_FANOUT_AGENTS
+
+# The only routes worth caching. DIRECT_RESPONSE carries an answer, so it never goes in.
+AGENT_ROUTES = ("occasion_formality", "item_styling", "color_intelligence", "temperature")
+
+
+def parse_routes(text: str, max_routes: int = MAX_FANOUT_AGENTS) -> List[str]:
+    """
+    Agent names from the text after "ROUTE:", e.g. "color_intelligence, temperature".
+    Unknown names and duplicates are dropped; at most `max_routes` are kept.
+    """
+    routes = []
+    for name in re.split(r"[,+&\s]+|\band\b", text.lower()):
+        if name in AGENT_ROUTES and name not in routes:
+            routes.append(name)
+    return routes[:max_routes]
+
+
+def normalize_message(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so near-identical messages share a key."""
+    text = text.lower().replace("°", " degrees ")
+    text = re.sub(r"[^a-z0-9\s]", " ", text)
+    return " ".join(text.split())
+
+
+def previous_reply(messages: List[BaseMessage]) -> str:
+    """The last reply the user saw before their latest message ("" on the first turn)."""
+    seen_user = False
+    for m in reversed(messages):
+        if isinstance(m, HumanMessage):
+            seen_user = True
+        elif seen_user and isinstance(m, AIMessage) and not m.name:
+            # Named AIMessages are subagent signals the user never saw
+            return m.content
+    return ""
+
+
+def answers_question(messages: List[BaseMessage]) -> bool:
+    """Whether the latest message replies to something the assistant asked ("work" after
+    "Is this for work or a dinner?"), i.e. only means something with that question."""
+    return "?" in previous_reply(messages)
+
+
+class RoutingCache:
+    """
+    Caches the orchestrator's routing decision (never the composed answer).
+    Key = normalized user message + fingerprint of the context the router sees:
+    OOTD id, weather bucket, a hash of the session summary and a hash of the reply
+    the message answers. "yes" or "the second one" after a QUESTION means something
+    different in every conversation, so it only shares a route with the same exchange.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None, ttl: float = ROUTING_CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = CacheStats()
+
+    @classmethod
+    def from_config(cls) -> "RoutingCache":
+        backend = make_backend(
+            ROUTING_CACHE_BACKEND,
+            namespace="routing",
+            max_entries=ROUTING_CACHE_MAX_ENTRIES,
+            default_ttl=ROUTING_CACHE_TTL_SECONDS,
+        )
+        return cls(backend)
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def make_key(self, state: SessionState) -> str:
+        user_msg = state["messages"][-1].content if state["messages"] else ""
+        ootd = state.get("current_ootd") or {}
+        summary = state.get("summary", "") or ""
+        fingerprint = "|".join([
+            str(ootd.get("id", "none")),
+            WeatherService.bucket(state.get("weather_data")),
+            hashlib.sha1(summary.encode("utf-8")).hexdigest()[:12],
+            hashlib.sha1(normalize_message(previous_reply(state["messages"])).encode("utf-8")).hexdigest()[:12],
+        ])
+        raw = f"{normalize_message(user_msg)}\x1f{fingerprint}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, state: SessionState) -> Optional[List[str]]:
+        if not self.enabled:
+            return None
+        routes = self.backend.get(self.make_key(state))
+        self.stats.record(routes is not None)
+        return routes
+
+    def peek(self, state: SessionState) -> bool:
+        """Whether `get` would hit, without counting it in the stats."""
+        return self.enabled and self.backend.get(self.make_key(state)) is not None
+
+    def put(self, state: SessionState, routes: List[str]) -> None:
+        if not self.enabled or not routes or any(r not in AGENT_ROUTES for r in routes):
+            return
+        self.backend.set(self.make_key(state), list(routes), self.ttl)
+
+    def metrics(self) -> Dict[str, Any]:
+        data = self.stats.as_dict()
+        data["size"] = len(self.backend) if self.enabled else 0
+        return data
@@ -0,0 +1,317 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+from langchain_core.tracers.context import register_configure_hook
+from ..state import SessionState
+from ..core.cache import InMemoryBackend
+from ..core.tracing import Span, span
+from ..config import (
+    SPECULATION_MIN_CONFIDENCE,
+    SPECULATION_BUDGET_TOKENS,
+    SPECULATION_BUDGET_WINDOW_SECONDS,
+    SPECULATION_MAX_IN_FLIGHT,
+    SPECULATION_HISTORY_MAX_USERS,
+)
+from .context import latest_user_message
+from .intent_classifier import IntentClassifier
+
+# A speculative answer is never shown as it streams: it may be dropped. The compose
+# pass writes the reply, or (fused mode) the client shows it whole once it's claimed
+NOSTREAM = {"tags": ["nostream"]}
+
+
+class TokenCounter(BaseCallbackHandler):
+    """Adds up the tokens of every LLM call it sees."""
+
+    def __init__(self):
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                with self._lock:
+                    self.tokens += usage.get("total_tokens", 0)
+
+
+# Counter of the speculative run in the current context. Set inside the run's own
+# thread/task context, so every LLM call it makes reports there and nowhere else.
+_run_usage: contextvars.ContextVar[Optional[TokenCounter]] = contextvars.ContextVar("speculation_usage", default=None)
+register_configure_hook(_run_usage, inheritable=True)
+
+
+def turn_id(state: SessionState) -> Optional[str]:
+    """Id of the user message the current turn answers."""
+    for m in reversed(state["messages"]):
+        if isinstance(m, HumanMessage):
+            return m.id
+    return None
+
+
+class Speculation:
+    """One subagent run started before the router has decided."""
+
+    def __init__(self, agent: str, turn: Optional[str], prompt_tokens: int, fused: bool = False):
+        self.agent = agent
+        self.turn = turn
+        self.prompt_tokens = prompt_tokens  # spend assumed for a run cancelled mid-flight
+        self.fused = fused  # writes the reply itself, so only usable if it's the sole route
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.tokens = 0
+        self.future = None  # concurrent.futures.Future (sync) or asyncio.Task (async)
+
+
+class Speculator:
+    """
+    Speculative subagent execution: while the orchestrator's LLM call decides the
+    route, the most likely expert already starts answering.
+
+    - Prediction: the local intent classifier (keywords + TF-IDF) when it is
+      confident enough, else the route this user's previous turn took.
+    - If the router agrees, the expert's answer is handed to its graph node
+      (state["speculative"]), which returns it instead of calling the LLM again.
+      If not, the run is cancelled (async) or left to finish and dropped (sync).
+    - Spend cap: tokens of discarded runs are counted over a sliding window;
+      past SPECULATION_BUDGET_TOKENS, speculation pauses until the window moves on.
+    """
+
+    def __init__(self, classifier: Optional[IntentClassifier] = None,
+                 min_confidence: float = SPECULATION_MIN_CONFIDENCE,
+                 budget_tokens: int = SPECULATION_BUDGET_TOKENS,
+                 budget_window: float = SPECULATION_BUDGET_WINDOW_SECONDS,
+                 max_in_flight: int = SPECULATION_MAX_IN_FLIGHT,
+                 history_size: int = SPECULATION_HISTORY_MAX_USERS):
+        self.classifier = classifier or IntentClassifier()
+        self.min_confidence = min_confidence
+        self.budget_tokens = budget_tokens
+        self.budget_window = budget_window
+        self.max_in_flight = max_in_flight
+        self._last_route = InMemoryBackend(history_size)
+        self._wasted: deque = deque()  # (time, tokens) of discarded runs
+        self._executor = ThreadPoolExecutor(max_in_flight, thread_name_prefix="speculate")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.failed = 0
+        self.skipped_budget = 0
+        self.skipped_busy = 0
+        self.wasted_calls = 0
+        self.wasted_tokens = 0
+        self.time_saved_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    # -- prediction --
+
+    def predict(self, state: SessionState) -> Optional[str]:
+        text = latest_user_message(state["messages"])
+        if self.classifier.is_direct(text):
+            # Greetings and thanks get a DIRECT_RESPONSE, no expert
+            return None
+        route, confidence = self.classifier.classify(text)
+        if route and confidence >= self.min_confidence:
+            return route
+        # Follow-ups ("what about shoes?") usually stay with the same expert
+        return self._last_route.get(state.get("user_id") or "")
+
+    def observe(self, state: SessionState, routes: Optional[List[str]]) -> None:
+        """Remembers the route a turn took (route history for the next prediction)."""
+        if routes:
+            self._last_route.set(state.get("user_id") or "", routes[0])
+
+    # -- admission --
+
+    def _budget_used(self) -> int:
+        cutoff = time.time() - self.budget_window
+        while self._wasted and self._wasted[0][0] < cutoff:
+            self._wasted.popleft()
+        return sum(tokens for _, tokens in self._wasted)
+
+    def _admit(self) -> bool:
+        with self._lock:
+            if self._budget_used() >= self.budget_tokens:
+                self.skipped_budget += 1
+                return False
+            if self._in_flight >= self.max_in_flight:
+                self.skipped_busy += 1
+                return False
+            self._in_flight += 1
+            self.started += 1
+            return True
+
+    def _done(self, spec: Speculation, usage: TokenCounter) -> None:
+        spec.finished = time.perf_counter()
+        spec.tokens = usage.tokens
+        with self._lock:
+            self._in_flight -= 1
+
+    def _waste(self, tokens: int) -> None:
+        with self._lock:
+            self.wasted_calls += 1
+            self.wasted_tokens += tokens
+            self._wasted.append((time.time(), tokens))
+
+    # -- running --
+
+    def start(self, state: SessionState, name: str, agent: Any) -> Optional[Speculation]:
+        """Starts `agent` on a worker thread; None when the budget or in-flight cap says no."""
+        if not self._admit():
+            return None
+        # Runs as if it were the only expert (fused mode: it writes the reply)
+        spec = Speculation(name, turn_id(state), agent.system_prompt_tokens, agent.fuses([name]))
+
+        def run():
+            usage = TokenCounter()
+            _run_usage.set(usage)
+            try:
+                return agent.invoke(state, config=NOSTREAM, fused=spec.fused)
+            finally:
+                self._done(spec, usage)
+
+        # Same context as the node, so its spans nest under this turn
+        spec.future = self._executor.submit(contextvars.copy_context().run, run)
+        return spec
+
+    def astart(self, state: SessionState, name: str, agent: Any) -> Optional[Speculation]:
+        """Async twin of `start`: the run is a task on the current event loop."""
+        if not self._admit():
+            return None
+        # Runs as if it were the only expert (fused mode: it writes the reply)
+        spec = Speculation(name, turn_id(state), agent.system_prompt_tokens, agent.fuses([name]))
+
+        async def run():
+            usage = TokenCounter()
+            _run_usage.set(usage)
+            try:
+                return await agent.ainvoke(state, config=NOSTREAM, fused=spec.fused)
+            finally:
+                self._done(spec, usage)
+
+        # Tasks run in a copy of the current context, like the thread above
+        spec.future = asyncio.ensure_future(run())
+        return spec
+
+    @staticmethod
+    def _usable(spec: Speculation, routes: List[str]) -> bool:
+        # A fused answer is the whole reply; a fan-out needs the expert's plain answer
+        return spec.agent in routes and (len(routes) == 1 or not spec.fused)
+
+    def _resolve(self, spec: Speculation, result: Dict[str, Any], routed_at: float,
+                 update: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if update is None:
+            return result
+        # Serial would have been routing + expert; both ran from `started` on
+        saved = min(routed_at, spec.finished or routed_at) - spec.started
+        with self._lock:
+            self.hits += 1
+            self.time_saved_ms += saved * 1000
+        result["speculative"] = {"agent": spec.agent, "turn": spec.turn, "messages": update["messages"]}
+        return result
+
+    def finish(self, spec: Optional[Speculation], state: SessionState, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Once the router has answered: hands the expert's answer over if the route
+        matches, otherwise drops the run. Returns the orchestrator result.
+        """
+        routes = result.get("next_agents") or []
+        self.observe(state, routes)
+        if spec is None:
+            return result
+        routed_at = time.perf_counter()
+        with span("speculation", spec.agent) as s:
+            if not self._usable(spec, routes):
+                s.attrs["outcome"] = "miss"
+                self.discard(spec)
+                return result
+            try:
+                update = spec.future.result()
+                s.attrs["outcome"] = "hit"
+            except Exception as e:
+                self._failed(s, e)
+                update = None
+            return self._resolve(spec, result, routed_at, update)
+
+    async def afinish(self, spec: Optional[Speculation], state: SessionState,
+                      result: Dict[str, Any]) -> Dict[str, Any]:
+        routes = result.get("next_agents") or []
+        self.observe(state, routes)
+        if spec is None:
+            return result
+        routed_at = time.perf_counter()
+        with span("speculation", spec.agent) as s:
+            if not self._usable(spec, routes):
+                s.attrs["outcome"] = "miss"
+                self.discard(spec)
+                return result
+            try:
+                update = await spec.future
+                s.attrs["outcome"] = "hit"
+            except Exception as e:
+                self._failed(s, e)
+                update = None
+            return self._resolve(spec, result, routed_at, update)
+
+    def _failed(self, s: Span, e: Exception) -> None:
+        # The node then calls the expert as usual; the error stays on the span and in metrics()
+        s.error = f"{type(e).__name__}: {e}"
+        s.attrs["outcome"] = "failed"
+        with self._lock:
+            self.failed += 1
+            self.last_error = s.error
+
+    def discard(self, spec: Optional[Speculation]) -> None:
+        """Drops a run the router didn't pick (or whose turn failed), counting what it cost."""
+        if spec is None:
+            return
+        with self._lock:
+            self.misses += 1
+        future = spec.future
+        if future.done():
+            self._waste(spec.tokens)
+        elif isinstance(future, asyncio.Future):
+            # The request was sent and is cut short; assume its prompt was paid for
+            future.cancel()
+            self._waste(spec.prompt_tokens)
+        elif future.cancel():
+            # Still queued behind other runs: nothing spent
+            with self._lock:
+                self._in_flight -= 1
+        else:
+            # A thread can't be interrupted; count the spend once the call returns
+            future.add_done_callback(lambda _: self._waste(spec.tokens))
+
+    @staticmethod
+    def claim(state: SessionState, name: str) -> Optional[Dict[str, Any]]:
+        """The node update for `name` if a speculative answer for this turn is waiting."""
+        speculative = state.get("speculative")
+        if speculative and speculative.get("agent") == name and speculative.get("turn") == turn_id(state):
+            return {"messages": speculative["messages"], "speculative": None}
+        return None
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            decided = self.hits + self.misses
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "misses": self.misses,
+                "failed": self.failed,
+                "last_error": self.last_error,
+                "hit_rate": round(self.hits / decided, 3) if decided else 0.0,
+                "time_saved_ms": round(self.time_saved_ms, 1),
+                "wasted_calls": self.wasted_calls,
+                "wasted_tokens": self.wasted_tokens,
+                "skipped_budget": self.skipped_budget,
+                "skipped_busy": self.skipped_busy,
+                "budget_used_tokens": self._budget_used(),
+                "budget_tokens": self.budget_tokens,
+            }
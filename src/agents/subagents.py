@@ -1,32 +1,116 @@
-from typing import Dict, Any
-from langchain_core.messages import SystemMessage, AIMessage
+import uuid
+from typing import Dict, Any, List, Optional, Tuple
+from langchain_core.messages import BaseMessage, SystemMessage, AIMessage
 from ..state import SessionState
+from .answer_cache import AnswerCache
 from .base import BaseAgent
+from .context import OOTD_FIELDS, latest_user_message, render_ootd, render_weather
+from ..core.streaming import FINAL_PREFIX, USER_FACING_TAG
+from ..core.tokens import count_tokens
+from ..config import COMPOSE_MODE, COMPOSE_ALWAYS_AGENTS
+
+# Fused compose mode: the expert writes the user-facing reply itself, so it gets
+# the gist of ALI's voice and the compose rules from the orchestrator prompt
+FUSED_PERSONA = """
+<answer_as_ali>
+This time you reply to the user directly, as ALI: a warm, witty personal stylist
+(kind big sister with great style, no judgment, lightly cheeky).
+- Complete answer: "FINAL_ANSWER:" followed by the reply the user reads. Keep your
+  expert substance, in plain friendly words (no labels or codes), short and easy to scan,
+  with a little warmth and an emoji or two.
+- End a FINAL_ANSWER with "Want me to create a visual outfit for you?" on its own line.
+- Still missing information: "QUESTION: ..." exactly as usual.
+</answer_as_ali>
+"""
 
 class SubAgent(BaseAgent):
-    def invoke(self, state: SessionState) -> Dict[str, Any]:
+    # Whether the agent's context includes the weather (part of its answer cache key)
+    uses_weather = False
+
+    def __init__(self, name: str, prompt_file: str):
+        super().__init__(name, prompt_file)
+        # Process-wide, so every session shares the answers that aren't personal
+        self.answer_cache = AnswerCache.from_config(name, self.uses_weather)
+
+    def fuses(self, routes: List[str]) -> bool:
+        """Whether this expert writes the reply itself when `routes` answer the turn."""
+        return COMPOSE_MODE == "fused" and len(routes) <= 1 and self.name not in COMPOSE_ALWAYS_AGENTS
+
+    def _fused(self, state: SessionState, fused: Optional[bool]) -> bool:
+        return self.fuses(state.get("next_agents") or [self.name]) if fused is None else fused
+
+    def _chain_input(self, state: SessionState, messages: List[BaseMessage], fused: bool = False) -> Dict[str, Any]:
         # Selective Context Passing
         context_str = self._build_context(state)
+        if fused:
+            context_str += FUSED_PERSONA
         
-        messages = state["messages"]
-        # We might want to filter messages too (Trimming/Isolation)
-        # For now, pass full history + specific context
-        
-        chain = self.get_chain()
-        response = chain.invoke({
-            "messages": messages + [SystemMessage(content=context_str)]
-        })
-        
-        # Return the response to be routed back to orchestrator? 
-        # Or just update state?
-        # The orchestrator expects <agent_response> in the next turn if we loop back.
-        # But usually subagents provide the answer.
-        
-        return {"messages": [AIMessage(content=response.content)]}
+        # Dynamic few-shot: only the examples closest to this request
+        examples = self.examples_for(latest_user_message(state["messages"]))
+        self.context.log_usage(self.system_prompt_tokens + count_tokens(examples), messages, context_str)
+        return {"messages": messages + [SystemMessage(content=context_str)], "examples": examples}
+
+    @staticmethod
+    def _user_facing(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        # Tagged so UserFacingStream lets the reply's tokens through
+        config = dict(config or {})
+        config["tags"] = [*config.get("tags", []), USER_FACING_TAG]
+        return config
+
+    def _answer(self, content: str, fused: bool) -> Dict[str, Any]:
+        head = content.lstrip()
+        if fused and head.startswith(FINAL_PREFIX):
+            # Already the reply: a visible message (unnamed, like the orchestrator's),
+            # and the graph ends the turn without a compose pass
+            reply = head[len(FINAL_PREFIX):].strip()
+            return {"messages": [AIMessage(content=reply, id=str(uuid.uuid4()))]}
+        # Named, so a fan-out compose step can tell the experts apart
+        return {"messages": [AIMessage(content=content, name=self.name)]}
+
+    def _lookup(self, state: SessionState, fused: bool) -> Tuple[List[BaseMessage], Optional[str], Optional[str]]:
+        """(history, answer cache key, cached answer). The key is None when the cache is
+        off or bypassed for this call; the answer is None then and on a miss."""
+        # Trimming/Isolation: each agent only gets the history its policy allows
+        history = self.context.history(state)
+        key = self.answer_cache.key_for(state, history, self.context.includes_summary, fused)
+        return history, key, self.answer_cache.get(key)
+
+    def invoke(self, state: SessionState, config: Optional[Dict[str, Any]] = None,
+               fused: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        Runs the expert. Its FINAL_ANSWER / QUESTION goes back to the orchestrator to
+        compose, except in fused mode, where a FINAL_ANSWER is already the reply.
+        `fused` defaults to what COMPOSE_MODE says for the turn's routes.
+        """
+        fused = self._fused(state, fused)
+        history, key, cached = self._lookup(state, fused)
+        if cached is not None:
+            return self._answer(cached, fused)
+        response = self.run_llm(self._chain_input(state, history, fused),
+                                config=self._user_facing(config) if fused else config)
+        self.answer_cache.put(key, response.content)
+        return self._answer(response.content, fused)
+
+    async def ainvoke(self, state: SessionState, config: Optional[Dict[str, Any]] = None,
+                      fused: Optional[bool] = None) -> Dict[str, Any]:
+        """Async twin of `invoke`; the LLM call doesn't block the event loop."""
+        fused = self._fused(state, fused)
+        history, key, cached = self._lookup(state, fused)
+        if cached is not None:
+            return self._answer(cached, fused)
+        response = await self.arun_llm(self._chain_input(state, history, fused),
+                                       config=self._user_facing(config) if fused else config)
+        self.answer_cache.put(key, response.content)
+        return self._answer(response.content, fused)
 
     def _build_context(self, state: SessionState) -> str:
         raise NotImplementedError
 
+    def _memory_block(self, state: SessionState) -> str:
+        """<user_memory> from the session summary, for agents whose policy uses it."""
+        summary = state.get("summary", "") if self.context.includes_summary else ""
+        return f"<user_memory>\n{summary or 'Not available'}\n</user_memory>"
+
 class OccasionAgent(SubAgent):
     def __init__(self):
         super().__init__("occasion_formality", "1_occasion_formality.txt")
@@ -35,8 +119,7 @@ class OccasionAgent(SubAgent):
         # Select: user_message, current_outfit, user_memory
         # Exclude: weather_data
         user_msg = state["messages"][-1].content
-        ootd = state.get("current_ootd")
-        ootd_str = str(ootd) if ootd else "Not available"
+        ootd_str = render_ootd(state.get("current_ootd"), include_variants=True, fields=OOTD_FIELDS[self.name])
         
         return f"""
 <inputs_you_receive>
@@ -48,7 +131,7 @@ class OccasionAgent(SubAgent):
 {ootd_str}
 </current_outfit_for_reference>
 
-</user_memory>
+{self._memory_block(state)}
 </inputs_you_receive>
 
 <required_context>
@@ -71,8 +154,7 @@ class ItemStylingAgent(SubAgent):
     def _build_context(self, state: SessionState) -> str:
         # Select: user_message, current_outfit, user_memory
         user_msg = state["messages"][-1].content
-        ootd = state.get("current_ootd")
-        ootd_str = str(ootd) if ootd else "Not available"
+        ootd_str = render_ootd(state.get("current_ootd"), fields=OOTD_FIELDS[self.name])
         
         return f"""
 <inputs_you_receive>
@@ -84,7 +166,7 @@ class ItemStylingAgent(SubAgent):
 {ootd_str}
 </current_outfit_for_reference>
 
-</user_memory>
+{self._memory_block(state)}
 </inputs_you_receive>
 
 <required_context>
@@ -102,8 +184,7 @@ class ColorAgent(SubAgent):
         # Select: user_message, current_outfit, user_memory (palette)
         # Exclude: weather
         user_msg = state["messages"][-1].content
-        ootd = state.get("current_ootd")
-        ootd_str = str(ootd) if ootd else "Not available"
+        ootd_str = render_ootd(state.get("current_ootd"), fields=OOTD_FIELDS[self.name])
         
         return f"""
 <inputs_you_receive>
@@ -115,7 +196,7 @@ class ColorAgent(SubAgent):
 {ootd_str}
 </current_outfit_for_reference>
 
-</user_memory>
+{self._memory_block(state)}
 </inputs_you_receive>
 
 <required_context>
@@ -126,6 +207,8 @@ class ColorAgent(SubAgent):
 """
 
 class TemperatureAgent(SubAgent):
+    uses_weather = True
+
     def __init__(self):
         super().__init__("temperature", "4_temperature.txt")
 
@@ -133,10 +216,8 @@ class TemperatureAgent(SubAgent):
         # Select: user_message, weather_data, current_outfit
         # Exclude: user_memory (palette)
         user_msg = state["messages"][-1].content
-        ootd = state.get("current_ootd")
-        ootd_str = str(ootd) if ootd else "Not available"
-        weather = state.get("weather_data")
-        weather_str = str(weather) if weather else "Not available"
+        ootd_str = render_ootd(state.get("current_ootd"), fields=OOTD_FIELDS[self.name])
+        weather_str = render_weather(state.get("weather_data"))
         
         return f"""
 <inputs_you_receive>
@@ -156,6 +237,7 @@ class TemperatureAgent(SubAgent):
 <required_context>
 - MUST have: user_latest_message, weather_data
 - OPTIONAL: current_outfit_for_reference
+- If weather_data is marked STALE, say briefly that the forecast may be out of date
 - NEVER need: user_memory (seasonal palette), conversation_so_far (usually single turn)
 </required_context>
 """
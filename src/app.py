@@ -1,4 +1,5 @@
 import streamlit as st
+import requests
 import uuid
 import sys
 import os
@@ -9,30 +10,58 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from langchain_core.messages import HumanMessage, AIMessage
 from langgraph.store.base import GetOp
 try:
-    from src.graph import app as graph_app
+    from src.graph import app as graph_app, thread_config
     from src.repositories.outfit_repository import OutfitRepository
-    from src.memory.firestore_store import FirestoreStore
+    from src.core.registry import registry
+    from src.core.firebase import register_secret_source
+    from src.core.streaming import UserFacingStream, transcript_messages
+    from src.core.tracing import get_tracer, render_timeline, trace
+    from src.client import ChatClient, ServerBusy
+    from src.session import load_summary
+    from src.services.weather_prefetcher import get_weather, weather_snapshot
+    from src.config import ALI_SERVER_URL
 except ImportError as e:
     # Fallback for when running directly inside src/
     try:
-        from graph import app as graph_app
+        from graph import app as graph_app, thread_config
         from repositories.outfit_repository import OutfitRepository
-        from memory.firestore_store import FirestoreStore
+        from core.registry import registry
+        from core.firebase import register_secret_source
+        from core.streaming import UserFacingStream, transcript_messages
+        from core.tracing import get_tracer, render_timeline, trace
+        from client import ChatClient, ServerBusy
+        from session import load_summary
+        from services.weather_prefetcher import get_weather, weather_snapshot
+        from config import ALI_SERVER_URL
     except ImportError as e2:
         st.error(f"Failed to import modules. Root error: {e}. Fallback error: {e2}")
         st.stop()
 
 st.set_page_config(page_title="ALI Agent v2", layout="wide")
 
+# Firebase credentials can come from Streamlit secrets on deployment
+register_secret_source("streamlit", lambda name: st.secrets.get(name))
+
+def unsummarized_messages():
+    """Messages after the summary watermark. Older ones live in the summary, so we don't resend them."""
+    messages = st.session_state.messages
+    watermark = st.session_state.get("summary_watermark")
+    for i, m in enumerate(messages):
+        if m.id == watermark:
+            return messages[i + 1:]
+    return messages
+
 # Initialize Session State
 if "session_id" not in st.session_state:
     st.session_state.session_id = str(uuid.uuid4())
     st.session_state.messages = []
     st.session_state.summary = "" # Context Compression
+    st.session_state.summary_watermark = None # Last message folded into the summary
     
     # Initialize Core Services
     st.session_state.repo = OutfitRepository()
-    st.session_state.store = FirestoreStore()
+    # Shared with the graph: one store (and Firestore client) per process
+    st.session_state.store = registry.get("store")
     
     # Fetch OOTD
     st.session_state.current_ootd = st.session_state.repo.get_outfit_by_date()
@@ -57,6 +86,9 @@ with st.sidebar:
         # CRITICAL: Clear ALL user-specific state to prevent leaks
         st.session_state.messages = [] 
         st.session_state.summary = "" 
+        st.session_state.summary_watermark = None
+        # A server-side session belongs to one user
+        st.session_state.session_id = str(uuid.uuid4())
         if "weather_cache" in st.session_state:
             del st.session_state.weather_cache
         if "last_route" in st.session_state:
@@ -67,13 +99,9 @@ with st.sidebar:
         # Reset Location Widget
         st.session_state["user_city"] = "New York"
         
-        # Reload User Memory
-        user_mem = st.session_state.store.batch([
-            GetOp(namespace=("users",), key=st.session_state.user_id)
-        ])
-        # Update summary if memory exists
-        if user_mem and user_mem[0]:
-            st.session_state.summary = user_mem[0].value.get("summary", "")
+        # Reload User Memory (a summary still waiting to be written counts too,
+        # so switching away and straight back doesn't lose the latest one)
+        st.session_state.summary = load_summary(st.session_state.user_id)
         
         st.rerun()
         
@@ -100,11 +128,15 @@ with st.sidebar:
     # Use key to allow programmatic reset
     city = st.text_input("Location", value="New York", key="user_city")
     
-    # Fetch Weather
-    if "weather_cache" not in st.session_state or st.session_state.get("last_city") != city:
+    # Fetch Weather: from the background prefetcher's warm snapshot when it has one
+    # (also picks up its refreshes), otherwise a blocking lookup
+    snapshot = weather_snapshot(city)
+    if snapshot:
+        st.session_state.weather_cache = snapshot
+        st.session_state.last_city = city
+    elif "weather_cache" not in st.session_state or st.session_state.get("last_city") != city:
         with st.spinner(f"Fetching weather for {city}..."):
-            from src.services.weather_service import WeatherService
-            st.session_state.weather_cache = WeatherService.get_current_weather(city)
+            st.session_state.weather_cache = get_weather(city)
             st.session_state.last_city = city
             
     if "error" not in st.session_state.weather_cache:
@@ -121,16 +153,27 @@ with st.sidebar:
         if st.session_state.summary:
             st.info(st.session_state.summary)
         else:
-            st.caption("No summary generated yet (starts after 10 messages).")
+            st.caption("No summary generated yet (starts once the history grows past the token threshold).")
         
         st.subheader("Selection (Current OOTD)")
         if st.session_state.current_ootd:
             st.json(st.session_state.current_ootd)
         else:
             st.write("No OOTD available")
+        st.caption(f"OOTD cache: {st.session_state.repo.cache_metrics()}")
             
         st.subheader("Trimming")
         st.write(f"Message Count: {len(st.session_state.messages)}")
+        if graph_app.checkpointer is not None and st.session_state.get("seeded_thread") == st.session_state.session_id:
+            st.write("Sent to Graph: 1 (new message only, the checkpoint holds the rest)")
+        else:
+            st.write(f"Sent to Graph: {len(unsummarized_messages())}")
+
+        st.subheader("Timeline (last turn)")
+        if st.session_state.get("last_trace"):
+            st.code(render_timeline(st.session_state.last_trace), language=None)
+        else:
+            st.caption("No traced turn yet (needs TRACE_EXPORTERS to include \"memory\").")
 
     st.divider()
     st.subheader("🤖 Agent Activity")
@@ -147,45 +190,120 @@ for msg in st.session_state.messages:
 
 if prompt := st.chat_input("Ask ALI..."):
     # Add user message
-    st.session_state.messages.append(HumanMessage(content=prompt))
+    st.session_state.messages.append(HumanMessage(content=prompt, id=str(uuid.uuid4())))
     with st.chat_message("user"):
         st.write(prompt)
         
     # Run Graph
-    inputs = {
-        "messages": st.session_state.messages,
-        "user_id": st.session_state.user_id,
-        "current_ootd": st.session_state.current_ootd,
-        "weather_data": st.session_state.get("weather_cache", {"temperature": "Unknown", "conditions": "Unknown"}),
-        "summary": st.session_state.summary
-    }
+    weather = st.session_state.get("weather_cache", {"temperature": "Unknown", "conditions": "Unknown"})
+    checkpointed = graph_app.checkpointer is not None
+    if checkpointed and st.session_state.get("seeded_thread") == st.session_state.session_id:
+        # The graph's checkpoint (thread = this session) already has the history,
+        # summary and context: send the new message, and the context if it changed
+        inputs = {"messages": [st.session_state.messages[-1]]}
+        if st.session_state.get("sent_context") != (st.session_state.current_ootd, weather):
+            inputs.update(current_ootd=st.session_state.current_ootd, weather_data=weather)
+    else:
+        inputs = {
+            "messages": unsummarized_messages(),
+            "user_id": st.session_state.user_id,
+            "current_ootd": st.session_state.current_ootd,
+            "weather_data": weather,
+            "summary": st.session_state.summary,
+            "summary_watermark": st.session_state.summary_watermark,
+        }
+    st.session_state.seeded_thread = st.session_state.session_id if checkpointed else None
+    st.session_state.sent_context = (st.session_state.current_ootd, weather)
+    config = thread_config(st.session_state.session_id, st.session_state.user_id) if checkpointed else None
     
-    with st.spinner("ALI is thinking..."):
-        # We stream the output to get the final state
-        final_state = None
+    def run_graph():
+        """Runs the graph, applies state updates and yields user-facing tokens as they arrive."""
         route = []
-        for output in graph_app.stream(inputs):
-            for key, value in output.items():
+        answer_stream = UserFacingStream()
+        # Every node, LLM call and Firestore op of this turn is traced under one id
+        with trace() as trace_id:
+            yield from stream_turn(answer_stream, route)
+        st.session_state.last_route = route
+        st.session_state.last_trace = get_tracer().spans(trace_id)
+
+    def stream_turn(answer_stream, route):
+        """The graph run itself: applies state updates, yields user-facing text."""
+        for mode, payload in graph_app.stream(inputs, config, stream_mode=["updates", "messages"]):
+            if mode == "messages":
+                # Token chunks; only ALI's user-facing text gets through
+                chunk, metadata = payload
+                text = answer_stream.feed(chunk, metadata)
+                if text:
+                    yield text
+                continue
+
+            for key, value in payload.items():
                 route.append(key)
+                if not value:
+                    continue
                 # Update local state with intermediate results if needed
                 if "summary" in value:
                     st.session_state.summary = value["summary"]
+                if "summary_watermark" in value:
+                    st.session_state.summary_watermark = value["summary_watermark"]
                 
                 # Capture new messages from agents
-                # CRITICAL: Only capture messages from the 'orchestrator' node.
-                # Subagent messages are internal signals for the orchestrator to compose.
+                # CRITICAL: Only capture ALI's replies (the orchestrator's, or a fused
+                # expert's). Expert signals are internal, for the orchestrator to compose.
                 # We don't want to show raw "FINAL_ANSWER" or "QUESTION" to the user.
-                if key == "orchestrator" and "messages" in value:
-                    new_msgs = value["messages"]
-                    if isinstance(new_msgs, list):
-                        st.session_state.messages.extend(new_msgs)
-                    elif isinstance(new_msgs, (HumanMessage, AIMessage)):
-                        st.session_state.messages.append(new_msgs)
-                        
-            final_state = value # Keep last state
-        
-        st.session_state.last_route = route
+                # RemoveMessage trims are skipped too, the UI keeps the full transcript.
+                if "messages" in value:
+                    replies = transcript_messages(value["messages"])
+                    st.session_state.messages.extend(replies)
+                    if not answer_stream.emitted:
+                        # A reply that wasn't streamed (a speculative fused answer)
+                        for m in replies:
+                            if isinstance(m, AIMessage) and m.content:
+                                answer_stream.emitted = True
+                                yield m.content
+
+    def run_remote():
+        """Same as run_graph, but the turn runs on the ALI server (ALI_SERVER_URL)."""
+        client = ChatClient(ALI_SERVER_URL)
+        events = client.stream_chat(
+            st.session_state.session_id,
+            prompt,
+            st.session_state.user_id,
+            city=st.session_state.get("last_city"),
+            date=st.session_state.last_selected_date.strftime("%Y-%m-%d"),
+        )
+        try:
+            yield from apply_remote(events)
+        except ServerBusy as e:
+            yield f"I'm helping a lot of people right now, please try again in {e.retry_after:.0f}s."
+        except (RuntimeError, requests.RequestException) as e:
+            # The turn failed on the server (an SSE error event) or never reached it.
+            # Nothing was applied: the server's copy of the messages only comes with "done"
+            print(f"Error in remote turn: {e}")
+            yield "Sorry, I couldn't reach my styling brain just now. Please try again."
+
+    def apply_remote(events):
+        for event, data in events:
+            if event == "token":
+                yield data["text"]
+            elif event == "done":
+                # The server's copy of the user message replaces ours (its id is the one
+                # the summary watermark refers to)
+                st.session_state.messages.pop()
+                st.session_state.messages.extend(
+                    HumanMessage(content=m["content"], id=m["id"]) if m["type"] == "human"
+                    else AIMessage(content=m["content"], id=m["id"])
+                    for m in data["messages"]
+                )
+                st.session_state.summary = data["summary"]
+                st.session_state.summary_watermark = data["summary_watermark"]
+                st.session_state.last_route = data["route"]
+                st.session_state.last_trace = data["trace"]
 
+    # Stream the final answer token by token instead of waiting for the
+    # whole orchestrator -> subagent -> orchestrator chain to finish.
+    with st.chat_message("ai"):
+        st.write_stream(run_remote() if ALI_SERVER_URL else run_graph())
 
     # Display Agent Response
     st.rerun()
@@ -0,0 +1,50 @@
+import json
+from typing import Any, Dict, Iterator, Optional, Tuple
+import requests
+
+
+class ServerBusy(Exception):
+    """The server shed the request (503/429); retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ChatClient:
+    """Client for src/server.py; the Streamlit app uses it when ALI_SERVER_URL is set."""
+
+    def __init__(self, base_url: str, timeout: float = 120):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.http = requests.Session()
+
+    def stream_chat(self, session_id: str, message: str, user_id: str, city: Optional[str] = None,
+                    date: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yields ("token", {"text": ...}) events, then ("done", payload)."""
+        body = {"message": message, "user_id": user_id, "city": city, "date": date}
+        with self.http.post(f"{self.base_url}/sessions/{session_id}/chat", json=body,
+                            stream=True, timeout=self.timeout) as response:
+            if response.status_code in (429, 503):
+                raise ServerBusy(response.json().get("error", "Server busy"),
+                                 float(response.headers.get("Retry-After", 1)))
+            response.raise_for_status()
+            event = "message"
+            # chunk_size=None: hand over each token as it arrives instead of buffering
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):])
+                    if event == "error":
+                        if "retry_after" in data:
+                            raise ServerBusy(data["error"], data["retry_after"])
+                        raise RuntimeError(data["error"])
+                    yield event, data
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        response = self.http.get(f"{self.base_url}/sessions/{session_id}", timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
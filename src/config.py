@@ -27,3 +27,176 @@ FIREBASE_STORAGE_BUCKET = "outfit-formulas-develop.appspot.com"
 
 # Memory
 MEMORY_FILE_PATH = BASE_DIR / "memory.json"
+
+# Caching
+# Backends: "memory" (single worker), "sqlite" (shared local file), "off"
+CACHE_DB_PATH = Path(os.getenv("CACHE_DB_PATH", BASE_DIR / ".cache" / "ali_cache.sqlite3"))
+ROUTING_CACHE_BACKEND = os.getenv("ROUTING_CACHE_BACKEND", "memory")
+ROUTING_CACHE_TTL_SECONDS = float(os.getenv("ROUTING_CACHE_TTL_SECONDS", "3600"))
+ROUTING_CACHE_MAX_ENTRIES = int(os.getenv("ROUTING_CACHE_MAX_ENTRIES", "2048"))
+
+# Pre-routing (local intent classifier before the LLM router)
+PREROUTER_ENABLED = os.getenv("PREROUTER_ENABLED", "false").lower() == "true"
+PREROUTER_CONFIDENCE_THRESHOLD = float(os.getenv("PREROUTER_CONFIDENCE_THRESHOLD", "0.8"))
+
+# Fan-out: how many subagents one routing decision may run in parallel
+MAX_FANOUT_AGENTS = int(os.getenv("MAX_FANOUT_AGENTS", "3"))
+
+# Who writes the reply after a single expert answers:
+# "orchestrator" - a second orchestrator pass composes it in ALI's voice
+# "fused" - the expert gets a short ALI persona block and writes it itself (one LLM call
+#   fewer per routed turn); QUESTIONs and fan-outs still go through the compose pass
+COMPOSE_MODE = os.getenv("COMPOSE_MODE", "orchestrator").lower()
+# Quality flag: experts whose answers always get the compose pass, even in fused mode
+COMPOSE_ALWAYS_AGENTS = [a.strip() for a in os.getenv("COMPOSE_ALWAYS_AGENTS", "").split(",") if a.strip()]
+
+# Speculative subagents: start the most likely expert while the LLM is still routing
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "false").lower() == "true"
+# Classifier confidence needed to guess a route (below it, the session's last route is used)
+SPECULATION_MIN_CONFIDENCE = float(os.getenv("SPECULATION_MIN_CONFIDENCE", "0.5"))
+# Spend cap: tokens of discarded speculative calls allowed per window; speculation pauses beyond it
+SPECULATION_BUDGET_TOKENS = int(os.getenv("SPECULATION_BUDGET_TOKENS", "20000"))
+SPECULATION_BUDGET_WINDOW_SECONDS = float(os.getenv("SPECULATION_BUDGET_WINDOW_SECONDS", "3600"))
+SPECULATION_MAX_IN_FLIGHT = int(os.getenv("SPECULATION_MAX_IN_FLIGHT", "8"))
+SPECULATION_HISTORY_MAX_USERS = int(os.getenv("SPECULATION_HISTORY_MAX_USERS", "10000"))
+
+# Context compression (token-based rolling summary)
+SUMMARY_TRIGGER_TOKENS = int(os.getenv("SUMMARY_TRIGGER_TOKENS", "1500"))
+SUMMARY_KEEP_LAST_MESSAGES = int(os.getenv("SUMMARY_KEEP_LAST_MESSAGES", "4"))
+
+# Firestore memory store
+# > 0 enables write-behind: puts are committed after this window, coalescing repeats
+FIRESTORE_WRITE_BEHIND_SECONDS = float(os.getenv("FIRESTORE_WRITE_BEHIND_SECONDS", "0"))
+
+# Rolling-summary persistence: changed summaries are written this long after the
+# change, coalescing the passes of a turn (0 = write inline)
+SUMMARY_WRITE_DELAY_SECONDS = float(os.getenv("SUMMARY_WRITE_DELAY_SECONDS", "1.0"))
+# Users whose last saved summary hash is remembered (for skipping unchanged writes)
+SUMMARY_HASH_MAX_ENTRIES = int(os.getenv("SUMMARY_HASH_MAX_ENTRIES", "10000"))
+
+# Semantic search over the memory store (SearchOp with a query): values are embedded
+# on put into per-namespace NumPy indexes, snapshotted to disk. Off by default: it is
+# only semantic with a real embedding model, and writes to indexed namespaces pay for
+# embedding. Without it, a query is ignored and the search is the structured one.
+# Embedding (required when the index is on): "package.module:function" (list of texts
+# -> vectors), or "hash", a built-in feature-hashing embedder that only ranks shared
+# words (benchmarks, trying the index without a model)
+STORE_VECTOR_INDEX = os.getenv("STORE_VECTOR_INDEX", "false").lower() == "true"
+STORE_EMBEDDING_FUNCTION = os.getenv("STORE_EMBEDDING_FUNCTION", "")
+STORE_EMBEDDING_DIM = int(os.getenv("STORE_EMBEDDING_DIM", "256"))
+# Value fields embedded when a put doesn't say ("$" = the whole value)
+STORE_INDEX_FIELDS = [f.strip() for f in os.getenv("STORE_INDEX_FIELDS", "$").split(",") if f.strip()]
+STORE_VECTOR_SNAPSHOT_DIR = Path(os.getenv("STORE_VECTOR_SNAPSHOT_DIR", BASE_DIR / ".cache" / "vectors"))
+# A loaded namespace asks Firestore for documents written by other workers this often
+STORE_VECTOR_REFRESH_SECONDS = float(os.getenv("STORE_VECTOR_REFRESH_SECONDS", "60"))
+# Documents per Firestore round trip when searches / namespace listings are paged
+STORE_PAGE_SIZE = int(os.getenv("STORE_PAGE_SIZE", "500"))
+# Namespaces this process knows are registered (skips re-registering them on put)
+STORE_NAMESPACE_CACHE_ENTRIES = int(os.getenv("STORE_NAMESPACE_CACHE_ENTRIES", "10000"))
+
+# OOTD read-through cache (process-wide, keyed by date)
+OUTFIT_CACHE_TTL_SECONDS = float(os.getenv("OUTFIT_CACHE_TTL_SECONDS", "3600"))
+OUTFIT_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("OUTFIT_CACHE_NEGATIVE_TTL_SECONDS", "300"))
+OUTFIT_CACHE_MAX_ENTRIES = int(os.getenv("OUTFIT_CACHE_MAX_ENTRIES", "366"))
+
+# Structured OOTD context precompute (python -m src.repositories.ootd_context).
+# Firestore batches take at most 500 writes.
+OOTD_CONTEXT_PAGE_SIZE = int(os.getenv("OOTD_CONTEXT_PAGE_SIZE", "500"))
+OOTD_CONTEXT_BATCH_SIZE = min(500, int(os.getenv("OOTD_CONTEXT_BATCH_SIZE", "400")))
+
+# Weather (Open-Meteo). URLs can point at a local stub for benchmarks.
+WEATHER_GEOCODE_URL = os.getenv("WEATHER_GEOCODE_URL", "https://geocoding-api.open-meteo.com/v1/search")
+WEATHER_FORECAST_URL = os.getenv("WEATHER_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+WEATHER_CONNECT_TIMEOUT_SECONDS = float(os.getenv("WEATHER_CONNECT_TIMEOUT_SECONDS", "3"))
+WEATHER_READ_TIMEOUT_SECONDS = float(os.getenv("WEATHER_READ_TIMEOUT_SECONDS", "10"))
+WEATHER_POOL_SIZE = int(os.getenv("WEATHER_POOL_SIZE", "10"))
+# City -> coordinates never changes, so it goes to the persistent backend by default
+WEATHER_GEOCODE_CACHE_BACKEND = os.getenv("WEATHER_GEOCODE_CACHE_BACKEND", "sqlite")
+WEATHER_GEOCODE_MISS_TTL_SECONDS = float(os.getenv("WEATHER_GEOCODE_MISS_TTL_SECONDS", "86400"))
+WEATHER_FORECAST_TTL_SECONDS = float(os.getenv("WEATHER_FORECAST_TTL_SECONDS", "600"))
+# Forecasts are keyed on coordinates rounded to this many decimals (2 ≈ 1 km)
+WEATHER_COORD_PRECISION = int(os.getenv("WEATHER_COORD_PRECISION", "2"))
+# Weather older than this is marked stale in the prompts (the Temperature agent says so)
+WEATHER_STALE_AFTER_SECONDS = float(os.getenv("WEATHER_STALE_AFTER_SECONDS", "1800"))
+# Background prefetch: the forecasts of cities active sessions use are refreshed on a
+# schedule (one Open-Meteo request per batch of locations) and served from a warm snapshot.
+# Opt-in: it runs a polling thread that calls Open-Meteo in the background
+WEATHER_PREFETCH_ENABLED = os.getenv("WEATHER_PREFETCH_ENABLED", "false").lower() == "true"
+WEATHER_PREFETCH_INTERVAL_SECONDS = float(os.getenv("WEATHER_PREFETCH_INTERVAL_SECONDS", "300"))
+# A city nobody asked for in this long stops being refreshed
+WEATHER_PREFETCH_IDLE_SECONDS = float(os.getenv("WEATHER_PREFETCH_IDLE_SECONDS", "3600"))
+WEATHER_PREFETCH_BATCH_SIZE = int(os.getenv("WEATHER_PREFETCH_BATCH_SIZE", "100"))
+WEATHER_PREFETCH_MAX_CITIES = int(os.getenv("WEATHER_PREFETCH_MAX_CITIES", "1000"))
+
+# Cross-user answer cache for subagents: a FINAL_ANSWER is reused for the same
+# normalized question, OOTD and (for agents that see it) weather band.
+# Backends: "memory" (per worker, LRU-bounded), "sqlite" (shared local file), "off"
+ANSWER_CACHE_BACKEND = os.getenv("ANSWER_CACHE_BACKEND", "memory")
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2048"))  # per agent
+# Seconds an answer stays valid, per agent, no longer than its inputs stay fresh:
+# weather answers live as long as a cached forecast, OOTD answers as long as a cached OOTD,
+# color theory doesn't go stale. Override with e.g. "temperature=300,color_intelligence=0" (0 = off)
+ANSWER_CACHE_TTL_SECONDS = {
+    "occasion_formality": OUTFIT_CACHE_TTL_SECONDS,
+    "item_styling": OUTFIT_CACHE_TTL_SECONDS,
+    "color_intelligence": 86400.0,
+    "temperature": WEATHER_FORECAST_TTL_SECONDS,
+    **{
+        name.strip(): float(seconds)
+        for name, seconds in (
+            pair.split("=", 1) for pair in os.getenv("ANSWER_CACHE_TTLS", "").split(",") if "=" in pair
+        )
+    },
+}
+
+# LLM client pool (one shared HTTP transport for every agent)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # e.g. a local OpenAI-compatible stub
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+# Keep-alive must cover the in-flight limit: httpx closes idle connections
+# whenever the pool holds more than this many, which defeats reuse
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", str(LLM_MAX_IN_FLIGHT)))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", str(LLM_MAX_IN_FLIGHT)))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+# Few-shot selection: examples per call picked from each prompt's <examples> block
+# (0 = send every example, like the original prompts)
+FEW_SHOT_K = int(os.getenv("FEW_SHOT_K", "3"))
+
+# Tracing: spans around graph nodes, LLM calls, Firestore ops and weather lookups.
+# Exporters (comma-separated): "memory" (ring buffer, feeds the debugger timeline),
+# "jsonl" (one span per line), "prometheus" (text metrics endpoint). Empty = off.
+TRACE_EXPORTERS = os.getenv("TRACE_EXPORTERS", "memory")
+TRACE_RING_SIZE = int(os.getenv("TRACE_RING_SIZE", "2000"))
+TRACE_JSONL_PATH = Path(os.getenv("TRACE_JSONL_PATH", BASE_DIR / ".cache" / "traces.jsonl"))
+# Port for GET /metrics when the prometheus exporter is on (0 = don't serve, render() only)
+TRACE_PROMETHEUS_PORT = int(os.getenv("TRACE_PROMETHEUS_PORT", "9464"))
+# Interface it listens on: loopback unless set (e.g. "0.0.0.0" for an external scraper)
+TRACE_PROMETHEUS_HOST = os.getenv("TRACE_PROMETHEUS_HOST", "127.0.0.1")
+
+# HTTP service (src/server.py)
+# Turns running the graph at once per worker; more wait in a bounded queue
+SERVER_MAX_CONCURRENT_TURNS = int(os.getenv("SERVER_MAX_CONCURRENT_TURNS", "32"))
+# Waiting turns beyond this get 503 + Retry-After instead of piling up
+SERVER_MAX_QUEUED_TURNS = int(os.getenv("SERVER_MAX_QUEUED_TURNS", "64"))
+SERVER_RETRY_AFTER_SECONDS = int(os.getenv("SERVER_RETRY_AFTER_SECONDS", "2"))
+# Idle sessions are dropped after this; the next request resumes from the stored summary
+SERVER_SESSION_TTL_SECONDS = float(os.getenv("SERVER_SESSION_TTL_SECONDS", "3600"))
+SERVER_MAX_SESSIONS = int(os.getenv("SERVER_MAX_SESSIONS", "10000"))
+SERVER_WARM_UP = os.getenv("SERVER_WARM_UP", "true").lower() == "true"
+# When set, the Streamlit app talks to this server instead of running the graph itself
+ALI_SERVER_URL = os.getenv("ALI_SERVER_URL")
+
+# Graph checkpointer: the graph keeps each session's state (thread_id = session id)
+# between turns, so a turn only sends the new message.
+# "sqlite" (local file, survives restarts, shared by the workers of one host),
+# "memory" (this process only), "off" (stateless: every turn resends the history)
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "sqlite")
+CHECKPOINT_DB_PATH = Path(os.getenv("CHECKPOINT_DB_PATH", BASE_DIR / ".cache" / "checkpoints.sqlite3"))
+# Checkpoints kept per thread; older ones (and the state only they refer to) are deleted
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "3"))
+# Threads idle this long are deleted by the maintenance pass (0 = keep forever): the
+# server runs it at startup and every CHECKPOINT_MAINTENANCE_INTERVAL_SECONDS;
+# otherwise run `python -m src.memory.checkpointer`
+CHECKPOINT_THREAD_TTL_SECONDS = float(os.getenv("CHECKPOINT_THREAD_TTL_SECONDS", str(30 * 86400)))
+CHECKPOINT_MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("CHECKPOINT_MAINTENANCE_INTERVAL_SECONDS", str(6 * 3600)))
@@ -1,53 +1,94 @@
-import firebase_admin
 import json
 import os
-import streamlit as st
-from firebase_admin import firestore, credentials
+import threading
+from typing import Any, Callable, Dict, Optional
+from .registry import registry
 from ..config import FIREBASE_CREDENTIALS_PATH, FIREBASE_STORAGE_BUCKET
 
+# Extra places to look up secrets before the environment, e.g. Streamlit's
+# st.secrets. The UI registers its own source so this module (and every worker,
+# CLI or benchmark that imports it) never depends on Streamlit.
+_secret_sources: Dict[str, Callable[[str], Any]] = {}
+_init_lock = threading.Lock()
+
+def register_secret_source(source: str, lookup: Callable[[str], Any]) -> None:
+    """
+    Registers `lookup(name) -> value or None` under `source`, consulted before os.environ.
+    Registering the same source again replaces it (Streamlit reruns the whole script).
+    """
+    _secret_sources[source] = lookup
+
+def _lookup_secret(name: str) -> Optional[Any]:
+    for lookup in list(_secret_sources.values()):
+        try:
+            value = lookup(name)
+        except Exception:
+            # e.g. Streamlit without a secrets.toml
+            value = None
+        if value:
+            return value
+    return os.getenv(name)
+
+def _parse_credentials(secret: Any) -> dict:
+    # The secret may be given as a dict directly, e.g. a TOML table:
+    # [FIREBASE_CREDENTIALS_JSON]
+    # type = "service_account"
+    # ...
+    if isinstance(secret, dict) or hasattr(secret, "type"):
+        return dict(secret)
+    try:
+        return json.loads(secret)
+    except json.JSONDecodeError:
+        # Copying into TOML often leaves literal control characters (e.g. newlines
+        # in the private key); strict=False accepts them.
+        return json.loads(secret, strict=False)
+
 def initialize_firebase():
-    if not firebase_admin._apps:
-        # 1. Try loading from Streamlit Secrets (Deployment)
-        if "FIREBASE_CREDENTIALS_JSON" in st.secrets:
-            # st.secrets returns it as a string if defined as such in TOML
-            secret_str = st.secrets["FIREBASE_CREDENTIALS_JSON"]
-            try:
-                cred_json = json.loads(secret_str)
-            except json.JSONDecodeError:
-                # Fallback: strict JSON requires double quotes and no trailing commas.
-                # Sometimes copying into TOML adds extra escaping to \n.
-                # Let's try to fix common issues.
-                try:
-                    # If the string has literal newlines instead of \n, replace them?
-                    # Or if it has \\n that needs to be \n?
-                    # Actually, often the issue is control characters.
-                    # Let's try strict=False
-                    cred_json = json.loads(secret_str, strict=False)
-                except:
-                    # Last resort: The user might have put the DICT directly in secrets.toml 
-                    # [FIREBASE_CREDENTIALS_JSON]
-                    # type = "service_account"
-                    # ...
-                    # In that case, st.secrets["FIREBASE_CREDENTIALS_JSON"] is ALREADY a dict (AttrDict).
-                    if isinstance(secret_str, dict) or hasattr(secret_str, "type"):
-                        cred_json = dict(secret_str)
-                    else:
-                        raise
-            
-            cred = credentials.Certificate(cred_json)
-        
-        # 2. Try loading from Environment Variable (Alternative)
-        elif os.getenv("FIREBASE_CREDENTIALS_JSON"):
-            cred_json = json.loads(os.getenv("FIREBASE_CREDENTIALS_JSON"))
-            cred = credentials.Certificate(cred_json)
-            
-        # 3. Fallback to Local File (Development)
+    # Imported here so the Firebase SDK only loads when Firestore is actually used
+    import firebase_admin
+    from firebase_admin import credentials
+
+    with _init_lock:
+        if firebase_admin._apps:
+            return
+        # 1. Registered secret sources (Streamlit secrets on deployment), then the environment
+        secret = _lookup_secret("FIREBASE_CREDENTIALS_JSON")
+        if secret:
+            cred = credentials.Certificate(_parse_credentials(secret))
+        # 2. Fallback to Local File (Development)
         else:
             cred = credentials.Certificate(str(FIREBASE_CREDENTIALS_PATH))
-            
+
         firebase_admin.initialize_app(cred, {
             'storageBucket': FIREBASE_STORAGE_BUCKET
         })
 
-initialize_firebase()
-db = firestore.client()
+def _make_db():
+    from firebase_admin import firestore
+    initialize_firebase()
+    return firestore.client()
+
+def _make_async_db():
+    from firebase_admin import firestore_async
+    initialize_firebase()
+    return firestore_async.client()
+
+registry.register("firestore", _make_db)
+# Async client for event-loop callers (FirestoreStore.abatch)
+registry.register("firestore_async", _make_async_db)
+
+def get_db():
+    """Shared Firestore client, created on first use."""
+    return registry.get("firestore")
+
+def get_async_db():
+    """Shared async Firestore client, created on first use."""
+    return registry.get("firestore_async")
+
+def __getattr__(name: str):
+    # `from src.core.firebase import db` keeps working, it just connects lazily
+    if name == "db":
+        return get_db()
+    if name == "async_db":
+        return get_async_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
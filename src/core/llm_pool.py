@@ -0,0 +1,283 @@
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+from .registry import registry
+from ..config import (
+    LLM_MODEL,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    LLM_MAX_IN_FLIGHT,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_TIMEOUT_SECONDS,
+    LLM_MAX_RETRIES,
+)
+
+
+class InFlightLimiter:
+    """
+    Caps concurrent LLM requests across the whole process, for threads and
+    event loops alike. A permit is held until the response body is closed,
+    so streamed answers count for their full duration.
+
+    Waiters queue in FIFO order and a released permit is handed straight to the
+    next one: a thread waits on an Event, a coroutine on a future of its own
+    loop, so no executor thread is parked while the limit is saturated.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._used = 0
+        self._waiters: Deque[Any] = deque()  # threading.Event or (loop, future)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.waited = 0
+
+    def _acquired(self, waited: bool) -> None:
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if waited:
+                self.waited += 1
+
+    def _take(self) -> bool:
+        # Caller holds the lock. Queued waiters go first.
+        if self._used < self.limit and not self._waiters:
+            self._used += 1
+            return True
+        return False
+
+    def acquire(self) -> None:
+        with self._lock:
+            granted = self._take()
+            if not granted:
+                event = threading.Event()
+                self._waiters.append(event)
+        if not granted:
+            event.wait()
+        self._acquired(not granted)
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            granted = self._take()
+            if not granted:
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+        if granted:
+            self._acquired(False)
+            return
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = (loop, future) in self._waiters
+                if queued:
+                    self._waiters.remove((loop, future))
+            if not queued and future.done() and not future.cancelled():
+                # The permit arrived as we were cancelled; pass it on
+                self._hand_off()
+            raise
+        self._acquired(True)
+
+    def _grant(self, future: "asyncio.Future") -> None:
+        # Runs on the waiter's loop
+        if future.cancelled():
+            self._hand_off()
+        else:
+            future.set_result(True)
+
+    def _hand_off(self) -> None:
+        """Gives a freed permit to the next waiter, or back to the pool."""
+        while True:
+            with self._lock:
+                if not self._waiters:
+                    self._used -= 1
+                    return
+                waiter = self._waiters.popleft()
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+                return
+            loop, future = waiter
+            try:
+                loop.call_soon_threadsafe(self._grant, future)
+                return
+            except RuntimeError:
+                # That waiter's loop is closed; try the next one
+                continue
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._hand_off()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "requests": self.requests,
+            "waited": self.waited,
+        }
+
+
+def _once(fn: Callable[[], None]) -> Callable[[], None]:
+    done = []
+
+    def wrapper():
+        if not done:
+            done.append(True)
+            fn()
+    return wrapper
+
+
+def _limited_transports(limiter: InFlightLimiter, limits: Any):
+    """httpx transports that take a limiter permit per request."""
+    import httpx
+
+    class ReleasingStream(httpx.SyncByteStream):
+        def __init__(self, stream, release):
+            self._stream, self._release = stream, release
+
+        def __iter__(self):
+            yield from self._stream
+
+        def close(self):
+            try:
+                self._stream.close()
+            finally:
+                self._release()
+
+    class AsyncReleasingStream(httpx.AsyncByteStream):
+        def __init__(self, stream, release):
+            self._stream, self._release = stream, release
+
+        async def __aiter__(self):
+            async for chunk in self._stream:
+                yield chunk
+
+        async def aclose(self):
+            try:
+                await self._stream.aclose()
+            finally:
+                self._release()
+
+    class LimitedTransport(httpx.BaseTransport):
+        def __init__(self):
+            self._inner = httpx.HTTPTransport(limits=limits)
+
+        def handle_request(self, request):
+            limiter.acquire()
+            release = _once(limiter.release)
+            try:
+                response = self._inner.handle_request(request)
+            except BaseException:
+                release()
+                raise
+            response.stream = ReleasingStream(response.stream, release)
+            return response
+
+        def close(self):
+            self._inner.close()
+
+    class AsyncLimitedTransport(httpx.AsyncBaseTransport):
+        def __init__(self):
+            self._inner = httpx.AsyncHTTPTransport(limits=limits)
+
+        async def handle_async_request(self, request):
+            await limiter.aacquire()
+            release = _once(limiter.release)
+            try:
+                response = await self._inner.handle_async_request(request)
+            except BaseException:
+                release()
+                raise
+            response.stream = AsyncReleasingStream(response.stream, release)
+            return response
+
+        async def aclose(self):
+            await self._inner.aclose()
+
+    return LimitedTransport(), AsyncLimitedTransport()
+
+
+class LLMPool:
+    """
+    Hands out chat model clients, one per (model, temperature, params).
+    Every client shares one keep-alive HTTP connection pool (sync and async)
+    and one process-wide in-flight limit, instead of each agent owning its own.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = LLM_MAX_IN_FLIGHT,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        max_keepalive_connections: int = LLM_MAX_KEEPALIVE_CONNECTIONS,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        base_url: Optional[str] = OPENAI_BASE_URL,
+        api_key: Optional[str] = OPENAI_API_KEY,
+    ):
+        self.limiter = InFlightLimiter(max_in_flight)
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_url = base_url
+        self.api_key = api_key
+        self._clients: Dict[Tuple, Any] = {}
+        self._http = None
+        self._lock = threading.Lock()
+
+    def _http_clients(self):
+        # Built with the first chat client so httpx only loads when an LLM is needed
+        if self._http is None:
+            import httpx
+            limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+            )
+            transport, async_transport = _limited_transports(self.limiter, limits)
+            self._http = (
+                httpx.Client(transport=transport, timeout=self.timeout),
+                httpx.AsyncClient(transport=async_transport, timeout=self.timeout),
+            )
+        return self._http
+
+    def get(self, model: str = LLM_MODEL, temperature: float = 0.7, **params) -> Any:
+        """Shared ChatOpenAI client for these settings (created on first request)."""
+        key = (model, temperature, tuple(sorted(params.items())))
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            if key not in self._clients:
+                from langchain_openai import ChatOpenAI
+                http_client, http_async_client = self._http_clients()
+                self._clients[key] = ChatOpenAI(
+                    model=model,
+                    temperature=temperature,
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    timeout=self.timeout,
+                    max_retries=self.max_retries,
+                    http_client=http_client,
+                    http_async_client=http_async_client,
+                    **params,
+                )
+            return self._clients[key]
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"clients": len(self._clients), **self.limiter.metrics()}
+
+
+registry.register("llm_pool", LLMPool)
+
+
+def get_llm(model: str = LLM_MODEL, temperature: float = 0.7, **params) -> Any:
+    """Chat model client from the process-wide pool."""
+    return registry.get("llm_pool").get(model, temperature, **params)
@@ -0,0 +1,60 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+
+class LazyRegistry:
+    """
+    Process-wide registry of shared services (agents, store, DB clients).
+    Each service is built by its factory on first `get()` and then reused,
+    so importing a module never pays for clients it doesn't end up using.
+    `override()` swaps in a ready-made instance (benchmarks, alternate backends).
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._listeners: List[Callable[[str, Any], None]] = []
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        with self._lock:
+            self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            # Another thread may have built it while we waited
+            if name not in self._instances:
+                if name not in self._factories:
+                    raise KeyError(f"No factory registered for '{name}'")
+                instance = self._factories[name]()
+                for listener in self._listeners:
+                    listener(name, instance)
+                self._instances[name] = instance
+            return self._instances[name]
+
+    def on_create(self, listener: Callable[[str, Any], None]) -> None:
+        """Calls `listener(name, instance)` whenever a service is first built."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def override(self, name: str, instance: Any) -> None:
+        with self._lock:
+            self._instances[name] = instance
+
+    def reset(self, name: Optional[str] = None) -> None:
+        """Drops built instances so the next `get()` rebuilds them."""
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+    def created(self) -> List[str]:
+        return list(self._instances)
+
+
+# The shared registry for the whole process
+registry = LazyRegistry()
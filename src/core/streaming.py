@@ -0,0 +1,108 @@
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+
+ROUTE_PREFIX = "ROUTE:"
+DIRECT_PREFIX = "DIRECT_RESPONSE:"
+FINAL_PREFIX = "FINAL_ANSWER:"
+QUESTION_PREFIX = "QUESTION:"
+# Run tag of an expert writing the reply itself (fused compose mode)
+USER_FACING_TAG = "user_facing"
+# Run tag of the orchestrator deciding the route (not composing expert answers)
+ROUTING_PASS_TAG = "routing_pass"
+
+# Per kind of LLM call: what each leading prefix means (shown after stripping it, or
+# hidden), and whether text without a known prefix is shown
+ORCHESTRATOR_RULES: Tuple[Dict[str, bool], bool] = ({ROUTE_PREFIX: False, DIRECT_PREFIX: True}, True)
+# The router accepts "ROUTE:" anywhere ("Let me check with the expert. ROUTE: temperature"),
+# so a routing reply without a leading prefix isn't streamed; if it turns out to be an
+# answer, it arrives whole with the node's update
+ROUTING_PASS_RULES: Tuple[Dict[str, bool], bool] = ({ROUTE_PREFIX: False, DIRECT_PREFIX: True}, False)
+# A fused expert's QUESTION (or malformed answer) goes to the compose pass instead
+FUSED_EXPERT_RULES: Tuple[Dict[str, bool], bool] = ({FINAL_PREFIX: True, QUESTION_PREFIX: False}, False)
+
+
+def transcript_messages(messages: Any) -> List[BaseMessage]:
+    """
+    The user-visible messages of a node update: ALI's replies, whether composed by the
+    orchestrator or written by a fused expert. Expert signals (named after their
+    agent) and RemoveMessage trims are left out.
+    """
+    if not isinstance(messages, list):
+        messages = [messages]
+    return [
+        m for m in messages
+        if isinstance(m, HumanMessage) or (isinstance(m, AIMessage) and not m.name)
+    ]
+
+
+class UserFacingStream:
+    """
+    Filters LangGraph `stream_mode="messages"` chunks down to the text the user should see.
+    - Token chunks from the orchestrator node are considered, plus expert runs tagged
+      USER_FACING_TAG (fused mode); other subagent FINAL_ANSWER / QUESTION output stays internal.
+    - Orchestrator: a routing decision ("ROUTE: ...") is swallowed; "DIRECT_RESPONSE:" is stripped.
+      On a routing pass (ROUTING_PASS_TAG), anything else is held back too.
+    - Fused expert: "FINAL_ANSWER:" is stripped; a QUESTION is swallowed (it gets composed).
+    Each LLM call streams under its own message id, so the decision is made per id
+    once enough of the prefix has arrived. `emitted` tells whether any text got through.
+    """
+
+    def __init__(self, node: str = "orchestrator"):
+        self.node = node
+        self.emitted = False
+        self._buffers: Dict[str, str] = {}
+        self._visible: Dict[str, Optional[bool]] = {}
+
+    def _rules(self, metadata: Dict[str, Any]) -> Optional[Tuple[Dict[str, bool], bool]]:
+        if metadata.get("langgraph_node") == self.node:
+            return ROUTING_PASS_RULES if ROUTING_PASS_TAG in (metadata.get("tags") or []) else ORCHESTRATOR_RULES
+        if USER_FACING_TAG in (metadata.get("tags") or []):
+            return FUSED_EXPERT_RULES
+        return None
+
+    def feed(self, chunk: Any, metadata: Dict[str, Any]) -> str:
+        """Returns the text to render for this chunk ("" if nothing yet)."""
+        text = self._feed(chunk, metadata)
+        if text:
+            self.emitted = True
+        return text
+
+    def _feed(self, chunk: Any, metadata: Dict[str, Any]) -> str:
+        rules = self._rules(metadata) if isinstance(chunk, AIMessageChunk) else None
+        if rules is None:
+            return ""
+        text = chunk.content if isinstance(chunk.content, str) else ""
+        if not text:
+            return ""
+
+        msg_id = chunk.id or ""
+        visible = self._visible.get(msg_id)
+        if visible is False:
+            return ""
+        if visible is True:
+            if msg_id in self._buffers:
+                # Right after a stripped prefix: drop the separating whitespace
+                text = text.lstrip()
+                if text:
+                    self._buffers.pop(msg_id)
+            return text
+
+        # Undecided: buffer until we know whether this is a route or an answer
+        prefixes, default = rules
+        buffer = self._buffers.get(msg_id, "") + text
+        head = buffer.lstrip()
+        for prefix, show in prefixes.items():
+            if head.startswith(prefix):
+                self._visible[msg_id] = show
+                text = head[len(prefix):].lstrip() if show else ""
+                if text or not show:
+                    self._buffers.pop(msg_id, None)
+                else:
+                    self._buffers[msg_id] = ""
+                return text
+        if any(prefix.startswith(head) for prefix in prefixes):
+            self._buffers[msg_id] = buffer
+            return ""
+        self._visible[msg_id] = default
+        self._buffers.pop(msg_id, None)
+        return head if default else ""
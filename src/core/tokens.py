@@ -0,0 +1,55 @@
+import logging
+import math
+import sys
+from functools import lru_cache
+from typing import Iterable
+from langchain_core.messages import BaseMessage
+
+logger = logging.getLogger(__name__)
+
+# Per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """
+    Loads the gpt-4o tokenizer once. tiktoken downloads its file on first use and
+    keeps it in its cache (TIKTOKEN_CACHE_DIR); warm that at build time with
+    `python -m src.core.tokens` so workers don't need the network.
+    Returns None when it is unavailable; callers fall back to an estimate, and
+    that is logged once since budgets and token counts are then approximate.
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning("o200k_base tokenizer unavailable (%s); token counts and budgets "
+                       "are estimates (~4 chars/token)", e)
+        return None
+
+
+def tokenizer_name() -> str:
+    """What count_tokens measures with, for reports."""
+    return "o200k_base" if _get_encoding() is not None else "estimate (~4 chars/token)"
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Rough estimate for English text: ~4 characters per token
+    return math.ceil(len(text) / 4)
+
+
+def count_message_tokens(messages: Iterable[BaseMessage]) -> int:
+    return sum(count_tokens(str(m.content)) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+if __name__ == "__main__":
+    # Build/deploy step: fetch the encoding into tiktoken's cache
+    logging.basicConfig()
+    print(f"tokenizer: {tokenizer_name()}")
+    sys.exit(0 if _get_encoding() is not None else 1)
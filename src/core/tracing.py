@@ -0,0 +1,313 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from .registry import registry
+from ..config import TRACE_EXPORTERS, TRACE_RING_SIZE, TRACE_JSONL_PATH, TRACE_PROMETHEUS_PORT, TRACE_PROMETHEUS_HOST
+
+logger = logging.getLogger(__name__)
+
+# The turn being traced and the innermost open span. Context variables follow
+# the work into asyncio tasks and into LangGraph's worker threads.
+_current_trace: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("span", default=None)
+
+
+class Span:
+    """
+    One timed operation. `kind` groups operations ("node", "llm", "firestore",
+    "weather"); `attrs` carries details such as tokens_in/tokens_out or cache="hit".
+    """
+
+    def __init__(self, kind: str, name: str, attrs: Dict[str, Any]):
+        parent = _current_span.get()
+        self.trace_id = _current_trace.get()
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.kind = kind
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.duration_ms = 0.0
+        self.error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "kind": self.kind,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 2),
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+
+class Exporter:
+    def export(self, span: Span) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class RingBufferExporter(Exporter):
+    """Keeps the last `capacity` spans in memory (for the debugger panel)."""
+
+    def __init__(self, capacity: int = TRACE_RING_SIZE):
+        self._spans: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        # The span itself, so an error set by a later exporter's failure shows here too
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            spans = list(self._spans)
+        if trace_id is not None:
+            spans = [s for s in spans if s.trace_id == trace_id]
+        return [s.as_dict() for s in sorted(spans, key=lambda s: s.start)]
+
+
+class JsonlExporter(Exporter):
+    """Appends one JSON object per span to a file."""
+
+    def __init__(self, path: Path = TRACE_JSONL_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.as_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusExporter(Exporter):
+    """
+    Aggregates spans into Prometheus metrics (text exposition format):
+    a duration histogram per kind/name, error counts, LLM tokens and cache hits/misses.
+    `render()` returns the text; `serve(port)` exposes it at GET /metrics.
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[tuple, List[int]] = defaultdict(lambda: [0] * len(self.BUCKETS))
+        self._count: Dict[tuple, int] = defaultdict(int)
+        self._sum: Dict[tuple, float] = defaultdict(float)
+        self._errors: Dict[tuple, int] = defaultdict(int)
+        self._tokens: Dict[tuple, int] = defaultdict(int)
+        self._cache: Dict[tuple, int] = defaultdict(int)
+        self._server = None
+
+    def export(self, span: Span) -> None:
+        key = (span.kind, span.name)
+        seconds = span.duration_ms / 1000
+        with self._lock:
+            self._count[key] += 1
+            self._sum[key] += seconds
+            buckets = self._buckets[key]
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            if span.error:
+                self._errors[key] += 1
+            for direction in ("in", "out"):
+                tokens = span.attrs.get(f"tokens_{direction}")
+                if tokens:
+                    self._tokens[(span.name, direction)] += tokens
+            if span.attrs.get("cache") in ("hit", "miss"):
+                self._cache[(span.kind, span.name, span.attrs["cache"])] += 1
+
+    def render(self) -> str:
+        lines = [
+            "# HELP ootd_span_duration_seconds Time spent per operation.",
+            "# TYPE ootd_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (kind, name), count in sorted(self._count.items()):
+                labels = f'kind="{kind}",name="{name}"'
+                for bound, value in zip(self.BUCKETS, self._buckets[(kind, name)]):
+                    lines.append(f'ootd_span_duration_seconds_bucket{{{labels},le="{bound}"}} {value}')
+                lines.append(f'ootd_span_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f"ootd_span_duration_seconds_sum{{{labels}}} {self._sum[(kind, name)]:.6f}")
+                lines.append(f"ootd_span_duration_seconds_count{{{labels}}} {count}")
+            lines += ["# HELP ootd_span_errors_total Operations that raised.", "# TYPE ootd_span_errors_total counter"]
+            for (kind, name), value in sorted(self._errors.items()):
+                lines.append(f'ootd_span_errors_total{{kind="{kind}",name="{name}"}} {value}')
+            lines += ["# HELP ootd_llm_tokens_total LLM tokens by agent.", "# TYPE ootd_llm_tokens_total counter"]
+            for (name, direction), value in sorted(self._tokens.items()):
+                lines.append(f'ootd_llm_tokens_total{{name="{name}",direction="{direction}"}} {value}')
+            lines += ["# HELP ootd_cache_requests_total Cache lookups by result.", "# TYPE ootd_cache_requests_total counter"]
+            for (kind, name, result), value in sorted(self._cache.items()):
+                lines.append(f'ootd_cache_requests_total{{kind="{kind}",name="{name}",result="{result}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = TRACE_PROMETHEUS_PORT, host: str = TRACE_PROMETHEUS_HOST) -> None:
+        """Serves GET /metrics from a daemon thread (once per process)."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        if self._server is not None:
+            return
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            # e.g. another worker on this host already serves the port
+            logger.warning("Metrics endpoint not started on %s:%s: %s", host, port, e)
+            return
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+
+class Tracer:
+    """Times spans and hands each finished one to every exporter."""
+
+    def __init__(self, exporters: Optional[List[Exporter]] = None):
+        self.exporters: List[Exporter] = list(exporters or [])
+
+    @classmethod
+    def from_config(cls) -> "Tracer":
+        exporters: List[Exporter] = []
+        for kind in (k.strip().lower() for k in TRACE_EXPORTERS.split(",")):
+            if kind == "memory":
+                exporters.append(RingBufferExporter())
+            elif kind == "jsonl":
+                exporters.append(JsonlExporter())
+            elif kind == "prometheus":
+                prometheus = PrometheusExporter()
+                if TRACE_PROMETHEUS_PORT:
+                    prometheus.serve(TRACE_PROMETHEUS_PORT)
+                exporters.append(prometheus)
+        return cls(exporters)
+
+    def exporter(self, cls: type) -> Optional[Exporter]:
+        """The first exporter of this type, if configured."""
+        return next((e for e in self.exporters if isinstance(e, cls)), None)
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attrs) -> Iterator[Span]:
+        """Times the block; set more attributes on the yielded span's `attrs`."""
+        span = Span(kind, name, attrs)
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - start) * 1000
+            _current_span.reset(token)
+            for exporter in self.exporters:
+                try:
+                    exporter.export(span)
+                except Exception as e:
+                    # Tracing must never break a request; the failure is recorded on the
+                    # span, which the other exporters (e.g. the ring buffer) still get
+                    failure = f"export to {type(exporter).__name__} failed: {type(e).__name__}: {e}"
+                    span.error = f"{span.error}; {failure}" if span.error else failure
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Recent spans from the ring buffer (empty when the memory exporter is off)."""
+        ring = self.exporter(RingBufferExporter)
+        return ring.spans(trace_id) if ring else []
+
+
+registry.register("tracer", Tracer.from_config)
+
+
+def get_tracer() -> Tracer:
+    return registry.get("tracer")
+
+
+def span(kind: str, name: str, **attrs):
+    """`with span("weather", "forecast", cache="miss"): ...` on the shared tracer."""
+    return get_tracer().span(kind, name, **attrs)
+
+
+@contextmanager
+def trace(trace_id: Optional[str] = None) -> Iterator[str]:
+    """Groups every span opened inside the block (one chat turn) under one trace id."""
+    trace_id = trace_id or uuid.uuid4().hex
+    token = _current_trace.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _current_trace.reset(token)
+
+
+def usage_attrs(message: Any) -> Dict[str, int]:
+    """tokens_in/tokens_out from an LLM response's usage metadata, when reported."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    return {"tokens_in": usage.get("input_tokens", 0), "tokens_out": usage.get("output_tokens", 0)}
+
+
+def render_timeline(spans: List[Dict[str, Any]], width: int = 30) -> str:
+    """
+    Text timeline of one trace: start offset, a bar placed on the turn's time axis,
+    duration, and the span (indented under its parent) with its attributes.
+    """
+    if not spans:
+        return ""
+    spans = sorted(spans, key=lambda s: s["start"])
+    origin = spans[0]["start"]
+    total_ms = max((s["start"] - origin) * 1000 + s["duration_ms"] for s in spans) or 1.0
+    by_id = {s["span_id"]: s for s in spans}
+
+    def depth(s: Dict[str, Any]) -> int:
+        level, parent = 0, by_id.get(s["parent_id"])
+        while parent is not None:
+            level, parent = level + 1, by_id.get(parent["parent_id"])
+        return level
+
+    lines = []
+    for s in spans:
+        offset_ms = (s["start"] - origin) * 1000
+        begin = int(offset_ms / total_ms * width)
+        length = max(1, round(s["duration_ms"] / total_ms * width))
+        bar = (" " * begin + "█" * length).ljust(width)[:width]
+        attrs = " ".join(f"{k}={v}" for k, v in s["attrs"].items() if v is not None)
+        label = f"{'  ' * depth(s)}{s['kind']}:{s['name']}"
+        if s["error"]:
+            label += " !"
+        lines.append(f"{offset_ms:7.0f}ms |{bar}| {s['duration_ms']:7.1f}ms  {label}  {attrs}".rstrip())
+    return "\n".join(lines)
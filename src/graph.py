@@ -1,65 +1,202 @@
-from typing import Literal
+import threading
+from typing import Any, Dict, List, Optional, Union
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 from .state import SessionState
 from .agents.orchestrator import Orchestrator
 from .agents.subagents import OccasionAgent, ItemStylingAgent, ColorAgent, TemperatureAgent
+from .agents.intent_classifier import IntentClassifier
+from .agents.routing_cache import answers_question
+from .agents.speculation import Speculator
 from .memory.firestore_store import FirestoreStore
+from .memory.checkpointer import make_checkpointer, prune_idle_threads
+from .memory.summary_writer import SummaryWriter
+from .core.registry import registry
+from .core.tracing import span
+from .services.weather_prefetcher import WeatherPrefetcher
+from .config import PREROUTER_ENABLED, PREROUTER_CONFIDENCE_THRESHOLD, SPECULATION_ENABLED, WEATHER_PREFETCH_ENABLED
 
-# Initialize Agents
-orchestrator = Orchestrator()
-occasion_agent = OccasionAgent()
-item_agent = ItemStylingAgent()
-color_agent = ColorAgent()
-temp_agent = TemperatureAgent()
+# Agents, the store and the checkpointer are built on first use and shared by every
+# session in the process; importing this module only defines the graph.
+SUBAGENTS = {
+    "occasion_formality": OccasionAgent,
+    "item_styling": ItemStylingAgent,
+    "color_intelligence": ColorAgent,
+    "temperature": TemperatureAgent,
+}
+registry.register("orchestrator", Orchestrator)
+for _name, _cls in SUBAGENTS.items():
+    registry.register(_name, _cls)
+# Optional local pre-router (CPU only) in front of the LLM router
+registry.register("prerouter", lambda: IntentClassifier() if PREROUTER_ENABLED else None)
+# Optional speculative subagents, started while the LLM router is still deciding
+registry.register("speculator", lambda: Speculator() if SPECULATION_ENABLED else None)
+registry.register("store", FirestoreStore)
+registry.register("checkpointer", make_checkpointer)
+# Summary persistence: skips unchanged summaries, writes the rest in the background
+registry.register("summary_writer", lambda: SummaryWriter(lambda: registry.get("store")))
+# Weather for the sessions' cities, refreshed in the background (its thread starts on first use)
+registry.register("weather_prefetcher", lambda: WeatherPrefetcher() if WEATHER_PREFETCH_ENABLED else None)
 
-# Initialize Store
-store = FirestoreStore()
+# Old module-level names, resolved through the registry on access
+_LEGACY_NAMES = {
+    "orchestrator": "orchestrator",
+    "occasion_agent": "occasion_formality",
+    "item_agent": "item_styling",
+    "color_agent": "color_intelligence",
+    "temp_agent": "temperature",
+    "prerouter": "prerouter",
+    "speculator": "speculator",
+    "store": "store",
+    "summary_writer": "summary_writer",
+}
+
+def __getattr__(name: str):
+    if name == "app":
+        return get_app()
+    if name in _LEGACY_NAMES:
+        return registry.get(_LEGACY_NAMES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def warm_up() -> None:
+    """Builds the agents and store ahead of the first request
+    (e.g. from a background thread once a server has started)."""
+    for name in ["orchestrator", *SUBAGENTS, "prerouter", "speculator", "store", "summary_writer", "weather_prefetcher"]:
+        registry.get(name)
+
+def maintain_checkpoints() -> int:
+    """Deletes checkpoint threads idle past CHECKPOINT_THREAD_TTL_SECONDS; returns how many.
+    Called by the server (at startup and periodically), never on import."""
+    saver = registry.get("checkpointer")
+    return prune_idle_threads(saver) if saver is not None else 0
+
+def answer_cache_metrics() -> Dict[str, Any]:
+    """Answer cache hit rates per subagent (for the agents built so far)."""
+    created = registry.created()
+    return {name: registry.get(name).answer_cache.metrics() for name in SUBAGENTS if name in created}
+
+def _preroute(state: SessionState) -> Optional[Dict[str, Any]]:
+    # Fast path: on a routing pass, let the local classifier pick the agent
+    # when it is confident. Anything else falls through to the LLM, including
+    # replies to a question: the classifier only sees the latest message, and
+    # "work" after "Is this for work or a dinner?" isn't a new occasion request.
+    prerouter = registry.get("prerouter")
+    if prerouter is not None and not Orchestrator.agent_response(state) \
+            and not answers_question(state["messages"]):
+        route = prerouter.route(state["messages"][-1].content, PREROUTER_CONFIDENCE_THRESHOLD)
+        if route:
+            return Orchestrator.route_update([route])
+    return None
+
+def _speculation_target(state: SessionState) -> Optional[str]:
+    """The expert worth starting before the router answers, if any."""
+    speculator = registry.get("speculator")
+    if speculator is None or Orchestrator.agent_response(state):
+        return None
+    orchestrator = registry.get("orchestrator")
+    # Nothing to overlap when the route comes from the cache, and an expert
+    # started now would miss the history this pass is about to compress
+    if orchestrator.routing_cache.peek(state) or orchestrator.needs_compression(state):
+        return None
+    return speculator.predict(state)
 
 def orchestrator_node(state: SessionState):
+    speculator = registry.get("speculator")
+    fast_result = _preroute(state)
+    if fast_result:
+        if speculator is not None:
+            speculator.observe(state, fast_result["next_agents"])
+        return fast_result
+
+    target = _speculation_target(state)
+    spec = speculator.start(state, target, registry.get(target)) if target else None
     # If we are returning from a subagent, the last message is the agent response.
     # The orchestrator logic in `invoke` handles context building.
     # We just call invoke.
-    result = orchestrator.invoke(state)
+    try:
+        result = registry.get("orchestrator").invoke(state)
+    except BaseException:
+        if speculator is not None:
+            speculator.discard(spec)
+        raise
+    if speculator is not None and not Orchestrator.agent_response(state):
+        result = speculator.finish(spec, state, result)
     
-    # Persistence: Save summary if updated
+    # Persistence: queue the summary for Firestore. Every pass returns it, but
+    # the writer only stores it when it changed, in the background.
     if "summary" in result and result["summary"]:
-        # We need the user_id to save to the right key. 
-        # It's in the state!
-        user_id = state["user_id"]
-        
-        # Save to Firestore
-        store.put(
-            namespace=("users",),
-            key=user_id,
-            value={"summary": result["summary"]}
-        )
+        registry.get("summary_writer").save(state["user_id"], result["summary"])
         
     return result
 
-def occasion_node(state: SessionState):
-    return occasion_agent.invoke(state)
+async def aorchestrator_node(state: SessionState):
+    speculator = registry.get("speculator")
+    fast_result = _preroute(state)
+    if fast_result:
+        if speculator is not None:
+            speculator.observe(state, fast_result["next_agents"])
+        return fast_result
+
+    target = _speculation_target(state)
+    spec = speculator.astart(state, target, registry.get(target)) if target else None
+    try:
+        result = await registry.get("orchestrator").ainvoke(state)
+    except BaseException:
+        if speculator is not None:
+            speculator.discard(spec)
+        raise
+    if speculator is not None and not Orchestrator.agent_response(state):
+        result = await speculator.afinish(spec, state, result)
+    if "summary" in result and result["summary"]:
+        # Only touches memory; the write happens on the writer's flush thread
+        registry.get("summary_writer").save(state["user_id"], result["summary"])
+    return result
+
+def node(name: str, sync_fn, async_fn) -> RunnableLambda:
+    """Graph node with both entry points: `app.invoke/stream` use the sync one,
+    `app.ainvoke/astream` await the async one without blocking the event loop.
+    Each run is traced as a "node" span."""
+    def run(state: SessionState):
+        with span("node", name):
+            return sync_fn(state)
+
+    async def arun(state: SessionState):
+        with span("node", name):
+            return await async_fn(state)
+
+    return RunnableLambda(run, afunc=arun, name=name)
 
-def item_node(state: SessionState):
-    return item_agent.invoke(state)
+def agent_node(name: str) -> RunnableLambda:
+    """Subagent node; the agent itself is looked up (and built, the first time) per call.
+    A speculative answer the orchestrator already has for this turn is used as is."""
+    def run(state: SessionState):
+        return Speculator.claim(state, name) or registry.get(name).invoke(state)
 
-def color_node(state: SessionState):
-    return color_agent.invoke(state)
+    async def arun(state: SessionState):
+        return Speculator.claim(state, name) or await registry.get(name).ainvoke(state)
 
-def temp_node(state: SessionState):
-    return temp_agent.invoke(state)
+    return node(name, run, arun)
 
-def router(state: SessionState) -> Literal["occasion_formality", "item_styling", "color_intelligence", "temperature", "end"]:
-    # The orchestrator sets 'next_agent' in the state update
+def router(state: SessionState) -> Union[str, List[str]]:
+    # The orchestrator sets 'next_agent' / 'next_agents' in the state update.
+    # Returning several nodes fans out: they run in the same step, in parallel,
+    # and the orchestrator runs once afterwards to compose all their answers.
+    agents = state.get("next_agents")
+    if agents and len(agents) > 1:
+        return agents
     return state.get("next_agent", "end")
 
+def after_agent(state: SessionState) -> str:
+    # Signals left to compose (QUESTION, fan-out answers, the non-fused modes) go
+    # back to the orchestrator; a fused reply needs no second pass
+    return "orchestrator" if Orchestrator.agent_signals(state) else "end"
+
 # Build Graph
 workflow = StateGraph(SessionState)
 
-workflow.add_node("orchestrator", orchestrator_node)
-workflow.add_node("occasion_formality", occasion_node)
-workflow.add_node("item_styling", item_node)
-workflow.add_node("color_intelligence", color_node)
-workflow.add_node("temperature", temp_node)
+workflow.add_node("orchestrator", node("orchestrator", orchestrator_node, aorchestrator_node))
+for _name in SUBAGENTS:
+    workflow.add_node(_name, agent_node(_name))
 
 workflow.set_entry_point("orchestrator")
 
@@ -76,9 +213,35 @@ workflow.add_conditional_edges(
 )
 
 # Subagents return to orchestrator to compose final response
-workflow.add_edge("occasion_formality", "orchestrator")
-workflow.add_edge("item_styling", "orchestrator")
-workflow.add_edge("color_intelligence", "orchestrator")
-workflow.add_edge("temperature", "orchestrator")
+# (after a fan-out, once all of them have answered). In fused compose mode an
+# expert's FINAL_ANSWER is already the reply and the turn ends there.
+for _name in SUBAGENTS:
+    workflow.add_conditional_edges(_name, after_agent, {"orchestrator": "orchestrator", "end": END})
+
+_app = None
+_app_lock = threading.Lock()
+
+def get_app():
+    """
+    The compiled graph (also `graph.app`). With a checkpointer it keeps each
+    session's messages, summary and context between turns (thread_id = session id),
+    so callers send only the new message. Compiled on first use, so importing this
+    module doesn't open the checkpoint database.
+    """
+    global _app
+    if _app is None:
+        with _app_lock:
+            if _app is None:
+                _app = workflow.compile(checkpointer=registry.get("checkpointer"))
+    return _app
+
+def thread_config(session_id: str, user_id: str) -> Dict[str, Any]:
+    """Run config selecting the session's checkpoint thread."""
+    return {"configurable": {"thread_id": session_id, "user_id": user_id}}
 
-app = workflow.compile()
+async def arun(inputs: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Async entry point. Many sessions can be in flight on one event loop:
+    every LLM and Firestore call in the graph is awaited, not blocking a thread.
+    """
+    return await get_app().ainvoke(inputs, config)
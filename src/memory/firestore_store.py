@@ -1,79 +1,600 @@
+import asyncio
+import base64
+import itertools
 import json
-from typing import Any, List, Sequence, Tuple, Optional
-from langgraph.store.base import BaseStore, Item, Op, PutOp, GetOp, SearchOp, ListNamespacesOp
-from ..core.firebase import db
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Sequence, Tuple, Optional
+from langgraph.store.base import (
+    BaseStore, Item, MatchCondition, Op, PutOp, GetOp, SearchItem, SearchOp, ListNamespacesOp,
+)
+from ..core.cache import InMemoryBackend, SingleFlight
+from ..core.firebase import get_db, get_async_db
+from ..core.tracing import span
+from ..config import (
+    FIRESTORE_WRITE_BEHIND_SECONDS, STORE_VECTOR_INDEX, STORE_INDEX_FIELDS, STORE_VECTOR_REFRESH_SECONDS,
+    STORE_PAGE_SIZE, STORE_NAMESPACE_CACHE_ENTRIES,
+)
+from .vector_index import VectorIndex, matches_filter, value_text
+from .write_behind import WriteBehindBuffer
+
+# Firestore rejects batches with more writes than this
+FIRESTORE_MAX_BATCH_WRITES = 500
+
+# Namespace path encoding: labels joined by (and ending in) a separator that sorts
+# below any printable character, so a string range over the path is a namespace
+# prefix match and path order is tuple order.
+NS_SEP = "\x1f"
+# Upper bound for "starts with" ranges, as usual with Firestore
+NS_END = "\uf8ff"
+
+
+def ns_path(namespace: Sequence[str]) -> str:
+    return "".join(label + NS_SEP for label in namespace)
+
+
+def _matches(namespace: Tuple[str, ...], condition: MatchCondition) -> bool:
+    """ListNamespacesOp condition; "*" in the path matches any label."""
+    if len(namespace) < len(condition.path):
+        return False
+    labels = namespace if condition.match_type == "prefix" else namespace[len(namespace) - len(condition.path):]
+    return all(p == "*" or p == label for p, label in zip(condition.path, labels))
+
+
+def _encode_cursor(values: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Dict[str, Any]:
+    return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+
 
 class FirestoreStore(BaseStore):
-    def __init__(self, collection_name: str = "memory"):
-        self.collection = db.collection(collection_name)
+    """
+    LangGraph BaseStore on top of one Firestore collection.
+
+    Batch semantics follow the BaseStore contract: results come back in op order,
+    reads see the state from before the batch's own writes, and several puts to
+    the same key within a batch collapse to the last one.
+
+    SearchOp without a query is a Firestore query with equality filters, offset
+    and limit pushed down. With a query it is a semantic search: values are
+    embedded on put and ranked by cosine similarity in a per-namespace vector
+    index (see vector_index.py), built from Firestore on first use. Writes from
+    other workers are picked up every STORE_VECTOR_REFRESH_SECONDS; deletes from
+    other workers only on a full rebuild. Semantic search is per exact namespace.
+
+    Namespaces: each document carries its namespace as a sortable path string, so
+    structured search matches a namespace prefix with one range query, paged
+    lazily (`iter_search`, `search_page`). Puts also register their namespace in
+    a small `<collection>_namespaces` collection, which ListNamespacesOp and
+    `iter_namespaces` page through instead of scanning documents. These queries
+    need the composite indexes in firestore.indexes.json, and documents written
+    before `ns_path` existed need `backfill_namespaces` once (see README).
+    """
+
+    def __init__(
+        self,
+        collection_name: str = "memory",
+        write_behind_seconds: float = FIRESTORE_WRITE_BEHIND_SECONDS,
+        vector_index: bool = STORE_VECTOR_INDEX,
+    ):
+        self.collection_name = collection_name
+        self.db = get_db()
+        self.collection = self.db.collection(collection_name)
+        # Optional write-behind: puts are acknowledged immediately and committed
+        # after a short window, coalescing repeated puts to the same key.
+        self.write_buffer = None
+        if write_behind_seconds > 0:
+            self.write_buffer = WriteBehindBuffer(self._commit_writes, write_behind_seconds)
+        self.vector_index = VectorIndex.from_config() if vector_index else None
+        # Concurrent first searches of a namespace share one index build
+        self._index_flight = SingleFlight()
+        self.namespaces = self.db.collection(f"{collection_name}_namespaces")
+        # Namespaces already registered, so repeated puts don't rewrite their entry
+        self._known_namespaces = InMemoryBackend(STORE_NAMESPACE_CACHE_ENTRIES)
+
+    @property
+    def async_db(self):
+        # Created on first async use; sync-only callers never build it
+        return get_async_db()
+
+    @property
+    def async_collection(self):
+        return self.async_db.collection(self.collection_name)
+
+    @property
+    def async_namespaces(self):
+        return self.async_db.collection(f"{self.collection_name}_namespaces")
 
     def _get_doc_id(self, namespace: Tuple[str, ...], key: str) -> str:
         # Create a unique ID from namespace and key
         ns_str = ":".join(namespace)
         return f"{ns_str}::{key}"
 
-    def batch(self, ops: Sequence[Op]) -> List[Any]:
-        results = []
-        batch = db.batch()
-        
-        for op in ops:
+    @staticmethod
+    def _to_item(data: dict) -> Item:
+        return Item(
+            value=data.get("value"),
+            key=data.get("key"),
+            namespace=tuple(data.get("namespace", [])),
+            # Only updated_at is written; use it for created_at too
+            created_at=data.get("created_at") or data.get("updated_at"),
+            updated_at=data.get("updated_at")
+        )
+
+    @staticmethod
+    def _to_search_item(data: dict) -> SearchItem:
+        return SearchItem(
+            namespace=tuple(data.get("namespace", [])),
+            key=data.get("key"),
+            value=data.get("value"),
+            created_at=data.get("created_at") or data.get("updated_at"),
+            updated_at=data.get("updated_at"),
+        )
+
+    @staticmethod
+    def _pending_item(op: PutOp) -> Optional[Item]:
+        """Item view of a buffered (not yet committed) put. None means a pending delete."""
+        if op.value is None:
+            return None
+        now = datetime.now(timezone.utc)
+        return Item(value=op.value, key=op.key, namespace=op.namespace, created_at=now, updated_at=now)
+
+    def _plan(
+        self, ops: Sequence[Op]
+    ) -> Tuple[List[Any], List[Tuple[int, str]], List[Tuple[int, Op]], Dict[str, PutOp]]:
+        """
+        Splits ops into reads and writes. Returns (results, gets as (index, doc_id),
+        queries as (index, op) for searches and namespace listings, writes by doc_id).
+        """
+        results: List[Any] = [None] * len(ops)
+        gets, queries = [], []
+        writes: Dict[str, PutOp] = {}
+        for idx, op in enumerate(ops):
             if isinstance(op, PutOp):
                 doc_id = self._get_doc_id(op.namespace, op.key)
-                doc_ref = self.collection.document(doc_id)
-                data = {
-                    "value": op.value,
-                    "namespace": op.namespace,
-                    "key": op.key,
-                    "updated_at": firestore.SERVER_TIMESTAMP
-                }
-                batch.set(doc_ref, data, merge=True)
-                results.append(None)
-                
+                # Last write wins within a batch
+                writes.pop(doc_id, None)
+                writes[doc_id] = op
             elif isinstance(op, GetOp):
                 doc_id = self._get_doc_id(op.namespace, op.key)
-                doc_ref = self.collection.document(doc_id)
-                doc = doc_ref.get()
-                if doc.exists:
-                    data = doc.to_dict()
-                    results.append(Item(
-                        value=data.get("value"),
-                        key=data.get("key"),
-                        namespace=tuple(data.get("namespace", [])),
-                        created_at=data.get("created_at"), 
-                        updated_at=data.get("updated_at")
-                    ))
+                found, pending = self.write_buffer.get(doc_id) if self.write_buffer else (False, None)
+                if found:
+                    # Read-your-writes for puts still sitting in the buffer
+                    results[idx] = self._pending_item(pending)
                 else:
-                    results.append(None)
-                    
-            elif isinstance(op, SearchOp):
-                # Simplified search: exact match on namespace
-                query = self.collection.where("namespace", "==", list(op.namespace))
-                docs = query.stream()
-                items = []
-                for doc in docs:
-                    data = doc.to_dict()
-                    items.append(Item(
-                        value=data.get("value"),
-                        key=data.get("key"),
-                        namespace=tuple(data.get("namespace", [])),
-                        created_at=data.get("created_at"),
-                        updated_at=data.get("updated_at")
-                    ))
-                results.append(items)
-                
-            elif isinstance(op, ListNamespacesOp):
-                results.append([])
-
-        # Commit writes
-        batch.commit()
-        return results
+                    gets.append((idx, doc_id))
+            elif isinstance(op, (SearchOp, ListNamespacesOp)):
+                queries.append((idx, op))
+        return results, gets, queries, writes
+
+    @staticmethod
+    def _write_data(op: PutOp) -> Dict[str, Any]:
+        from firebase_admin import firestore  # SERVER_TIMESTAMP; the SDK loads on first write
+        data = {
+            "value": op.value,
+            "namespace": op.namespace,
+            "key": op.key,
+            "ns_path": ns_path(op.namespace),
+            "updated_at": firestore.SERVER_TIMESTAMP
+        }
+        if op.index is not None:
+            # Which fields to embed (or False), so a rebuilt index treats the value the same way
+            data["index"] = op.index
+        return data
+
+    @staticmethod
+    def _index_text(value: Optional[Dict[str, Any]], index: Any) -> Optional[str]:
+        """Text to embed for a value; None if it isn't indexed (deleted or index=False)."""
+        if value is None or index is False:
+            return None
+        return value_text(value, index or STORE_INDEX_FIELDS)
+
+    def _index_writes(self, writes: Dict[str, PutOp]) -> None:
+        """Mirrors puts/deletes into the namespace indexes already loaded, so searches see them."""
+        if self.vector_index is None:
+            return
+        ops = [op for op in writes.values() if self.vector_index.get(op.namespace) is not None]
+        if not ops:
+            return
+        texts = [self._index_text(op.value, op.index) for op in ops]
+        to_embed = [t for t in texts if t is not None]
+        vectors = iter(self.vector_index.embed(to_embed) if to_embed else [])
+        now = datetime.now(timezone.utc)
+        for op, text in zip(ops, texts):
+            if text is None:
+                self.vector_index.apply(op.namespace, op.key, None, None)
+            else:
+                item = Item(value=dict(op.value), key=op.key, namespace=op.namespace, created_at=now, updated_at=now)
+                self.vector_index.apply(op.namespace, op.key, item, next(vectors))
+
+    def _sync_index(self, namespace: Tuple[str, ...]) -> None:
+        """Makes sure the namespace's index is loaded and refreshed within the refresh interval."""
+        index = self.vector_index.get(namespace)
+        if index is not None and time.time() - index.checked_at < STORE_VECTOR_REFRESH_SECONDS:
+            return
+        self._index_flight.do(json.dumps(namespace), lambda: self._load_index(namespace))
+
+    def _load_index(self, namespace: Tuple[str, ...]) -> None:
+        # In memory, else the last snapshot; either way only newer documents are read.
+        # Without both, every document of the namespace is read and embedded once.
+        index = self.vector_index.get(namespace) or self.vector_index.load(namespace)
+        query = self.collection.where("namespace", "==", list(namespace))
+        if index is not None:
+            query = query.where("updated_at", ">", datetime.fromtimestamp(index.synced_at, timezone.utc))
+        with span("firestore", "store.index_sync", full=index is None) as s:
+            docs = [doc.to_dict() for doc in query.stream()]
+            s.attrs["docs"] = len(docs)
+        self.vector_index.build(
+            namespace,
+            ((self._to_item(d), self._index_text(d.get("value"), d.get("index"))) for d in docs),
+            base=index,
+        )
+        if index is None:
+            self.vector_index.save(namespace)
+
+    def _semantic_search(self, op: SearchOp) -> List[SearchItem]:
+        namespace = tuple(op.namespace_prefix)
+        self._sync_index(namespace)
+        with span("search", "vector", limit=op.limit, filtered=bool(op.filter)):
+            return self.vector_index.search(namespace, op.query, op.filter, op.limit, op.offset)
+
+    # -- paged queries --
+
+    @staticmethod
+    def _prefix_query(query: Any, prefix: Sequence[str]) -> Any:
+        """Documents (or namespace entries) whose namespace starts with `prefix`."""
+        if not prefix:
+            return query
+        path = ns_path(prefix)
+        return query.where("ns_path", ">=", path).where("ns_path", "<", path + NS_END)
+
+    @staticmethod
+    def _paged(query: Any, order: Sequence[str], page_size: int = STORE_PAGE_SIZE,
+               after: Optional[Dict[str, Any]] = None, offset: int = 0) -> Iterator[dict]:
+        """
+        Streams a query's documents one page (round trip) at a time, ordered by
+        `order` and continuing after the last document of the previous page. Stop
+        iterating and no further pages are read.
+        """
+        for field in order:
+            query = query.order_by(field)
+        while True:
+            page = query.start_after(after) if after is not None else query
+            if offset:
+                page = page.offset(offset)
+            with span("firestore", "store.page", size=page_size):
+                docs = [doc.to_dict() for doc in page.limit(page_size).stream()]
+            yield from docs
+            if len(docs) < page_size:
+                return
+            after, offset = {field: docs[-1][field] for field in order}, 0
+
+    @staticmethod
+    async def _apaged(query: Any, order: Sequence[str], page_size: int = STORE_PAGE_SIZE,
+                      after: Optional[Dict[str, Any]] = None, offset: int = 0):
+        for field in order:
+            query = query.order_by(field)
+        while True:
+            page = query.start_after(after) if after is not None else query
+            if offset:
+                page = page.offset(offset)
+            with span("firestore", "store.page", size=page_size):
+                docs = [doc.to_dict() async for doc in page.limit(page_size).stream()]
+            for doc in docs:
+                yield doc
+            if len(docs) < page_size:
+                return
+            after, offset = {field: docs[-1][field] for field in order}, 0
+
+    # -- structured search --
+
+    _SEARCH_ORDER = ("ns_path", "key")
 
-        # Commit writes
-        batch.commit()
+    def _search_query(self, collection: Any, namespace_prefix: Sequence[str],
+                      filter: Optional[Dict[str, Any]]) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Firestore query for a search without `query`: the namespace prefix as a
+        range and equality filters run server side. Returns it with the filter
+        conditions left for us (operators like $gt).
+        """
+        query = self._prefix_query(collection, namespace_prefix)
+        leftover = {}
+        for field, cond in (filter or {}).items():
+            if isinstance(cond, dict):
+                leftover[field] = cond
+            else:
+                query = query.where(f"value.{field}", "==", cond)
+        return query, leftover
+
+    @staticmethod
+    def _search_page_size(op: SearchOp, leftover: Dict[str, Any]) -> int:
+        # With everything pushed down, a page as large as the answer is the only read
+        return STORE_PAGE_SIZE if leftover else max(1, min(STORE_PAGE_SIZE, op.limit))
+
+    def _structured_search(self, op: SearchOp) -> List[SearchItem]:
+        query, leftover = self._search_query(self.collection, op.namespace_prefix, op.filter)
+        # Firestore skips the offset itself unless we filter after it
+        docs = self._paged(query, self._SEARCH_ORDER, self._search_page_size(op, leftover),
+                           offset=0 if leftover else op.offset)
+        items = (self._to_search_item(d) for d in docs)
+        if leftover:
+            items = (i for i in items if matches_filter(i.value or {}, leftover))
+            return list(itertools.islice(items, op.offset, op.offset + op.limit))
+        return list(itertools.islice(items, op.limit))
+
+    async def _astructured_search(self, op: SearchOp) -> List[SearchItem]:
+        query, leftover = self._search_query(self.async_collection, op.namespace_prefix, op.filter)
+        skip = op.offset if leftover else 0
+        items: List[SearchItem] = []
+        if op.limit <= 0:
+            return items
+        async for doc in self._apaged(query, self._SEARCH_ORDER, self._search_page_size(op, leftover),
+                                      offset=0 if leftover else op.offset):
+            item = self._to_search_item(doc)
+            if leftover and not matches_filter(item.value or {}, leftover):
+                continue
+            if skip:
+                skip -= 1
+                continue
+            items.append(item)
+            if len(items) >= op.limit:
+                break
+        return items
+
+    def iter_search(self, namespace_prefix: Tuple[str, ...], *, filter: Optional[Dict[str, Any]] = None,
+                    page_size: int = STORE_PAGE_SIZE, cursor: Optional[str] = None) -> Iterator[SearchItem]:
+        """
+        Every item under a namespace prefix, lazily: Firestore is read a page at a
+        time as the caller iterates, so a cleanup job can walk millions of items in
+        constant memory. Ordered by namespace, then key. Buffered writes are flushed first.
+        """
+        if self.write_buffer:
+            self.write_buffer.flush()
+        query, leftover = self._search_query(self.collection, namespace_prefix, filter)
+        after = _decode_cursor(cursor) if cursor else None
+        for doc in self._paged(query, self._SEARCH_ORDER, page_size, after):
+            item = self._to_search_item(doc)
+            if not leftover or matches_filter(item.value or {}, leftover):
+                yield item
+
+    def search_page(self, namespace_prefix: Tuple[str, ...], *, filter: Optional[Dict[str, Any]] = None,
+                    limit: int = 10, cursor: Optional[str] = None) -> Tuple[List[SearchItem], Optional[str]]:
+        """
+        One page of a structured search and the cursor for the next (None at the end).
+        Unlike offset, a cursor doesn't make Firestore read and skip the earlier pages.
+        """
+        items = list(itertools.islice(
+            self.iter_search(namespace_prefix, filter=filter, page_size=limit + 1, cursor=cursor), limit + 1
+        ))
+        if len(items) <= limit:
+            return items, None
+        last = items[limit - 1]
+        return items[:limit], _encode_cursor({"ns_path": ns_path(last.namespace), "key": last.key})
+
+    # -- namespaces --
+
+    def _namespace_query(self, op: ListNamespacesOp) -> Tuple[Any, bool]:
+        """Registry query for a ListNamespacesOp; True when its answer is exactly the entries."""
+        conditions = op.match_conditions or ()
+        prefix = next((c.path for c in conditions if c.match_type == "prefix"), ())
+        # Only the labels before the first wildcard can be a range query
+        fixed = tuple(itertools.takewhile(lambda label: label != "*", prefix))
+        exact = op.max_depth is None and all(c.match_type == "prefix" and tuple(c.path) == fixed for c in conditions)
+        return self._prefix_query(self.namespaces, fixed), exact
+
+    def _namespaces_from(self, entries, op: ListNamespacesOp, check: bool) -> Iterator[Tuple[str, ...]]:
+        last = None
+        for entry in entries:
+            namespace = tuple(entry["namespace"])
+            if check and not all(_matches(namespace, c) for c in op.match_conditions or ()):
+                continue
+            if op.max_depth is not None:
+                namespace = namespace[:op.max_depth]
+                # Path order keeps namespaces sharing a truncated prefix together
+                if namespace == last:
+                    continue
+            last = namespace
+            yield namespace
+
+    def _list_namespaces(self, op: ListNamespacesOp) -> List[Tuple[str, ...]]:
+        query, exact = self._namespace_query(op)
+        if exact:
+            # Nothing to check or collapse here: offset and limit go to Firestore
+            entries = self._paged(query, ("ns_path",), max(1, min(STORE_PAGE_SIZE, op.limit)), offset=op.offset)
+            return list(itertools.islice(self._namespaces_from(entries, op, False), op.limit))
+        entries = self._paged(query, ("ns_path",))
+        return list(itertools.islice(self._namespaces_from(entries, op, True), op.offset, op.offset + op.limit))
+
+    def iter_namespaces(self, prefix: Optional[Tuple[str, ...]] = None, suffix: Optional[Tuple[str, ...]] = None,
+                        max_depth: Optional[int] = None) -> Iterator[Tuple[str, ...]]:
+        """Every namespace matching, lazily and in order (ListNamespacesOp without limit/offset)."""
+        if self.write_buffer:
+            self.write_buffer.flush()
+        conditions = []
+        if prefix:
+            conditions.append(MatchCondition(match_type="prefix", path=tuple(prefix)))
+        if suffix:
+            conditions.append(MatchCondition(match_type="suffix", path=tuple(suffix)))
+        op = ListNamespacesOp(match_conditions=tuple(conditions), max_depth=max_depth)
+        query, exact = self._namespace_query(op)
+        return self._namespaces_from(self._paged(query, ("ns_path",)), op, not exact)
+
+    def prune_namespaces(self) -> int:
+        """Drops registry entries of namespaces with no documents left. Returns how many."""
+        if self.write_buffer:
+            self.write_buffer.flush()
+        pruned = 0
+        for entry in self._paged(self.namespaces, ("ns_path",)):
+            namespace = tuple(entry["namespace"])
+            docs = self.collection.where("namespace", "==", list(namespace)).limit(1).stream()
+            if next(iter(docs), None) is None:
+                self.namespaces.document(self._namespace_id(namespace)).delete()
+                self._known_namespaces.delete(ns_path(namespace))
+                pruned += 1
+        return pruned
+
+    def backfill_namespaces(self) -> int:
+        """
+        One-off for documents written before namespace paths existed: adds their
+        `ns_path` and registers their namespaces. Returns how many documents changed.
+        """
+        changed, batch, pending = 0, self.db.batch(), 0
+        for doc in self.collection.stream():
+            data = doc.to_dict()
+            if "ns_path" in data or "namespace" not in data:
+                continue
+            namespace = tuple(data["namespace"])
+            batch.set(self.collection.document(doc.id), {"ns_path": ns_path(namespace)}, merge=True)
+            pending += 1
+            if self._known_namespaces.get(ns_path(namespace)) is None:
+                batch.set(self.namespaces.document(self._namespace_id(namespace)), self._namespace_entry(namespace))
+                self._known_namespaces.set(ns_path(namespace), True)
+                pending += 1
+            changed += 1
+            if pending >= FIRESTORE_MAX_BATCH_WRITES - 1:
+                batch.commit()
+                batch, pending = self.db.batch(), 0
+        if pending:
+            batch.commit()
+        return changed
+
+    # -- writes --
+
+    def _namespace_id(self, namespace: Tuple[str, ...]) -> str:
+        return ":".join(namespace)
+
+    @staticmethod
+    def _namespace_entry(namespace: Tuple[str, ...]) -> Dict[str, Any]:
+        return {"namespace": list(namespace), "ns_path": ns_path(namespace), "depth": len(namespace)}
+
+    def _write_plan(self, writes: Dict[str, PutOp], collection: Any,
+                    namespaces: Any) -> Tuple[List[Tuple[Any, Optional[Dict[str, Any]]]], List[str]]:
+        """(doc ref, data or None to delete) per write, plus registry entries for new namespaces."""
+        entries, new = [], {}
+        for doc_id, op in writes.items():
+            entries.append((collection.document(doc_id), None if op.value is None else self._write_data(op)))
+            path = ns_path(op.namespace)
+            if op.value is not None and path not in new and self._known_namespaces.get(path) is None:
+                new[path] = (namespaces.document(self._namespace_id(op.namespace)),
+                             self._namespace_entry(op.namespace))
+        return entries + list(new.values()), list(new)
+
+    def _commit_writes(self, writes: Dict[str, PutOp]) -> None:
+        """Commits puts/deletes (and new namespace entries), split at Firestore's per-batch write limit."""
+        entries, new = self._write_plan(writes, self.collection, self.namespaces)
+        for start in range(0, len(entries), FIRESTORE_MAX_BATCH_WRITES):
+            chunk = entries[start:start + FIRESTORE_MAX_BATCH_WRITES]
+            batch = self.db.batch()
+            for doc_ref, data in chunk:
+                if data is None:
+                    batch.delete(doc_ref)
+                else:
+                    # Merge, so fields this store doesn't write (created_at, ...) survive a put
+                    batch.set(doc_ref, data, merge=True)
+            with span("firestore", "store.commit", writes=len(chunk)):
+                batch.commit()
+        for path in new:
+            self._known_namespaces.set(path, True)
+
+    async def _acommit_writes(self, writes: Dict[str, PutOp]) -> None:
+        entries, new = self._write_plan(writes, self.async_collection, self.async_namespaces)
+        for start in range(0, len(entries), FIRESTORE_MAX_BATCH_WRITES):
+            chunk = entries[start:start + FIRESTORE_MAX_BATCH_WRITES]
+            batch = self.async_db.batch()
+            for doc_ref, data in chunk:
+                if data is None:
+                    batch.delete(doc_ref)
+                else:
+                    batch.set(doc_ref, data, merge=True)
+            with span("firestore", "store.commit", writes=len(chunk)):
+                await batch.commit()
+        for path in new:
+            self._known_namespaces.set(path, True)
+
+    def batch(self, ops: Sequence[Op]) -> List[Any]:
+        results, gets, queries, writes = self._plan(ops)
+
+        # All GetOps in one round trip
+        if gets:
+            refs = [self.collection.document(doc_id) for _, doc_id in gets]
+            with span("firestore", "store.get", keys=len(refs)):
+                docs = {doc.id: doc for doc in self.db.get_all(refs)}
+            for idx, doc_id in gets:
+                doc = docs.get(doc_id)
+                results[idx] = self._to_item(doc.to_dict()) if doc is not None and doc.exists else None
+
+        if queries:
+            if self.write_buffer:
+                # Searches go straight to Firestore, so buffered writes must land first
+                self.write_buffer.flush()
+            for idx, op in queries:
+                if isinstance(op, ListNamespacesOp):
+                    results[idx] = self._list_namespaces(op)
+                elif op.query and self.vector_index is not None:
+                    results[idx] = self._semantic_search(op)
+                else:
+                    with span("firestore", "store.search"):
+                        results[idx] = self._structured_search(op)
+
+        # Commit writes (only when there are any)
+        if writes:
+            if self.write_buffer:
+                self.write_buffer.add(writes)
+            else:
+                self._commit_writes(writes)
+            self._index_writes(writes)
         return results
 
     async def abatch(self, ops: Sequence[Op]) -> List[Any]:
-        return self.batch(ops)
+        """Native async version of `batch` using the async Firestore client."""
+        results, gets, queries, writes = self._plan(ops)
+
+        if gets:
+            refs = [self.async_collection.document(doc_id) for _, doc_id in gets]
+            with span("firestore", "store.get", keys=len(refs)):
+                docs = {doc.id: doc async for doc in self.async_db.get_all(refs)}
+            for idx, doc_id in gets:
+                doc = docs.get(doc_id)
+                results[idx] = self._to_item(doc.to_dict()) if doc is not None and doc.exists else None
+
+        if queries:
+            if self.write_buffer:
+                await asyncio.to_thread(self.write_buffer.flush)
+
+            async def run(idx: int, op: Op):
+                if isinstance(op, ListNamespacesOp):
+                    # Rare (admin tooling); the sync pager on a thread is fine
+                    results[idx] = await asyncio.to_thread(self._list_namespaces, op)
+                elif op.query and self.vector_index is not None:
+                    # Index loads and NumPy ranking are blocking work; keep them off the loop
+                    results[idx] = await asyncio.to_thread(self._semantic_search, op)
+                else:
+                    with span("firestore", "store.search"):
+                        results[idx] = await self._astructured_search(op)
+
+            await asyncio.gather(*(run(idx, op) for idx, op in queries))
+
+        if writes:
+            if self.write_buffer:
+                self.write_buffer.add(writes)
+            else:
+                await self._acommit_writes(writes)
+            self._index_writes(writes)
+        return results
+
+
+if __name__ == "__main__":
+    import argparse
 
-# Need to import firestore for SERVER_TIMESTAMP
-from firebase_admin import firestore
+    # Maintenance for the memory store (see README, "Namespace Listing & Paged Search")
+    parser = argparse.ArgumentParser(description="Memory store maintenance")
+    parser.add_argument("command", choices=["backfill-namespaces", "prune-namespaces"])
+    parser.add_argument("--collection", default="memory")
+    args = parser.parse_args()
+    store = FirestoreStore(args.collection, write_behind_seconds=0, vector_index=False)
+    if args.command == "backfill-namespaces":
+        print(f"Added namespace paths to {store.backfill_namespaces()} documents")
+    else:
+        print(f"Pruned {store.prune_namespaces()} namespace entries")
@@ -0,0 +1,94 @@
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Tuple
+from langgraph.store.base import PutOp
+from ..core.cache import InMemoryBackend
+from ..config import SUMMARY_WRITE_DELAY_SECONDS, SUMMARY_HASH_MAX_ENTRIES
+from .write_behind import WriteBehindBuffer
+
+NAMESPACE = ("users",)
+
+
+def _digest(summary: str) -> str:
+    return hashlib.sha256(summary.encode("utf-8")).hexdigest()
+
+
+class SummaryWriter:
+    """
+    Persists each user's rolling summary to the store, off the request path.
+
+    - Dirty check: a content hash of the last summary saved (or loaded) per user;
+      an unchanged summary (the orchestrator returns it on every pass) is skipped.
+    - Coalescing: changed summaries wait in a write-behind buffer for `delay`
+      seconds, so several changes in one turn cost one write, and one flush
+      sends every waiting user in one batch.
+    - Durability: `close()` flushes what is waiting; it runs on server shutdown
+      and at interpreter exit.
+    """
+
+    def __init__(self, store: Callable[[], Any], delay: float = SUMMARY_WRITE_DELAY_SECONDS,
+                 max_users: int = SUMMARY_HASH_MAX_ENTRIES):
+        self._store = store  # resolved at flush time, so building this doesn't build the store
+        self._hashes = InMemoryBackend(max_users)
+        self._lock = threading.Lock()
+        self.buffer = WriteBehindBuffer(self._write, delay) if delay > 0 else None
+        self.saves = 0
+        self.unchanged = 0
+        self.failed = 0
+
+    def mark_clean(self, user_id: str, summary: str) -> None:
+        """Records a summary known to be stored already (e.g. just loaded)."""
+        self._hashes.set(user_id, _digest(summary))
+
+    def save(self, user_id: str, summary: str) -> bool:
+        """Queues the summary unless it is what the store already has. Returns whether it was queued."""
+        digest = _digest(summary)
+        with self._lock:
+            self.saves += 1
+            if self._hashes.get(user_id) == digest:
+                self.unchanged += 1
+                return False
+            self._hashes.set(user_id, digest)
+        if self.buffer is not None:
+            self.buffer.add({user_id: summary})
+        else:
+            self._write({user_id: summary})
+        return True
+
+    def pending(self, user_id: str) -> Tuple[bool, Any]:
+        """(True, summary) if the user's latest summary is not written yet (read-your-writes)."""
+        return self.buffer.get(user_id) if self.buffer is not None else (False, None)
+
+    def _write(self, summaries: Dict[str, str]) -> None:
+        try:
+            self._store().batch([
+                PutOp(namespace=NAMESPACE, key=user_id, value={"summary": summary})
+                for user_id, summary in summaries.items()
+            ])
+        except Exception:
+            # Forget the hashes so the next save retries even if the summary is unchanged
+            with self._lock:
+                self.failed += len(summaries)
+                for user_id in summaries:
+                    self._hashes.delete(user_id)
+            raise
+
+    def flush(self) -> None:
+        if self.buffer is not None:
+            self.buffer.flush()
+
+    def close(self) -> None:
+        if self.buffer is not None:
+            self.buffer.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        coalesced = self.buffer.coalesced if self.buffer is not None else 0
+        written = self.buffer.writes_flushed if self.buffer is not None else self.saves - self.unchanged - self.failed
+        return {
+            "saves": self.saves,
+            "unchanged": self.unchanged,
+            "coalesced": coalesced,
+            "written": written,
+            "avoided": self.unchanged + coalesced,
+            "failed": self.failed,
+        }
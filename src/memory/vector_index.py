@@ -0,0 +1,309 @@
+import atexit
+import hashlib
+import importlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from langgraph.store.base import Item, SearchItem
+from ..config import STORE_EMBEDDING_FUNCTION, STORE_EMBEDDING_DIM, STORE_VECTOR_SNAPSHOT_DIR
+
+# texts -> (len(texts), dim) float32, rows L2-normalized
+EmbedFn = Callable[[Sequence[str]], np.ndarray]
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def hash_embed(texts: Sequence[str], dim: int = 256) -> np.ndarray:
+    """
+    Local embedding without a model: words and word pairs hashed into `dim`
+    signed buckets (the hashing trick), then normalized. Catches shared
+    vocabulary ("emerald green" ~ "green"), not synonyms; plug in a real
+    model through STORE_EMBEDDING_FUNCTION for that.
+    crc32 rather than hash(), which is salted per process and would break snapshots.
+    """
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = _TOKEN.findall(text.lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = zlib.crc32(feature.encode("utf-8"))
+            out[row, h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    return out / np.where(norms == 0, 1, norms)
+
+
+def load_embed_fn(spec: str, dim: int) -> EmbedFn:
+    """"hash" for the built-in one, else "package.module:function" taking a list of texts."""
+    if not spec:
+        raise ValueError("The store's vector index needs STORE_EMBEDDING_FUNCTION "
+                         "(\"package.module:function\", or \"hash\" for lexical-only ranking)")
+    if spec == "hash":
+        return lambda texts: hash_embed(texts, dim)
+    module, _, attr = spec.partition(":")
+    fn = getattr(importlib.import_module(module), attr)
+
+    def embed(texts: Sequence[str]) -> np.ndarray:
+        vectors = np.asarray(fn(list(texts)), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    return embed
+
+
+def value_text(value: Dict[str, Any], fields: Optional[Sequence[str]]) -> str:
+    """The text embedded for a stored value: the given fields, or all of it for "$"."""
+    if not fields or "$" in fields:
+        parts = [value]
+    else:
+        parts = [value.get(f) for f in fields if value.get(f) is not None]
+    return "\n".join(p if isinstance(p, str) else json.dumps(p, default=str, sort_keys=True) for p in parts)
+
+
+_OPERATORS = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+}
+
+
+def matches_filter(value: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+    """SearchOp filter: {"field": v} for equality, or {"field": {"$gt": v, ...}}."""
+    for field, cond in (filter or {}).items():
+        actual = value.get(field)
+        if isinstance(cond, dict) and cond and all(k in _OPERATORS for k in cond):
+            if not all(_OPERATORS[op](actual, expected) for op, expected in cond.items()):
+                return False
+        elif actual != cond:
+            return False
+    return True
+
+
+class NamespaceIndex:
+    """Vectors of one namespace in a growable matrix, plus the items they came from."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.size = 0
+        self.keys: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.items: List[Item] = []
+        # Newest updated_at read from the store (epoch seconds); newer writes are fetched on refresh
+        self.synced_at = 0.0
+        self.checked_at = 0.0
+        self.dirty = False  # changed since the last snapshot
+
+    def upsert(self, item: Item, vector: np.ndarray) -> None:
+        row = self.rows.get(item.key)
+        if row is None:
+            if self.size == len(self.vectors):
+                grown = np.zeros((max(64, 2 * self.size), self.dim), dtype=np.float32)
+                grown[:self.size] = self.vectors[:self.size]
+                self.vectors = grown
+            row = self.size
+            self.size += 1
+            self.rows[item.key] = row
+            self.keys.append(item.key)
+            self.items.append(item)
+        else:
+            self.items[row] = item
+        self.vectors[row] = vector
+        self.dirty = True
+
+    def remove(self, key: str) -> None:
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        # Move the last row into the hole so the matrix stays dense
+        last = self.size - 1
+        if row != last:
+            self.vectors[row] = self.vectors[last]
+            self.keys[row] = self.keys[last]
+            self.items[row] = self.items[last]
+            self.rows[self.keys[row]] = row
+        self.keys.pop()
+        self.items.pop()
+        self.size -= 1
+        self.dirty = True
+
+    def search(self, query: np.ndarray, filter: Optional[Dict[str, Any]], limit: int,
+               offset: int) -> List[Tuple[int, float]]:
+        """(row, cosine score) of the best matches passing `filter`, after skipping `offset`."""
+        wanted = limit + offset
+        if self.size == 0 or wanted <= 0:
+            return []
+        scores = self.vectors[:self.size] @ query
+        # Take candidates in growing windows, so a filter only looks at the best ones
+        window = wanted if not filter else 4 * wanted
+        while True:
+            window = min(window, self.size)
+            top = np.argpartition(-scores, window - 1)[:window]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            hits = [int(r) for r in top if not filter or matches_filter(self.items[r].value, filter)]
+            if len(hits) >= wanted or window == self.size:
+                return [(r, float(scores[r])) for r in hits[offset:wanted]]
+            window *= 4
+
+
+def _epoch(ts: Any) -> float:
+    return ts.timestamp() if hasattr(ts, "timestamp") else float(ts)
+
+
+class VectorIndex:
+    """
+    Per-namespace vector indexes for semantic SearchOp (top-k cosine similarity).
+    Lives in memory; `save()` writes one .npz snapshot per namespace so a restart
+    only has to catch up on newer documents instead of re-embedding everything.
+    """
+
+    def __init__(self, embed_fn: EmbedFn, dim: int, embedder: str = "hash",
+                 snapshot_dir: Optional[Path] = None):
+        self.embed_fn = embed_fn
+        self.dim = dim
+        self.embedder = embedder  # snapshots from another embedder aren't reused
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else None
+        self.namespaces: Dict[Tuple[str, ...], NamespaceIndex] = {}
+        self._lock = threading.RLock()
+        self.embedded = 0
+
+    @classmethod
+    def from_config(cls) -> "VectorIndex":
+        """The store's index per STORE_EMBEDDING_* / STORE_VECTOR_SNAPSHOT_DIR."""
+        index = cls(load_embed_fn(STORE_EMBEDDING_FUNCTION, STORE_EMBEDDING_DIM), STORE_EMBEDDING_DIM,
+                    STORE_EMBEDDING_FUNCTION, STORE_VECTOR_SNAPSHOT_DIR)
+        # Snapshot what changed since the last one when the process exits
+        atexit.register(index.save)
+        return index
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        self.embedded += len(texts)
+        return self.embed_fn(texts)
+
+    def get(self, namespace: Tuple[str, ...]) -> Optional[NamespaceIndex]:
+        return self.namespaces.get(namespace)
+
+    def build(self, namespace: Tuple[str, ...], items: Iterable[Tuple[Item, Optional[str]]],
+              base: Optional[NamespaceIndex] = None) -> NamespaceIndex:
+        """Indexes (item, text) pairs; text None means not indexed (dropped if present)."""
+        index = base or NamespaceIndex(self.dim)
+        items = list(items)
+        texts = [(item, text) for item, text in items if text is not None]
+        vectors = self.embed([text for _, text in texts]) if texts else None
+        with self._lock:
+            for item, text in items:
+                if text is None:
+                    index.remove(item.key)
+            for i, (item, _) in enumerate(texts):
+                index.upsert(item, vectors[i])
+            # Only store timestamps move the sync point; local clocks may run ahead
+            for item, _ in items:
+                if item.updated_at is not None:
+                    index.synced_at = max(index.synced_at, _epoch(item.updated_at))
+            index.checked_at = time.time()
+            self.namespaces[namespace] = index
+        return index
+
+    def apply(self, namespace: Tuple[str, ...], key: str, item: Optional[Item],
+              vector: Optional[np.ndarray]) -> None:
+        """Mirrors one committed put/delete into a loaded namespace (others are built on demand)."""
+        with self._lock:
+            index = self.namespaces.get(namespace)
+            if index is None:
+                return
+            if item is None or vector is None:
+                index.remove(key)
+            else:
+                index.upsert(item, vector)
+
+    def search(self, namespace: Tuple[str, ...], query: str, filter: Optional[Dict[str, Any]] = None,
+               limit: int = 10, offset: int = 0) -> List[SearchItem]:
+        query_vector = self.embed([query])[0]
+        with self._lock:
+            index = self.namespaces.get(namespace)
+            if index is None:
+                return []
+            hits = index.search(query_vector, filter, limit, offset)
+            found = [(index.items[row], score) for row, score in hits]
+        return [
+            SearchItem(namespace=item.namespace, key=item.key, value=item.value,
+                       created_at=item.created_at, updated_at=item.updated_at, score=score)
+            for item, score in found
+        ]
+
+    # -- snapshots --
+
+    def _snapshot_path(self, namespace: Tuple[str, ...]) -> Path:
+        name = hashlib.sha1("\x1f".join(namespace).encode("utf-8")).hexdigest()[:16]
+        return self.snapshot_dir / f"{name}.npz"
+
+    def save(self, namespace: Optional[Tuple[str, ...]] = None) -> None:
+        """Writes the snapshot of one namespace (default: every changed one), atomically."""
+        if self.snapshot_dir is None:
+            return
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            targets = [namespace] if namespace is not None else list(self.namespaces)
+            copies = []
+            for ns in targets:
+                index = self.namespaces.get(ns)
+                if index is None or (namespace is None and not index.dirty):
+                    continue
+                index.dirty = False
+                meta = {
+                    "namespace": list(ns),
+                    "embedder": self.embedder,
+                    "dim": self.dim,
+                    "synced_at": index.synced_at,
+                    "items": [
+                        {"key": i.key, "value": i.value, "created_at": _epoch(i.created_at) if i.created_at else None,
+                         "updated_at": _epoch(i.updated_at) if i.updated_at else None}
+                        for i in index.items
+                    ],
+                }
+                copies.append((ns, index.vectors[:index.size].copy(), meta))
+        for ns, vectors, meta in copies:
+            path = self._snapshot_path(ns)
+            tmp = path.with_suffix(".tmp.npz")
+            blob = np.frombuffer(json.dumps(meta, default=str).encode("utf-8"), dtype=np.uint8)
+            np.savez(tmp, vectors=vectors, meta=blob)
+            os.replace(tmp, path)
+
+    def load(self, namespace: Tuple[str, ...]) -> Optional[NamespaceIndex]:
+        """Index from the namespace's snapshot, if there is a compatible one."""
+        if self.snapshot_dir is None:
+            return None
+        path = self._snapshot_path(namespace)
+        if not path.exists():
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                vectors = data["vectors"]
+                meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+        except Exception as e:
+            print(f"Error loading vector snapshot {path}: {e}")
+            return None
+        if meta["embedder"] != self.embedder or meta["dim"] != self.dim or tuple(meta["namespace"]) != namespace:
+            return None
+        from datetime import datetime, timezone
+
+        def ts(value):
+            return datetime.fromtimestamp(value, timezone.utc) if value is not None else None
+
+        index = NamespaceIndex(self.dim)
+        for row, entry in enumerate(meta["items"]):
+            index.upsert(
+                Item(value=entry["value"], key=entry["key"], namespace=namespace,
+                     created_at=ts(entry["created_at"]), updated_at=ts(entry["updated_at"])),
+                vectors[row],
+            )
+        index.synced_at = meta["synced_at"]
+        index.dirty = False
+        return index
@@ -0,0 +1,73 @@
+import atexit
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+
+class WriteBehindBuffer:
+    """
+    Collects writes keyed by document id and flushes them after a short window.
+    Repeated writes to the same key inside the window coalesce (last write wins),
+    so a hot key costs one commit per window instead of one per put.
+    Pending writes are flushed on `close()`, which also runs at interpreter exit.
+    """
+
+    def __init__(self, flush_fn: Callable[[Dict[str, Any]], None], window_seconds: float):
+        self.flush_fn = flush_fn
+        self.window_seconds = window_seconds
+        self._pending: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self.writes_received = 0
+        self.writes_flushed = 0
+        atexit.register(self.close)
+
+    def add(self, entries: Dict[str, Any]) -> None:
+        if not entries:
+            return
+        with self._lock:
+            self._pending.update(entries)
+            self.writes_received += len(entries)
+            if self._timer is None:
+                self._timer = threading.Timer(self.window_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """(True, value) if `key` has a write that is not flushed yet."""
+        with self._lock:
+            if key in self._pending:
+                return True, self._pending[key]
+        return False, None
+
+    def flush(self) -> None:
+        # One flush at a time keeps commits for the same key in order
+        with self._flush_lock:
+            with self._lock:
+                entries, self._pending = self._pending, {}
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not entries:
+                return
+            try:
+                self.flush_fn(entries)
+                self.writes_flushed += len(entries)
+            except Exception as e:
+                print(f"Error flushing buffered writes: {e}")
+                with self._lock:
+                    # Put them back unless a newer write replaced them meanwhile
+                    for key, value in entries.items():
+                        self._pending.setdefault(key, value)
+                raise
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+    @property
+    def coalesced(self) -> int:
+        """Writes that never needed their own commit."""
+        return self.writes_received - self.writes_flushed - len(self._pending)
@@ -0,0 +1,160 @@
+"""
+Structured OOTD context: the items, colors, formality, season and dress-up/down
+variants of an outfit, derived once from its Firestore document instead of by the
+LLM on every turn.
+
+The record is stored on the outfit document (`ootd_context`) with the derivation
+version and a hash of the fields it was derived from, so it is recomputed only
+when either changes:
+
+    python -m src.repositories.ootd_context            # outfits missing a current record
+    python -m src.repositories.ootd_context --force    # every outfit
+"""
+import argparse
+import hashlib
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+# Bump when the derivation below changes: stored records of older versions are
+# recomputed by the next precompute run (and derived on read until then)
+OOTD_CONTEXT_VERSION = 1
+CONTEXT_FIELD = "ootd_context"
+
+# Outfit document fields a record is derived from
+SOURCE_FIELDS = ("patterns", "items", "description", "dress_it_up", "dress_it_down")
+
+# Color words by undertone, after the Color agent's prompt (earth tones are warm)
+WARM_COLORS = {
+    "olive", "rust", "terracotta", "sage", "camel", "burnt orange", "brown", "tan", "mustard",
+    "coral", "orange", "red", "burgundy", "cream", "ivory", "gold", "khaki", "cognac", "peach",
+}
+COOL_COLORS = {
+    "navy", "blue", "gray", "grey", "charcoal", "silver", "emerald", "teal", "purple", "lavender",
+    "plum", "pink", "mint", "icy blue", "cobalt", "white",
+}
+NEUTRAL_COLORS = {"black", "beige", "taupe", "denim", "nude", "stone"}
+# Longest first, so "burnt orange" wins over "orange"
+_COLOR_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted(map(re.escape, WARM_COLORS | COOL_COLORS | NEUTRAL_COLORS), key=len, reverse=True)) + r")\b"
+)
+
+# The Occasion agent's formality levels, least to most formal, and the garments
+# that point at each of them
+FORMALITY_SCALE = [
+    "casual_relaxed",
+    "casual_office",
+    "elevated_casual",
+    "business_casual_jeans_ok",
+    "business_casual_no_jeans",
+    "business_formal",
+    "formal_event",
+]
+_FORMALITY_HINTS = {
+    "hoodie": 0, "sweatshirt": 0, "leggings": 0, "joggers": 0, "shorts": 0, "t-shirt": 0, "tee": 0,
+    "sneakers": 1, "jeans": 1, "denim": 1, "cardigan": 1, "sweater": 1,
+    "ankle boots": 2, "boots": 2, "midi": 2, "silk": 2, "knit": 2, "heels": 2,
+    "blouse": 4, "trousers": 4, "dress pants": 4, "khakis": 4, "loafers": 4, "blazer": 4, "button-down": 4,
+    "suit": 5, "pantsuit": 5, "pencil skirt": 5, "pumps": 5,
+    "gown": 6, "tuxedo": 6, "sequin": 6, "cocktail dress": 6,
+}
+_FORMALITY_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted(map(re.escape, _FORMALITY_HINTS), key=len, reverse=True)) + r")s?\b"
+)
+
+
+def _flatten(value: Any) -> str:
+    if isinstance(value, dict):
+        return "; ".join(f"{k}: {_flatten(v)}" for k, v in value.items() if v)
+    if isinstance(value, (list, tuple)):
+        return ", ".join(_flatten(v) for v in value if v)
+    return str(value).strip() if value else ""
+
+
+def source_hash(data: Dict[str, Any]) -> str:
+    """Hash of the document fields a record is derived from."""
+    source = {field: data.get(field) for field in SOURCE_FIELDS}
+    return hashlib.sha1(json.dumps(source, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def _items(data: Dict[str, Any], patterns: Dict[str, Any]) -> List[str]:
+    # "Cream blouse + Olive pants + Tan blazer + Loafers", a list, or a description
+    raw = data.get("items") or patterns.get("items") or data.get("description") or ""
+    parts = raw if isinstance(raw, list) else re.split(r"\s*(?:\+|,|;|\n)\s*", _flatten(raw))
+    return [_flatten(p) for p in parts if _flatten(p)]
+
+
+def _colors(texts: List[str], limit: int = 4) -> List[str]:
+    found: List[str] = []
+    for text in texts:
+        for color in _COLOR_PATTERN.findall(text.lower()):
+            color = "gray" if color == "grey" else color
+            if color not in found:
+                found.append(color)
+    return found[:limit]
+
+
+def _undertone(colors: List[str]) -> Optional[str]:
+    warm = sum(c in WARM_COLORS for c in colors)
+    cool = sum(c in COOL_COLORS for c in colors)
+    if not warm and not cool:
+        return "neutral" if colors else None
+    if warm and cool:
+        return "mixed"
+    return "warm" if warm else "cool"
+
+
+def _formality(texts: List[str]) -> Optional[str]:
+    hints = [h for text in texts for h in _FORMALITY_PATTERN.findall(text.lower())]
+    if not hints:
+        return None
+    scores = [_FORMALITY_HINTS[h] for h in hints]
+    level = int(sum(scores) / len(scores) + 0.5)
+    if max(scores) >= 4 and ("jeans" in hints or "denim" in hints):
+        # Polished pieces worn with denim
+        level = FORMALITY_SCALE.index("business_casual_jeans_ok")
+    return FORMALITY_SCALE[level]
+
+
+def build_context(data: Dict[str, Any]) -> Dict[str, Any]:
+    """The structured record for one outfit document."""
+    patterns = data.get("patterns") if isinstance(data.get("patterns"), dict) else {}
+    formula = patterns.get("title") or (", ".join(data["patterns"]) if isinstance(data.get("patterns"), list) else None)
+    items = _items(data, patterns)
+    texts = items or [formula or ""]
+    colors = _colors(texts)
+    return {
+        "version": OOTD_CONTEXT_VERSION,
+        "source_hash": source_hash(data),
+        "formula": formula or "Unknown",
+        "items": items,
+        "colors": colors,
+        "undertone": _undertone(colors),
+        "formality": _formality(texts),
+        "season": patterns.get("season") or None,
+        "dress_it_up": _flatten(data.get("dress_it_up")) or None,
+        "dress_it_down": _flatten(data.get("dress_it_down")) or None,
+        "computed_at": time.time(),
+    }
+
+
+def is_current(record: Optional[Dict[str, Any]], data: Dict[str, Any]) -> bool:
+    """Whether a stored record was derived by this version from the document as it is now."""
+    return bool(record) and record.get("version") == OOTD_CONTEXT_VERSION \
+        and record.get("source_hash") == source_hash(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--force", action="store_true", help="Recompute records that are already current")
+    parser.add_argument("--dry-run", action="store_true", help="Derive and count, but don't write")
+    args = parser.parse_args()
+
+    from .outfit_repository import OutfitRepository
+
+    print(json.dumps(OutfitRepository().precompute_contexts(force=args.force, dry_run=args.dry_run), indent=2))
+
+
+if __name__ == "__main__":
+    main()
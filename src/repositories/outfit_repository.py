@@ -1,21 +1,60 @@
-from firebase_admin import firestore
-from ..core.firebase import db
-from google.cloud.firestore_v1 import FieldFilter
+from ..core.firebase import get_db
+from ..core.cache import CacheStats, InMemoryBackend, SingleFlight
+from ..core.tracing import span
+from ..config import (
+    OUTFIT_CACHE_TTL_SECONDS,
+    OUTFIT_CACHE_NEGATIVE_TTL_SECONDS,
+    OUTFIT_CACHE_MAX_ENTRIES,
+    OOTD_CONTEXT_PAGE_SIZE,
+    OOTD_CONTEXT_BATCH_SIZE,
+)
+from .ootd_context import CONTEXT_FIELD, build_context, is_current
 import datetime
 from typing import Optional, Dict, Any
 
+# The OOTD for a date is the same for every user, so one cache serves the whole process.
+# Entries are wrapped as {"outfit": ...} so a cached "no outfit" (None) is
+# distinguishable from a cache miss.
+_outfit_cache = InMemoryBackend(OUTFIT_CACHE_MAX_ENTRIES, OUTFIT_CACHE_TTL_SECONDS)
+_outfit_stats = CacheStats()
+_outfit_flights = SingleFlight()
+# Outfits served with their precomputed context vs. derived at read time (not precomputed yet / stale)
+_context_stats = {"stored": 0, "derived_on_read": 0}
+
 class OutfitRepository:
     def __init__(self):
-        self.collection = db.collection('outfits')
+        self.collection = get_db().collection('outfits')
 
     def get_outfit_by_date(self, date: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Fetches the outfit for a specific date.
         If no date is provided, defaults to today.
+        Read-through cached per date; concurrent misses share one Firestore query.
         """
         if not date:
             date = datetime.date.today().strftime("%Y-%m-%d")
-        
+
+        with span("firestore", "outfits.get", date=date) as lookup:
+            entry = _outfit_cache.get(date)
+            _outfit_stats.record(entry is not None)
+            lookup.attrs["cache"] = "hit" if entry is not None else "miss"
+            if entry is None:
+                entry = _outfit_flights.do(date, lambda: self._load(date))
+        outfit = entry["outfit"]
+        # Callers get their own copy so the shared entry can't be mutated
+        return dict(outfit) if outfit is not None else None
+
+    def _load(self, date: str) -> Dict[str, Any]:
+        outfit = self._query_outfit(date)
+        # Missing dates are cached for a shorter time so a newly published OOTD shows up soon
+        ttl = OUTFIT_CACHE_TTL_SECONDS if outfit is not None else OUTFIT_CACHE_NEGATIVE_TTL_SECONDS
+        entry = {"outfit": outfit}
+        _outfit_cache.set(date, entry, ttl=ttl)
+        return entry
+
+    def _query_outfit(self, date: str) -> Optional[Dict[str, Any]]:
+        from google.cloud.firestore_v1 import FieldFilter  # Firestore SDK loads on first query
+
         # Create filter
         field_filter = FieldFilter('date', '==', date)
         
@@ -38,6 +77,13 @@ class OutfitRepository:
                 # Fallback if it is a list
                 description = ", ".join(patterns)
             
+            context = data.get(CONTEXT_FIELD)
+            if is_current(context, data):
+                _context_stats["stored"] += 1
+            else:
+                context = build_context(data)
+                _context_stats["derived_on_read"] += 1
+
             return {
                 "id": doc.id,
                 "formula": description, # Mapping title to formula/description
@@ -46,7 +92,72 @@ class OutfitRepository:
                 "dress_it_up": data.get('dress_it_up'),
                 "dress_it_down": data.get('dress_it_down'),
                 "season": season,
-                "date": data.get('date')
+                "date": data.get('date'),
+                "context": context,
             }
             
         return None
+
+    def precompute_contexts(self, force: bool = False, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Batch job: stores the structured context (see ootd_context) on every outfit
+        that lacks a current one. Pages through the collection by date and writes in
+        batches, so a run over the whole archive is a handful of round trips.
+        """
+        db = get_db()
+        counts = {"scanned": 0, "written": 0, "up_to_date": 0, "batches": 0}
+        pending = []
+
+        def flush():
+            if pending and not dry_run:
+                batch = db.batch()
+                for ref, context in pending:
+                    batch.set(ref, {CONTEXT_FIELD: context}, merge=True)
+                with span("firestore", "outfits.context_batch", size=len(pending)):
+                    batch.commit()
+                counts["batches"] += 1
+            counts["written"] += len(pending)
+            pending.clear()
+
+        # Document id breaks ties between outfits sharing a date, and the cursor is the last
+        # snapshot itself, so a page boundary inside one date doesn't skip any of them
+        query, after = self.collection.order_by("date").order_by("__name__"), None
+        while True:
+            page = query.start_after(after) if after is not None else query
+            with span("firestore", "outfits.page", size=OOTD_CONTEXT_PAGE_SIZE):
+                docs = list(page.limit(OOTD_CONTEXT_PAGE_SIZE).stream())
+            for doc in docs:
+                data = doc.to_dict()
+                counts["scanned"] += 1
+                if not force and is_current(data.get(CONTEXT_FIELD), data):
+                    counts["up_to_date"] += 1
+                    continue
+                pending.append((self.collection.document(doc.id), build_context(data)))
+                if len(pending) >= OOTD_CONTEXT_BATCH_SIZE:
+                    flush()
+            if len(docs) < OOTD_CONTEXT_PAGE_SIZE:
+                break
+            after = docs[-1]
+        flush()
+        if counts["written"] and not dry_run:
+            # Cached OOTDs carry contexts derived on read; the next lookup picks up the stored ones
+            self.invalidate()
+        return counts
+
+    @staticmethod
+    def cache_metrics() -> Dict[str, Any]:
+        """Hit/miss counters for the shared OOTD cache."""
+        return {
+            **_outfit_stats.as_dict(),
+            "collapsed": _outfit_flights.collapsed,
+            "entries": len(_outfit_cache),
+            "context": dict(_context_stats),
+        }
+
+    @staticmethod
+    def invalidate(date: Optional[str] = None) -> None:
+        """Drops one date (or everything) from the shared OOTD cache."""
+        if date:
+            _outfit_cache.delete(date)
+        else:
+            _outfit_cache.clear()
@@ -0,0 +1,317 @@
+"""
+Headless HTTP service around the stylist graph.
+
+    uvicorn src.server:app --host 0.0.0.0 --port 8000
+
+POST /sessions/{session_id}/chat   {"message": ..., "user_id": ..., "city": ..., "date": ...}
+    Streams the answer as server-sent events (token..., then done), or returns
+    the done payload as JSON with ?stream=false. Unknown or expired session ids
+    are resumed from the graph's checkpoint, or created from the user's stored summary.
+GET  /sessions/{session_id}        transcript, summary and context of a session
+GET  /healthz                      load and session counts
+GET  /metrics                      Prometheus text (when that trace exporter is on)
+"""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from .core.cache import InMemoryBackend
+from .core.registry import registry
+from .core.tracing import PrometheusExporter, get_tracer
+from .memory.checkpointer import SQLiteCheckpointSaver
+from .session import ChatSession
+from .config import (
+    SERVER_MAX_CONCURRENT_TURNS,
+    SERVER_MAX_QUEUED_TURNS,
+    SERVER_RETRY_AFTER_SECONDS,
+    SERVER_SESSION_TTL_SECONDS,
+    SERVER_MAX_SESSIONS,
+    SERVER_WARM_UP,
+    CHECKPOINT_MAINTENANCE_INTERVAL_SECONDS,
+)
+
+
+class Saturated(Exception):
+    """The worker has no free turn slot and its wait queue is full."""
+
+
+class TurnLimiter:
+    """
+    Bounds graph runs per worker: up to `max_concurrent` at once, up to
+    `max_queued` waiting. Beyond that callers are turned away (backpressure)
+    so latency stays bounded and a load balancer can retry elsewhere.
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.served = 0
+        self.rejected = 0
+
+    def saturated(self) -> bool:
+        return self._semaphore.locked() and self.waiting >= self.max_queued
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self.saturated():
+            self.rejected += 1
+            raise Saturated()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.served += 1
+            self._semaphore.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "active": self.active,
+            "waiting": self.waiting,
+            "served": self.served,
+            "rejected": self.rejected,
+        }
+
+
+class SessionManager:
+    """
+    Live sessions of this worker, dropped after SERVER_SESSION_TTL_SECONDS idle.
+    Concurrent first requests for one id share a single load. With a
+    checkpointing graph an unknown id resumes from its checkpoint, so a session
+    can continue on another worker or after a restart.
+    """
+
+    def __init__(self, get_graph_app: Optional[Callable[[], Any]] = None, max_sessions: int = SERVER_MAX_SESSIONS,
+                 ttl: float = SERVER_SESSION_TTL_SECONDS):
+        # A getter: the graph (and its checkpointer) is built on the first session, not on import
+        self.get_graph_app = get_graph_app
+        self.sessions = InMemoryBackend(max_sessions, ttl)
+        self._loading: Dict[str, asyncio.Task] = {}
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        return self.sessions.get(session_id)
+
+    def touch(self, session: ChatSession) -> None:
+        # Re-setting restarts the idle timer
+        self.sessions.set(session.session_id, session)
+
+    async def get_or_create(self, session_id: str, user_id: str, city: Optional[str],
+                            ootd_date: Optional[str]) -> ChatSession:
+        session = self.sessions.get(session_id)
+        if session is None:
+            task = self._loading.get(session_id)
+            if task is None:
+                task = asyncio.ensure_future(self._load(session_id, user_id, city, ootd_date))
+                self._loading[session_id] = task
+            session = await asyncio.shield(task)
+        return session
+
+    async def _load(self, session_id: str, user_id: str, city: Optional[str], ootd_date: Optional[str]) -> ChatSession:
+        try:
+            graph_app = self.get_graph_app() if self.get_graph_app is not None else None
+            session = await asyncio.to_thread(ChatSession.load, session_id, user_id, city, ootd_date, graph_app)
+            self.sessions.set(session_id, session)
+            return session
+        finally:
+            self._loading.pop(session_id, None)
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _done_payload(session: ChatSession, first_new: int) -> Dict[str, Any]:
+    new_messages = session.to_dict()["messages"][first_new:]
+    answers = [m["content"] for m in new_messages if m["type"] == "ai"]
+    return {
+        "answer": answers[-1] if answers else "",
+        "messages": new_messages,
+        "route": session.last_route,
+        "summary": session.summary,
+        "summary_watermark": session.summary_watermark,
+        "trace": session.last_trace,
+    }
+
+
+def _busy(message: str, status_code: int = 503) -> JSONResponse:
+    return JSONResponse(
+        {"error": message, "retry_after": SERVER_RETRY_AFTER_SECONDS},
+        status_code=status_code,
+        headers={"Retry-After": str(SERVER_RETRY_AFTER_SECONDS)},
+    )
+
+
+def create_app(
+    max_concurrent: int = SERVER_MAX_CONCURRENT_TURNS,
+    max_queued: int = SERVER_MAX_QUEUED_TURNS,
+    warm_up: bool = SERVER_WARM_UP,
+) -> Starlette:
+    from .graph import get_app as get_graph_app, answer_cache_metrics, maintain_checkpoints, warm_up as warm_up_graph
+
+    limiter = TurnLimiter(max_concurrent, max_queued)
+    sessions = SessionManager(get_graph_app)
+
+    async def run_turn(session: ChatSession, text: str, city: Optional[str],
+                       ootd_date: Optional[str]) -> AsyncIterator[Tuple[str, Any]]:
+        """Yields ("token", text) as the answer streams, then ("done", payload)."""
+        # One turn per session at a time (a second message waits for the first),
+        # then a worker-wide slot for the graph run itself
+        session.pending += 1
+        try:
+            await session.lock.acquire()
+        finally:
+            session.pending -= 1
+        try:
+            if city or ootd_date:
+                await asyncio.to_thread(session.set_context, city, ootd_date)
+            first_new = len(session.messages)
+            async with limiter.slot():
+                async for delta in session.astream(get_graph_app(), text):
+                    yield "token", delta
+            sessions.touch(session)
+            yield "done", _done_payload(session, first_new)
+        finally:
+            session.lock.release()
+
+    async def chat(request: Request) -> Response:
+        session_id = request.path_params["session_id"]
+        try:
+            body = await request.json()
+        except ValueError:
+            return JSONResponse({"error": "Body must be JSON"}, status_code=400)
+        text = (body.get("message") or "").strip()
+        if not text:
+            return JSONResponse({"error": "'message' is required"}, status_code=400)
+        # Shed load before doing any work for this request
+        if limiter.saturated():
+            limiter.rejected += 1
+            return _busy("Server busy, retry later")
+
+        user_id = body.get("user_id") or "default_user"
+        session = await sessions.get_or_create(session_id, user_id, body.get("city"), body.get("date"))
+        if session.user_id != user_id:
+            return JSONResponse({"error": "Session belongs to another user"}, status_code=409)
+        # A turn is running and another is already waiting: don't stack more behind them
+        if session.lock.locked() and session.pending >= 1:
+            return _busy("A turn is already in progress for this session", status_code=429)
+        turn = run_turn(session, text, body.get("city"), body.get("date"))
+
+        if request.query_params.get("stream", "true").lower() == "false":
+            try:
+                async for event, payload in turn:
+                    if event == "done":
+                        # Includes the user's message, so the client can keep its transcript in sync
+                        return JSONResponse(json.loads(json.dumps(payload, default=str)))
+            except Saturated:
+                return _busy("Server busy, retry later")
+            finally:
+                # Runs run_turn's cleanup (the session lock) now, not whenever the
+                # abandoned generator happens to be finalized
+                await turn.aclose()
+            return JSONResponse({"error": "Turn failed"}, status_code=500)
+
+        async def events() -> AsyncIterator[str]:
+            try:
+                async for event, payload in turn:
+                    yield _sse(event, {"text": payload} if event == "token" else payload)
+            except Saturated:
+                # Lost the race for the last queue spot after the status was sent
+                yield _sse("error", {"error": "Server busy, retry later", "retry_after": SERVER_RETRY_AFTER_SECONDS})
+            except Exception as e:
+                print(f"Error running turn: {e}")
+                yield _sse("error", {"error": "Turn failed"})
+            finally:
+                # Also when the client disconnects mid-stream
+                await turn.aclose()
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    async def get_session(request: Request) -> Response:
+        session = sessions.get(request.path_params["session_id"])
+        if session is None:
+            return JSONResponse({"error": "Unknown or expired session"}, status_code=404)
+        return JSONResponse(json.loads(json.dumps(session.to_dict(), default=str)))
+
+    async def healthz(request: Request) -> Response:
+        health = {
+            "status": "busy" if limiter.saturated() else "ok",
+            "turns": limiter.metrics(),
+            "sessions": len(sessions.sessions),
+        }
+        if "speculator" in registry.created() and registry.get("speculator") is not None:
+            health["speculation"] = registry.get("speculator").metrics()
+        health["answer_cache"] = answer_cache_metrics()
+        if "weather_prefetcher" in registry.created() and registry.get("weather_prefetcher") is not None:
+            health["weather_prefetch"] = registry.get("weather_prefetcher").metrics()
+        if "summary_writer" in registry.created():
+            health["summary_writes"] = registry.get("summary_writer").metrics()
+        checkpointer = registry.get("checkpointer") if "checkpointer" in registry.created() else None
+        if isinstance(checkpointer, SQLiteCheckpointSaver):
+            health["checkpoints"] = await asyncio.to_thread(checkpointer.metrics)
+        return JSONResponse(health)
+
+    async def metrics(request: Request) -> Response:
+        prometheus = get_tracer().exporter(PrometheusExporter)
+        if prometheus is None:
+            return PlainTextResponse("Prometheus exporter is off (TRACE_EXPORTERS)\n", status_code=404)
+        return PlainTextResponse(prometheus.render(), media_type="text/plain; version=0.0.4")
+
+    async def maintain():
+        # Idle checkpoint threads are pruned here, not when some module imports the graph
+        while True:
+            try:
+                deleted = await asyncio.to_thread(maintain_checkpoints)
+                if deleted:
+                    print(f"Deleted {deleted} idle checkpoint threads")
+            except Exception as e:
+                print(f"Error pruning checkpoints: {e}")
+            await asyncio.sleep(CHECKPOINT_MAINTENANCE_INTERVAL_SECONDS)
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        if warm_up:
+            # Build agents and clients before the first request instead of during it
+            await asyncio.to_thread(warm_up_graph)
+        maintenance = asyncio.ensure_future(maintain())
+        yield
+        maintenance.cancel()
+        # Durable shutdown: summaries waiting in the background writer go to the store,
+        # then the store's own write-behind buffer (if on) is committed
+        created = registry.created()
+        if "weather_prefetcher" in created and registry.get("weather_prefetcher") is not None:
+            registry.get("weather_prefetcher").close()
+        if "summary_writer" in created:
+            await asyncio.to_thread(registry.get("summary_writer").close)
+        if "store" in created and registry.get("store").write_buffer is not None:
+            await asyncio.to_thread(registry.get("store").write_buffer.close)
+
+    app = Starlette(
+        routes=[
+            Route("/sessions/{session_id}/chat", chat, methods=["POST"]),
+            Route("/sessions/{session_id}", get_session, methods=["GET"]),
+            Route("/healthz", healthz, methods=["GET"]),
+            Route("/metrics", metrics, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+    app.state.limiter = limiter
+    app.state.sessions = sessions
+    return app
+
+
+# `uvicorn src.server:app`
+app = create_app()
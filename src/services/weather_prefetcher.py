@@ -0,0 +1,193 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from ..core.registry import registry
+from ..core.tracing import span
+from ..config import (
+    WEATHER_PREFETCH_INTERVAL_SECONDS,
+    WEATHER_PREFETCH_IDLE_SECONDS,
+    WEATHER_PREFETCH_BATCH_SIZE,
+    WEATHER_PREFETCH_MAX_CITIES,
+)
+from .weather_service import WeatherService
+
+
+def _city_key(city: str) -> str:
+    return " ".join(city.lower().split())
+
+
+class WeatherPrefetcher:
+    """
+    Keeps the weather of the cities active sessions use warm, off the request path.
+
+    - Tracking: every lookup marks its city active; a city nobody asked for in
+      `idle_after` seconds stops being refreshed (at most `max_cities` are tracked).
+    - Refresh: a daemon thread wakes every `interval` seconds, geocodes new cities
+      (cached) and fetches the forecasts of all of them with Open-Meteo's
+      multi-coordinate request, `batch_size` locations per HTTP call.
+    - Serving: lookups return the latest snapshot. Each one carries `fetched_at`, so
+      a snapshot the refresher couldn't update in time shows up as stale in the prompts.
+      Only a city's first lookup waits on Open-Meteo.
+    """
+
+    def __init__(self, interval: float = WEATHER_PREFETCH_INTERVAL_SECONDS,
+                 idle_after: float = WEATHER_PREFETCH_IDLE_SECONDS,
+                 batch_size: int = WEATHER_PREFETCH_BATCH_SIZE,
+                 max_cities: int = WEATHER_PREFETCH_MAX_CITIES):
+        self.interval = interval
+        self.idle_after = idle_after
+        self.batch_size = max(1, batch_size)
+        self.max_cities = max_cities
+        self._active: Dict[str, Tuple[str, float]] = {}  # key -> (city name, last requested)
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.requests = 0
+        self.failures = 0
+        # Surfaced in metrics() so a prefetcher that stopped refreshing shows up in /healthz
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+        self.last_error_at: Optional[float] = None
+        self.last_success_at: Optional[float] = None
+
+    # -- serving --
+
+    def track(self, city: str) -> None:
+        key = _city_key(city)
+        with self._lock:
+            self._active[key] = (city, time.time())
+            while len(self._active) > self.max_cities:
+                # Forget the city idle the longest
+                oldest = min(self._active, key=lambda k: self._active[k][1])
+                del self._active[oldest]
+                self._snapshots.pop(oldest, None)
+        self.start()
+
+    def peek(self, city: str) -> Optional[Dict[str, Any]]:
+        """The warm snapshot for `city`, if there is one (no I/O)."""
+        key = _city_key(city)
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None and key in self._active:
+                self._active[key] = (self._active[key][0], time.time())
+        return dict(snapshot) if snapshot is not None else None
+
+    def weather(self, city: str) -> Dict[str, Any]:
+        """`weather_data` for `city`: the warm snapshot, or fetched now the first time."""
+        self.track(city)
+        snapshot = self.peek(city)
+        with self._lock:
+            if snapshot is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if snapshot is not None:
+            return snapshot
+        weather = WeatherService.get_current_weather(city)
+        if "error" not in weather:
+            with self._lock:
+                self._snapshots[_city_key(city)] = weather
+        return dict(weather)
+
+    # -- refreshing --
+
+    def _failed(self, e: Exception) -> None:
+        print(f"Error prefetching weather: {e}")
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            self.last_error_at = time.time()
+
+    def _due(self) -> List[Tuple[str, str]]:
+        cutoff = time.time() - self.idle_after
+        with self._lock:
+            for key in [k for k, (_, seen) in self._active.items() if seen < cutoff]:
+                del self._active[key]
+                self._snapshots.pop(key, None)
+            return [(key, city) for key, (city, _) in self._active.items()]
+
+    def refresh(self) -> int:
+        """One refresh pass over the active cities. Returns how many were updated."""
+        located = []
+        for key, city in self._due():
+            coords = WeatherService.get_coordinates(city)
+            if coords:
+                located.append((key, coords))
+        updated = 0
+        with span("weather", "prefetch", cities=len(located)):
+            for start in range(0, len(located), self.batch_size):
+                batch = located[start:start + self.batch_size]
+                try:
+                    forecasts = WeatherService.get_forecasts(
+                        [(coords["latitude"], coords["longitude"]) for _, coords in batch]
+                    )
+                except Exception as e:
+                    # Old snapshots stay; their fetched_at tells the agents they're aging
+                    self._failed(e)
+                    continue
+                with self._lock:
+                    self.requests += 1
+                    self.consecutive_failures = 0
+                    self.last_success_at = time.time()
+                    for (key, coords), current in zip(batch, forecasts):
+                        if key in self._active:
+                            self._snapshots[key] = WeatherService.describe(coords, current)
+                            updated += 1
+        with self._lock:
+            self.refreshes += 1
+        return updated
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                self._failed(e)
+
+    def start(self) -> None:
+        """Starts the refresh thread (once; called by the first lookup)."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target=self._run, name="weather-prefetch", daemon=True)
+                self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            ages = [WeatherService.age(s) for s in self._snapshots.values()]
+            ages = [a for a in ages if a is not None]
+            return {
+                "cities": len(self._active),
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "forecast_requests": self.requests,
+                "failures": self.failures,
+                "consecutive_failures": self.consecutive_failures,
+                "last_error": self.last_error,
+                "last_error_age_s": round(time.time() - self.last_error_at, 1) if self.last_error_at else None,
+                "last_success_age_s": round(time.time() - self.last_success_at, 1) if self.last_success_at else None,
+                "stale": sum(1 for s in self._snapshots.values() if WeatherService.is_stale(s)),
+                "oldest_snapshot_s": round(max(ages), 1) if ages else None,
+            }
+
+
+def get_weather(city: str) -> Dict[str, Any]:
+    """`weather_data` for `city`, from the prefetcher when it's on."""
+    prefetcher = registry.get("weather_prefetcher")
+    return prefetcher.weather(city) if prefetcher is not None else WeatherService.get_current_weather(city)
+
+
+def weather_snapshot(city: str) -> Optional[Dict[str, Any]]:
+    """The prefetcher's warm snapshot for `city` (None when it's off or has none)."""
+    prefetcher = registry.get("weather_prefetcher")
+    return prefetcher.peek(city) if prefetcher is not None else None
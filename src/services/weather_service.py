@@ -1,29 +1,176 @@
+import time
 import requests
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, List, Optional, Tuple
+from ..core.cache import CacheBackend, CacheStats, InMemoryBackend, SingleFlight, make_backend
+from ..core.tracing import span
+from ..config import (
+    WEATHER_GEOCODE_URL,
+    WEATHER_FORECAST_URL,
+    WEATHER_CONNECT_TIMEOUT_SECONDS,
+    WEATHER_READ_TIMEOUT_SECONDS,
+    WEATHER_POOL_SIZE,
+    WEATHER_GEOCODE_CACHE_BACKEND,
+    WEATHER_GEOCODE_MISS_TTL_SECONDS,
+    WEATHER_FORECAST_TTL_SECONDS,
+    WEATHER_COORD_PRECISION,
+    WEATHER_STALE_AFTER_SECONDS,
+)
+
+TIMEOUT = (WEATHER_CONNECT_TIMEOUT_SECONDS, WEATHER_READ_TIMEOUT_SECONDS)
+
+_flights = SingleFlight()
+_geocode_stats = CacheStats()
+_forecast_stats = CacheStats()
+
+
+@lru_cache(maxsize=None)
+def _session() -> requests.Session:
+    """One pooled, keep-alive session shared by every lookup in the process."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=WEATHER_POOL_SIZE, pool_maxsize=WEATHER_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+@lru_cache(maxsize=None)
+def _geocode_cache() -> Optional[CacheBackend]:
+    # No default TTL: a city's coordinates don't move
+    return make_backend(WEATHER_GEOCODE_CACHE_BACKEND, "geocode", max_entries=10_000)
+
+
+@lru_cache(maxsize=None)
+def _forecast_cache() -> CacheBackend:
+    return InMemoryBackend(max_entries=1024, default_ttl=WEATHER_FORECAST_TTL_SECONDS)
+
+
+def _describe(weather_code: int) -> str:
+    # Simple WMO code interpretation
+    condition = "Unknown"
+    if weather_code == 0: condition = "Clear sky"
+    elif weather_code in [1, 2, 3]: condition = "Partly cloudy"
+    elif weather_code in [45, 48]: condition = "Foggy"
+    elif weather_code in [51, 53, 55]: condition = "Drizzle"
+    elif weather_code in [61, 63, 65]: condition = "Rain"
+    elif weather_code in [71, 73, 75]: condition = "Snow"
+    elif weather_code >= 95: condition = "Thunderstorm"
+    return condition
+
 
 class WeatherService:
     @staticmethod
     def get_coordinates(city_name: str) -> Optional[Dict[str, float]]:
-        """Get latitude and longitude for a city name."""
-        try:
-            url = "https://geocoding-api.open-meteo.com/v1/search"
-            params = {"name": city_name, "count": 1, "language": "en", "format": "json"}
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            if "results" in data and data["results"]:
-                result = data["results"][0]
-                return {
-                    "latitude": result["latitude"],
-                    "longitude": result["longitude"],
-                    "name": result["name"],
-                    "country": result.get("country", "")
-                }
-            return None
-        except Exception as e:
-            print(f"Error fetching coordinates: {e}")
-            return None
+        """
+        Get latitude and longitude for a city name.
+        Results (including "not found") are cached; errors are not.
+        """
+        key = " ".join(city_name.lower().split())
+        cache = _geocode_cache()
+        with span("weather", "geocode", city=key) as lookup:
+            entry = cache.get(key) if cache is not None else None
+            _geocode_stats.record(entry is not None)
+            lookup.attrs["cache"] = "hit" if entry is not None else "miss"
+            if entry is not None:
+                return entry["coords"]
+
+            try:
+                entry = _flights.do(f"geocode:{key}", lambda: WeatherService._fetch_coordinates(city_name))
+            except Exception as e:
+                print(f"Error fetching coordinates: {e}")
+                lookup.error = f"{type(e).__name__}: {e}"
+                return None
+        if cache is not None:
+            # Unknown names may be typos of places added later; don't remember them forever
+            ttl = None if entry["coords"] else WEATHER_GEOCODE_MISS_TTL_SECONDS
+            cache.set(key, entry, ttl=ttl)
+        return entry["coords"]
+
+    @staticmethod
+    def _fetch_coordinates(city_name: str) -> Dict[str, Any]:
+        params = {"name": city_name, "count": 1, "language": "en", "format": "json"}
+        response = _session().get(WEATHER_GEOCODE_URL, params=params, timeout=TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+
+        if "results" in data and data["results"]:
+            result = data["results"][0]
+            return {"coords": {
+                "latitude": result["latitude"],
+                "longitude": result["longitude"],
+                "name": result["name"],
+                "country": result.get("country", "")
+            }}
+        return {"coords": None}
+
+    @staticmethod
+    def get_forecast(latitude: float, longitude: float) -> Dict[str, Any]:
+        """
+        Current conditions at a point, cached for WEATHER_FORECAST_TTL_SECONDS.
+        Coordinates are rounded first, so nearby lookups share one entry.
+        """
+        latitude = round(latitude, WEATHER_COORD_PRECISION)
+        longitude = round(longitude, WEATHER_COORD_PRECISION)
+        key = f"{latitude},{longitude}"
+        with span("weather", "forecast", coords=key) as lookup:
+            current = _forecast_cache().get(key)
+            _forecast_stats.record(current is not None)
+            lookup.attrs["cache"] = "hit" if current is not None else "miss"
+            if current is None:
+                current = _flights.do(f"forecast:{key}", lambda: WeatherService._fetch_forecast(latitude, longitude))
+                _forecast_cache().set(key, current)
+        return current
+
+    @staticmethod
+    def _fetch_forecast(latitude: float, longitude: float) -> Dict[str, Any]:
+        return WeatherService._fetch_forecasts([(latitude, longitude)])[0]
+
+    @staticmethod
+    def _fetch_forecasts(points: List[Tuple[float, float]]) -> List[Dict[str, Any]]:
+        # Open-Meteo takes comma-separated coordinate lists and answers with one
+        # result per location (a plain object when there is only one)
+        params = {
+            "latitude": ",".join(str(lat) for lat, _ in points),
+            "longitude": ",".join(str(lon) for _, lon in points),
+            "current": ["temperature_2m", "weather_code"],
+            "temperature_unit": "fahrenheit",
+            "wind_speed_unit": "mph",
+            "precipitation_unit": "inch"
+        }
+        response = _session().get(WEATHER_FORECAST_URL, params=params, timeout=TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        results = data if isinstance(data, list) else [data]
+        if len(results) != len(points):
+            raise ValueError(f"Expected {len(points)} forecasts, got {len(results)}")
+        fetched_at = time.time()
+        # The fetch time travels with the forecast, so callers can tell how old it is
+        return [{**result.get("current", {}), "fetched_at": fetched_at} for result in results]
+
+    @staticmethod
+    def get_forecasts(points: List[Tuple[float, float]]) -> List[Dict[str, Any]]:
+        """
+        Current conditions for many points in one request (the background prefetcher's
+        path). Always fetched; the results refresh the forecast cache.
+        """
+        points = [(round(lat, WEATHER_COORD_PRECISION), round(lon, WEATHER_COORD_PRECISION)) for lat, lon in points]
+        with span("weather", "forecast_batch", locations=len(points)):
+            forecasts = WeatherService._fetch_forecasts(points)
+        for (latitude, longitude), current in zip(points, forecasts):
+            _forecast_cache().set(f"{latitude},{longitude}", current)
+        return forecasts
+
+    @staticmethod
+    def describe(coords: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+        """The `weather_data` dict the agents see, from a geocode result and a forecast."""
+        return {
+            "location": f"{coords['name']}, {coords['country']}",
+            "temperature": f"{current.get('temperature_2m')}°F",
+            "conditions": _describe(current.get("weather_code", 0)),
+            "source": "Open-Meteo",
+            "fetched_at": current.get("fetched_at"),
+        }
 
     @staticmethod
     def get_current_weather(city_name: str) -> Dict[str, Any]:
@@ -33,38 +180,45 @@ class WeatherService:
             return {"error": "City not found"}
 
         try:
-            url = "https://api.open-meteo.com/v1/forecast"
-            params = {
-                "latitude": coords["latitude"],
-                "longitude": coords["longitude"],
-                "current": ["temperature_2m", "weather_code"],
-                "temperature_unit": "fahrenheit",
-                "wind_speed_unit": "mph",
-                "precipitation_unit": "inch"
-            }
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            current = data.get("current", {})
-            weather_code = current.get("weather_code", 0)
-            
-            # Simple WMO code interpretation
-            condition = "Unknown"
-            if weather_code == 0: condition = "Clear sky"
-            elif weather_code in [1, 2, 3]: condition = "Partly cloudy"
-            elif weather_code in [45, 48]: condition = "Foggy"
-            elif weather_code in [51, 53, 55]: condition = "Drizzle"
-            elif weather_code in [61, 63, 65]: condition = "Rain"
-            elif weather_code in [71, 73, 75]: condition = "Snow"
-            elif weather_code >= 95: condition = "Thunderstorm"
-            
-            return {
-                "location": f"{coords['name']}, {coords['country']}",
-                "temperature": f"{current.get('temperature_2m')}°F",
-                "conditions": condition,
-                "source": "Open-Meteo"
-            }
+            current = WeatherService.get_forecast(coords["latitude"], coords["longitude"])
+            return WeatherService.describe(coords, current)
         except Exception as e:
             print(f"Error fetching weather: {e}")
             return {"error": "Weather service unavailable"}
+
+    @staticmethod
+    def age(weather: Optional[Dict[str, Any]]) -> Optional[float]:
+        """Seconds since the weather was fetched (None if unknown)."""
+        fetched_at = (weather or {}).get("fetched_at")
+        return time.time() - fetched_at if fetched_at else None
+
+    @staticmethod
+    def is_stale(weather: Optional[Dict[str, Any]], max_age: float = WEATHER_STALE_AFTER_SECONDS) -> bool:
+        age = WeatherService.age(weather)
+        return age is not None and age > max_age
+
+    @staticmethod
+    def cache_metrics() -> Dict[str, Any]:
+        return {
+            "geocode": _geocode_stats.as_dict(),
+            "forecast": _forecast_stats.as_dict(),
+            "collapsed": _flights.collapsed,
+        }
+
+    @staticmethod
+    def bucket(weather: Optional[Dict[str, Any]], band: int = 5) -> str:
+        """
+        Coarse, cache-friendly view of a weather dict, e.g. "40-45F|Rain".
+        Small temperature changes land in the same band.
+        """
+        if not weather or "error" in weather:
+            return "none"
+        conditions = weather.get("conditions", "Unknown")
+        try:
+            temp = float(str(weather.get("temperature", "")).replace("°F", "").strip())
+        except ValueError:
+            return f"unknown|{conditions}"
+        low = int(temp // band) * band
+        # Old data gets its own bucket: the answer should say it may have changed
+        stale = "|stale" if WeatherService.is_stale(weather) else ""
+        return f"{low}-{low + band}F|{conditions}{stale}"
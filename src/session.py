@@ -0,0 +1,201 @@
+import asyncio
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langgraph.store.base import GetOp
+from .core.registry import registry
+from .core.streaming import UserFacingStream, transcript_messages
+from .core.tracing import get_tracer, trace
+
+DEFAULT_CITY = "New York"
+
+
+def load_summary(user_id: str) -> str:
+    """The user's stored summary, including one still waiting to be written."""
+    writer = registry.get("summary_writer")
+    found, summary = writer.pending(user_id)
+    if found:
+        return summary
+    memory = registry.get("store").batch([GetOp(namespace=("users",), key=user_id)])
+    summary = memory[0].value.get("summary", "") if memory and memory[0] else ""
+    if summary:
+        # Resaving it unchanged later is then skipped
+        writer.mark_clean(user_id, summary)
+    return summary
+
+
+class ChatSession:
+    """
+    One conversation's client-side state: the visible transcript, the rolling
+    summary and the context (OOTD, weather) sent with every turn.
+    The Streamlit app keeps the same fields in st.session_state; the HTTP
+    server keeps one ChatSession per session id.
+    """
+
+    def __init__(self, session_id: str, user_id: str):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.messages: List[BaseMessage] = []
+        self.summary = ""
+        self.summary_watermark: Optional[str] = None
+        self.current_ootd: Optional[Dict[str, Any]] = None
+        self.ootd_date: Optional[str] = None
+        self.weather: Dict[str, Any] = {"temperature": "Unknown", "conditions": "Unknown"}
+        self.city: Optional[str] = None
+        self.last_route: List[str] = []
+        self.last_trace: List[Dict[str, Any]] = []
+        # One turn at a time per session; created on first use inside the event loop
+        self._lock: Optional[asyncio.Lock] = None
+        self.pending = 0  # turns waiting for the lock
+        # With a checkpointing graph: whether the thread already holds the
+        # history and summary, and whether OOTD / weather changed since the last turn
+        self.thread_seeded = False
+        self.context_changed = True
+
+    @classmethod
+    def load(cls, session_id: str, user_id: str, city: Optional[str] = None,
+             ootd_date: Optional[str] = None, graph_app: Any = None) -> "ChatSession":
+        """
+        Session resumed from the graph's checkpoint (another worker or a previous
+        process ran it), else a new one with the user's stored summary.
+        Then fetches the OOTD and the weather (blocking I/O).
+        """
+        session = cls(session_id, user_id)
+        if not (graph_app is not None and session.restore(graph_app)):
+            session.summary = load_summary(user_id)
+        session.set_context(city or DEFAULT_CITY, ootd_date)
+        return session
+
+    def restore(self, graph_app: Any) -> bool:
+        """Loads the session from the graph's latest checkpoint; False if there is none."""
+        if graph_app.checkpointer is None:
+            return False
+        from .graph import thread_config
+
+        values = graph_app.get_state(thread_config(self.session_id, self.user_id)).values
+        if not values:
+            return False
+        # Older messages were folded into the summary, the checkpoint only has the tail
+        self.messages = [m for m in values.get("messages", []) if isinstance(m, (HumanMessage, AIMessage))]
+        self.user_id = values.get("user_id", self.user_id)
+        self.summary = values.get("summary", "")
+        self.summary_watermark = values.get("summary_watermark")
+        self.current_ootd = values.get("current_ootd")
+        self.weather = values.get("weather_data") or self.weather
+        self.thread_seeded = True
+        self.context_changed = False
+        return True
+
+    def set_context(self, city: Optional[str] = None, ootd_date: Optional[str] = None) -> None:
+        """Refreshes the weather / OOTD when the city or date changed (blocking I/O)."""
+        from .repositories.outfit_repository import OutfitRepository
+        from .services.weather_prefetcher import get_weather, weather_snapshot
+
+        if city and city != self.city:
+            self.weather = get_weather(city)
+            self.city = city
+            self.context_changed = True
+        elif city:
+            # Same city: pick up a newer forecast the prefetcher got in the background
+            snapshot = weather_snapshot(city)
+            if snapshot and snapshot.get("fetched_at") != self.weather.get("fetched_at"):
+                self.weather = snapshot
+                self.context_changed = True
+        if self.current_ootd is None or (ootd_date and ootd_date != self.ootd_date):
+            self.current_ootd = OutfitRepository().get_outfit_by_date(ootd_date)
+            self.ootd_date = ootd_date
+            self.context_changed = True
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def unsummarized_messages(self) -> List[BaseMessage]:
+        """Messages after the summary watermark. Older ones live in the summary, so we don't resend them."""
+        for i, m in enumerate(self.messages):
+            if m.id == self.summary_watermark:
+                return self.messages[i + 1:]
+        return self.messages
+
+    def inputs(self, text: str, checkpointed: bool = False) -> Dict[str, Any]:
+        """
+        Graph input for one turn. A stateless graph gets the unsummarized history
+        and the full context every time. A checkpointing graph already holds them,
+        so after the first turn it gets the new message (plus OOTD / weather when
+        they changed).
+        """
+        message = HumanMessage(content=text, id=str(uuid.uuid4()))
+        self.messages.append(message)
+        if checkpointed and self.thread_seeded:
+            inputs: Dict[str, Any] = {"messages": [message]}
+            if self.context_changed:
+                inputs.update(current_ootd=self.current_ootd, weather_data=self.weather)
+        else:
+            inputs = {
+                "messages": self.unsummarized_messages(),
+                "user_id": self.user_id,
+                "current_ootd": self.current_ootd,
+                "weather_data": self.weather,
+                "summary": self.summary,
+                "summary_watermark": self.summary_watermark,
+            }
+        self.thread_seeded = checkpointed
+        self.context_changed = False
+        return inputs
+
+    def apply(self, update: Dict[str, Any]) -> None:
+        """Applies one `stream_mode="updates"` chunk to the session."""
+        for key, value in update.items():
+            self.last_route.append(key)
+            if not value:
+                continue
+            if "summary" in value:
+                self.summary = value["summary"]
+            if "summary_watermark" in value:
+                self.summary_watermark = value["summary_watermark"]
+            # Only ALI's replies are part of the transcript (the orchestrator's, or a
+            # fused expert's); expert signals are internal, RemoveMessage trims are skipped
+            if "messages" in value:
+                self.messages.extend(transcript_messages(value["messages"]))
+
+    async def astream(self, graph_app: Any, text: str) -> AsyncIterator[str]:
+        """Runs one turn and yields the user-facing answer text as it arrives."""
+        self.last_route = []
+        answer_stream = UserFacingStream()
+        checkpointed = graph_app.checkpointer is not None
+        config = None
+        if checkpointed:
+            from .graph import thread_config
+            config = thread_config(self.session_id, self.user_id)
+        with trace() as trace_id:
+            inputs = self.inputs(text, checkpointed)
+            async for mode, payload in graph_app.astream(inputs, config, stream_mode=["updates", "messages"]):
+                if mode == "messages":
+                    chunk, metadata = payload
+                    delta = answer_stream.feed(chunk, metadata)
+                    if delta:
+                        yield delta
+                else:
+                    replies = len(self.messages)
+                    self.apply(payload)
+                    if not answer_stream.emitted:
+                        # A reply that wasn't streamed (a speculative fused answer)
+                        for m in self.messages[replies:]:
+                            if isinstance(m, AIMessage) and m.content:
+                                answer_stream.emitted = True
+                                yield m.content
+        self.last_trace = get_tracer().spans(trace_id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "messages": [{"id": m.id, "type": m.type, "content": m.content} for m in self.messages],
+            "summary": self.summary,
+            "summary_watermark": self.summary_watermark,
+            "current_ootd": self.current_ootd,
+            "weather": self.weather,
+            "last_route": self.last_route,
+        }
@@ -14,5 +14,8 @@ class SessionState(TypedDict):
     current_ootd: Optional[Dict[str, Any]]
     weather_data: Optional[Dict[str, Any]]
     summary: str # For context compression
+    summary_watermark: Optional[str] # Id of the last message folded into the summary
     agent_states: Dict[str, AgentState] # For state isolation
     next_agent: Optional[str]
+    next_agents: Optional[List[str]] # All subagents to run in parallel for this routing decision
+    speculative: Optional[Dict[str, Any]] # Expert answer started during routing (agents/speculation.py)